@@ -6,6 +6,7 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_migrate import Migrate
+from read_replica import RoutingSession
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,7 +14,7 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
 # Create the app
 app = Flask(__name__)
@@ -21,11 +22,81 @@ app.secret_key = os.environ.get("SESSION_SECRET", "water-management-secret-key-2
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///water_management.db")
+database_url = os.environ.get("DATABASE_URL", "sqlite:///water_management.db")
+if database_url.startswith("postgres://"):
+    database_url = "postgresql://" + database_url[len("postgres://"):]
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+if database_url.startswith("postgresql"):
+    # PostgreSQL: pool theo số worker; nhiều nhà máy dùng chung 1 server thì mỗi nhà máy 1 schema (DATABASE_SCHEMA)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    )
+    if os.environ.get("DATABASE_SCHEMA"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {
+            "options": f"-csearch_path={os.environ['DATABASE_SCHEMA']}"
+        }
+
+# Bản sao chỉ đọc cho biểu đồ/lịch sử/báo cáo (xem read_replica.py); không đặt DATABASE_REPLICA_URL thì đọc CSDL chính
+replica_url = os.environ.get("DATABASE_REPLICA_URL")
+if replica_url:
+    if replica_url.startswith("postgres://"):
+        replica_url = "postgresql://" + replica_url[len("postgres://"):]
+    app.config["SQLALCHEMY_BINDS"] = {"replica": replica_url}
+app.config["REPLICA_MAX_LAG_SECONDS"] = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 30))
+app.config["REPLICA_ASSUMED_LAG_SECONDS"] = float(os.environ.get("REPLICA_ASSUMED_LAG_SECONDS", 5))
+app.config["REPLICA_LAG_CHECK_SECONDS"] = float(os.environ.get("REPLICA_LAG_CHECK_SECONDS", 5))
+
+# SQLite (xem sqlite_profile.py): WAL + PRAGMA cho mỗi kết nối, SQLITE_TUNING=0 để dùng mặc định của SQLite
+app.config["SQLITE_TUNING"] = os.environ.get("SQLITE_TUNING", "1") == "1"
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+app.config["SQLITE_CACHE_SIZE_KB"] = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 65536))
+app.config["SQLITE_MMAP_SIZE_BYTES"] = int(os.environ.get("SQLITE_MMAP_SIZE_BYTES", 268435456))
+app.config["SQLITE_FOREIGN_KEYS"] = os.environ.get("SQLITE_FOREIGN_KEYS", "0") == "1"
+app.config["SQLITE_LOCK_RETRIES"] = int(os.environ.get("SQLITE_LOCK_RETRIES", 3))
+app.config["SQLITE_LOCK_RETRY_DELAY_MS"] = int(os.environ.get("SQLITE_LOCK_RETRY_DELAY_MS", 100))
+
+# Đếm câu SQL theo request (xem query_budget.py): off | warn | raise
+app.config["QUERY_BUDGET_MODE"] = os.environ.get("QUERY_BUDGET_MODE", "off")
+app.config["QUERY_REPEAT_WARN"] = int(os.environ.get("QUERY_REPEAT_WARN", 20))
+
+# Nhật ký câu SQL chậm (xem slow_query_log.py); SLOW_QUERY_MS=0 để tắt, file mặc định instance/slow_queries.log
+app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", 500))
+app.config["SLOW_QUERY_EXPLAIN"] = os.environ.get("SLOW_QUERY_EXPLAIN", "1") == "1"
+app.config["SLOW_QUERY_LOG_FILE"] = os.environ.get("SLOW_QUERY_LOG_FILE")
+app.config["SLOW_QUERY_LOG_MAX_BYTES"] = int(os.environ.get("SLOW_QUERY_LOG_MAX_BYTES", 5 * 1024 * 1024))
+app.config["SLOW_QUERY_LOG_BACKUPS"] = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+
+# Lưu trữ năm đã chốt (xem archive.py): tiến trình web đọc lại danh sách năm lưu trữ sau N giây
+app.config["ARCHIVE_REGISTRY_TTL_SECONDS"] = int(os.environ.get("ARCHIVE_REGISTRY_TTL_SECONDS", 60))
+
+# Cache chi tiết biểu đồ (xem chart_cache.py)
+app.config["CHART_CACHE_MAX_ENTRIES"] = int(os.environ.get("CHART_CACHE_MAX_ENTRIES", 256))
+app.config["CHART_CACHE_TTL_SECONDS"] = int(os.environ.get("CHART_CACHE_TTL_SECONDS", 300))
+
+# KPI snapshot (xem kpi_snapshot.py): hôm nay làm mới nền sau KPI_TODAY_TTL_SECONDS; ngày quá khứ giữ tới khi
+# version dữ liệu dùng chung đổi (data_version.py), KPI_HISTORY_TTL_SECONDS chỉ là giới hạn an toàn
+app.config["KPI_CACHE_MAX_ENTRIES"] = int(os.environ.get("KPI_CACHE_MAX_ENTRIES", 366))
+app.config["KPI_TODAY_TTL_SECONDS"] = int(os.environ.get("KPI_TODAY_TTL_SECONDS", 60))
+app.config["KPI_HISTORY_TTL_SECONDS"] = int(os.environ.get("KPI_HISTORY_TTL_SECONDS", 86400))
+
+# Nạp số liệu hàng loạt JSON/NDJSON (xem bulk_ingest.py): số bản ghi mỗi transaction, tối đa mỗi lần gửi
+app.config["INGEST_CHUNK_ROWS"] = int(os.environ.get("INGEST_CHUNK_ROWS", 2000))
+app.config["INGEST_MAX_RECORDS"] = int(os.environ.get("INGEST_MAX_RECORDS", 200000))
+# Khóa API cho /api/ingest (SCADA/PLC gửi header X-API-Key, không đăng nhập): "tên_đăng_nhập:khóa,..."
+# -> {khóa: tên đăng nhập}; bản ghi được ghi nhận theo user đó (cần quyền nhập liệu)
+app.config["INGEST_API_KEYS"] = {
+    key.strip(): username.strip()
+    for username, _, key in (item.partition(":") for item in os.environ.get("INGEST_API_KEYS", "").split(","))
+    if username.strip() and key.strip()
+}
+# Nhập file .xlsx/.csv (xem file_import.py): thư mục báo cáo lỗi, mặc định instance/import_reports
+app.config["IMPORT_REPORT_DIR"] = os.environ.get("IMPORT_REPORT_DIR")
 
 # Initialize extensions
 db.init_app(app)
@@ -41,11 +112,28 @@ def load_user(user_id):
 with app.app_context():
     # Import models to ensure tables are created
     import models
-    db.create_all()
-    
-    # Generate sample data if not exists
-    from data_generator import generate_sample_data
-    generate_sample_data()
+    from sqlite_profile import apply_sqlite_profile
+    apply_sqlite_profile(db.engine)
+    from query_budget import install_query_counter
+    install_query_counter()
+    from slow_query_log import install_slow_query_log
+    install_slow_query_log()
+    # `flask db ...` hoặc CSDL còn migration chưa chạy: không tạo bảng/ghi gì lúc import (xem schema_state.py)
+    from schema_state import schema_ready
+    if schema_ready():
+        db.create_all()
+        # bảng lịch (xem calendar_dim.py): điền các ngày còn thiếu
+        from calendar_dim import ensure_calendar
+        if ensure_calendar():
+            db.session.commit()
+
+        # Generate sample data if not exists (GENERATE_SAMPLE_DATA=0 để tắt, vd. khi chạy benchmark)
+        if os.environ.get("GENERATE_SAMPLE_DATA", "1") == "1":
+            from data_generator import generate_sample_data
+            generate_sample_data()
 
 # Import routes
 import routes
+
+# CLI commands
+import commands
@@ -0,0 +1,201 @@
+"""
+Lưu trữ dữ liệu gốc của các năm đã chốt sang bảng archive_<bảng>_<năm>.
+
+Bảng nóng chỉ giữ các năm đang mở nên max(date), distinct ngày, quét cửa sổ... luôn nhỏ.
+Bảng dẫn xuất (daily_facts, tiêu thụ KH theo ngày/kỳ) vẫn giữ đủ lịch sử nên biểu đồ/KPI không cần đọc lưu trữ.
+Truy vấn dữ liệu gốc đi qua entry_source(): chỉ UNION ALL bảng lưu trữ khi dải ngày chạm tới năm đã lưu trữ.
+"""
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, List, Optional
+from sqlalchemy import Table, Column, Index, MetaData, select, union_all, and_, func
+from sqlalchemy.orm import aliased
+from app import app, db
+from models import (WellProduction, CleanWaterPlant, WastewaterPlant, WaterTankLevel, CustomerReading,
+                    ReportPeriod, ArchivedYear)
+
+logger = logging.getLogger(__name__)
+
+# bảng gốc được lưu trữ -> cột đối tượng đứng trước date trong index bảng lưu trữ
+ARCHIVED_MODELS = {
+    WellProduction: 'well_id',
+    CleanWaterPlant: None,
+    WastewaterPlant: 'plant_number',
+    WaterTankLevel: 'tank_id',
+    CustomerReading: 'customer_id',
+}
+ARCHIVE_PREFIX = 'archive_'
+
+# ngoài db.metadata: db.create_all() và Alembic autogenerate không đụng tới (xem migrations/env.py)
+archive_metadata = MetaData()
+
+_registry = {'years': None, 'loaded_at': 0.0}
+_registry_lock = threading.Lock()
+
+
+def archive_table_name(model, year: int) -> str:
+    return f'{ARCHIVE_PREFIX}{model.__tablename__}_{year}'
+
+
+def archive_table(model, year: int) -> Table:
+    """Bảng lưu trữ 1 năm: cùng cột với bảng gốc, không FK/unique, index theo (đối tượng, date)."""
+    name = archive_table_name(model, year)
+    table = archive_metadata.tables.get(name)
+    if table is None:
+        columns = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+                   for c in model.__table__.columns]
+        entity = ARCHIVED_MODELS[model]
+        index_cols = [entity, 'date'] if entity else ['date']
+        table = Table(name, archive_metadata, *columns, Index(f'ix_{name}', *index_cols))
+    return table
+
+
+def _load_registry() -> Dict[str, List[int]]:
+    years = {}
+    for table_name, year in db.session.query(ArchivedYear.table_name, ArchivedYear.year).all():
+        years.setdefault(table_name, []).append(year)
+    return {k: sorted(v) for k, v in years.items()}
+
+
+def archived_years(model) -> List[int]:
+    """Các năm của model đã lưu trữ (đọc lại sổ đăng ký sau ARCHIVE_REGISTRY_TTL_SECONDS)."""
+    ttl = app.config['ARCHIVE_REGISTRY_TTL_SECONDS']
+    with _registry_lock:
+        years = _registry['years']
+        fresh = years is not None and time.monotonic() - _registry['loaded_at'] <= ttl
+    if not fresh:
+        years = _load_registry()
+        with _registry_lock:
+            _registry.update(years=years, loaded_at=time.monotonic())
+    return years.get(model.__tablename__, [])
+
+
+def reset_archive_registry() -> None:
+    with _registry_lock:
+        _registry['years'] = None
+
+
+def is_archived_date(model, d: date) -> bool:
+    return d.year in archived_years(model)
+
+
+def entry_source(model, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Nguồn đọc dữ liệu gốc cho [start_date, end_date] (None = không giới hạn).
+    Không chạm năm lưu trữ nào -> trả về chính model; ngược lại trả về alias của model trên
+    UNION ALL bảng nóng + bảng lưu trữ các năm liên quan (dùng như model: src.date, query(src)...).
+    """
+    years = [
+        y for y in archived_years(model)
+        if (start_date is None or y >= start_date.year) and (end_date is None or y <= end_date.year)
+    ]
+    if not years:
+        return model
+    hot = model.__table__
+    names = [c.name for c in hot.columns]
+    parts = [select(*hot.columns)]
+    parts += [select(*[archive_table(model, y).c[n] for n in names]) for y in years]
+    return aliased(model, union_all(*parts).subquery(f'{hot.name}_all'), adapt_on_names=True)
+
+
+def year_is_closed(year: int) -> bool:
+    """Năm đã chốt: có kỳ báo cáo phủ tới 31/12 và mọi kỳ chạm vào năm đều đã khóa."""
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    periods = ReportPeriod.query.filter(
+        ReportPeriod.period_start <= last, ReportPeriod.period_end >= first
+    ).all()
+    if not periods:
+        return False
+    return all(p.is_locked for p in periods) and max(p.period_end for p in periods) >= last
+
+
+def archive_year(year: int, user_id: Optional[int] = None, force: bool = False) -> Dict[str, int]:
+    """
+    Chuyển dữ liệu gốc năm `year` sang bảng lưu trữ (1 transaction, có commit).
+    Trước khi chuyển, làm mới daily_facts, bảng tiêu thụ KH và bảng tổng theo tháng của năm để chúng không còn cần dòng gốc.
+    force=True: bỏ qua kiểm tra kỳ báo cáo đã khóa. Trả về {bảng: số dòng đã chuyển}.
+    """
+    from daily_facts import refresh_daily_facts
+    from customer_ranking import refresh_customer_rankings
+    from monthly_rollup import refresh_monthly_rollups
+
+    if year >= date.today().year:
+        raise ValueError(f'Năm {year} chưa kết thúc')
+    if not force and not year_is_closed(year):
+        raise ValueError(f'Năm {year} còn kỳ báo cáo chưa khóa')
+    reset_archive_registry()
+    done = [m.__tablename__ for m in ARCHIVED_MODELS if year in archived_years(m)]
+    if done:
+        raise ValueError(f'Năm {year} đã lưu trữ: {", ".join(done)}')
+
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    refresh_daily_facts(first, last)
+    refresh_customer_rankings(first, last)
+    refresh_monthly_rollups(first, last)
+
+    moved = {}
+    try:
+        conn = db.session.connection()
+        for model in ARCHIVED_MODELS:
+            hot = model.__table__
+            target = archive_table(model, year)
+            target.create(bind=conn, checkfirst=True)
+            in_year = and_(hot.c.date >= first, hot.c.date <= last)
+            names = [c.name for c in hot.columns]
+            db.session.execute(target.insert().from_select(names, select(*hot.columns).where(in_year)))
+            count = db.session.execute(hot.delete().where(in_year)).rowcount
+            db.session.add(ArchivedYear(table_name=hot.name, year=year, row_count=count, archived_by=user_id))
+            moved[hot.name] = count
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        reset_archive_registry()
+    logger.info("archive: year %s moved %s", year, moved)
+    return moved
+
+
+def archive_closed_years(user_id: Optional[int] = None) -> Dict[int, int]:
+    """Lưu trữ lần lượt các năm đã chốt còn trong bảng nóng. Trả về {năm: tổng số dòng đã chuyển}."""
+    firsts = [db.session.query(func.min(m.date)).scalar() for m in ARCHIVED_MODELS]
+    firsts = [d for d in firsts if d is not None]
+    if not firsts:
+        return {}
+    moved = {}
+    for year in range(min(firsts).year, date.today().year):
+        if year in archived_years(CustomerReading) or not year_is_closed(year):
+            continue
+        moved[year] = sum(archive_year(year, user_id).values())
+    return moved
+
+
+def restore_year(year: int) -> Dict[str, int]:
+    """Đưa dữ liệu năm `year` từ bảng lưu trữ về bảng nóng và xóa bảng lưu trữ (có commit)."""
+    restored = {}
+    try:
+        conn = db.session.connection()
+        for model in ARCHIVED_MODELS:
+            hot = model.__table__
+            entry = db.session.get(ArchivedYear, (hot.name, year))
+            if entry is None:
+                continue
+            source = archive_table(model, year)
+            # cột sinh (Computed) do CSDL tự tính lại, không ghi trực tiếp
+            names = [c.name for c in hot.columns if c.computed is None]
+            result = db.session.execute(hot.insert().from_select(names, select(*[source.c[n] for n in names])))
+            restored[hot.name] = result.rowcount
+            db.session.delete(entry)
+            db.session.flush()
+            source.drop(bind=conn, checkfirst=True)
+            archive_metadata.remove(source)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        reset_archive_registry()
+    logger.info("archive: year %s restored %s", year, restored)
+    return restored
@@ -0,0 +1,267 @@
+"""
+Benchmark các API đọc (biểu đồ, dashboard, tổng hợp 6 đường, lịch sử pivot) trên DB tổng hợp nhiều kích thước.
+
+Mỗi kịch bản (số năm, số KH, số giếng) chạy trong 1 tiến trình con riêng vì app gắn DATABASE_URL lúc import:
+  1. dựng DB tổng hợp (có cache theo kích thước + seed trong --db-dir)
+  2. chạy các lệnh backfill (daily_delta, Δ KH, xếp hạng KH, daily_facts)
+  3. gọi từng endpoint qua Flask test client, đo độ trễ và số câu SQL
+
+Mặc định quét từng chiều quanh kịch bản gốc (1 năm, 50 KH, 6 giếng):
+  năm 1/5/10, KH 50/500/5000, giếng 6/60.  --grid full để chạy tích Descartes.
+
+Ví dụ:
+  python benchmarks/run_benchmarks.py --output bench.json
+  python benchmarks/run_benchmarks.py --years 1 5 --customers 50 --wells 6 --repeat 3
+
+Kết quả JSON gồm từng kịch bản (p50/p90/p95/p99/max ms, số câu SQL) và 'curves': theo từng chiều,
+mỗi endpoint có các điểm (x, p50, p95, queries), số mũ tăng trưởng log-log và cờ superlinear / query_growth.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = {'years': 1, 'customers': 50, 'wells': 6}
+DEFAULT_SIZES = {'years': [1, 5, 10], 'customers': [50, 500, 5000], 'wells': [6, 60]}
+DEFAULT_END_DATE = date(2025, 12, 31)
+SUPERLINEAR_EXPONENT = 1.2
+
+
+def endpoint_urls(end_date: date) -> dict:
+    end = end_date.isoformat()
+    s30 = (end_date - timedelta(days=29)).isoformat()
+    s365 = (end_date - timedelta(days=364)).isoformat()
+    cycle_start = (end_date.replace(day=26) if end_date.day >= 26
+                   else (end_date.replace(day=1) - timedelta(days=1)).replace(day=26))
+    cycle_end = (cycle_start + timedelta(days=30)).isoformat()
+    cycle_start = cycle_start.isoformat()
+    return {
+        'kpi': f'/api/kpi-data?date={end}',
+        'dashboard_30d': f'/api/dashboard-data?start_date={s30}&end_date={end}',
+        'dashboard_365d': f'/api/dashboard-data?start_date={s365}&end_date={end}',
+        'chart_wells_30d': f'/api/chart-details/wells?start_date={s30}&end_date={end}',
+        'chart_wells_365d': f'/api/chart-details/wells?start_date={s365}&end_date={end}',
+        'chart_wells_per_well_30d': f'/api/chart-details/wells?start_date={s30}&end_date={end}&well_ids=1,2,3',
+        'chart_clean_water_30d': f'/api/chart-details/clean-water?start_date={s30}&end_date={end}',
+        'chart_clean_water_365d': f'/api/chart-details/clean-water?start_date={s365}&end_date={end}',
+        'chart_wastewater_30d': f'/api/chart-details/wastewater?start_date={s30}&end_date={end}',
+        'chart_customers_30d': f'/api/chart-details/customers?start_date={s30}&end_date={end}',
+        'chart_customers_365d': f'/api/chart-details/customers?start_date={s365}&end_date={end}',
+        'summary_six_lines': f'/api/summary-six-lines?start_date={cycle_start}&end_date={cycle_end}',
+        'customer_details_30d': f'/api/customer-details?start_date={s30}&end_date={end}',
+        'history_wells_pivot': '/api/well-productions/history/pivot?range_days=90',
+        'history_tanks_pivot': '/api/water-tanks/history/pivot?range_days=90',
+        'history_wastewater_pivot': '/api/wastewater/history/pivot?range_days=90',
+        'history_customer_readings': '/api/customer-readings/history?range_days=30',
+        'history_clean_water': '/api/clean-water/consumption/history?range_days=30',
+    }
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+# ---------------------------------------------------------------- worker (1 kịch bản)
+
+def run_worker(args) -> None:
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    os.environ['GENERATE_SAMPLE_DATA'] = '0'
+    sys.path.insert(0, ROOT)
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from sqlalchemy import event
+    from app import app, db
+    from models import User
+    from chart_cache import chart_cache
+    from kpi_snapshot import clear_kpi_cache
+    from synthetic_data import build_synthetic_data
+    from well_production import backfill_well_deltas
+    from customer_consumption import backfill_reading_deltas
+    from customer_ranking import backfill_customer_rankings
+    from daily_facts import backfill_daily_facts
+
+    end_date = date.fromisoformat(args.end_date)
+    result = {'years': args.years, 'customers': args.customers, 'wells': args.wells, 'seed': args.seed}
+
+    with app.app_context():
+        timings = {}
+        if not User.query.first():
+            t0 = time.perf_counter()
+            build_synthetic_data(args.years, args.customers, args.wells, end_date, args.seed)
+            timings['build_data'] = time.perf_counter() - t0
+            for name, fn in (('backfill_well_deltas', backfill_well_deltas),
+                             ('backfill_customer_deltas', backfill_reading_deltas),
+                             ('backfill_customer_rankings', backfill_customer_rankings),
+                             ('backfill_daily_facts', backfill_daily_facts)):
+                t0 = time.perf_counter()
+                fn()
+                timings[name] = time.perf_counter() - t0
+        result['setup_seconds'] = timings
+        result['db_bytes'] = os.path.getsize(args.db)
+
+        counter = {'n': 0}
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *a, **k: counter.__setitem__('n', counter['n'] + 1))
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    endpoints = {}
+    for name, url in endpoint_urls(end_date).items():
+        latencies, queries, status = [], [], None
+        for i in range(args.warmup + args.repeat):
+            if not args.warm_cache:
+                chart_cache.clear()
+                clear_kpi_cache()
+            counter['n'] = 0
+            t0 = time.perf_counter()
+            resp = client.get(url)
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            status = resp.status_code
+            if i >= args.warmup:
+                latencies.append(elapsed)
+                queries.append(counter['n'])
+        endpoints[name] = {
+            'url': url,
+            'status': status,
+            'p50_ms': _percentile(latencies, 50),
+            'p90_ms': _percentile(latencies, 90),
+            'p95_ms': _percentile(latencies, 95),
+            'p99_ms': _percentile(latencies, 99),
+            'max_ms': max(latencies),
+            'mean_ms': statistics.fmean(latencies),
+            'queries': int(statistics.median(queries)),
+        }
+        print(f"  {name:28s} {status} p50={endpoints[name]['p50_ms']:9.1f}ms "
+              f"p95={endpoints[name]['p95_ms']:9.1f}ms queries={endpoints[name]['queries']}", flush=True)
+    result['endpoints'] = endpoints
+
+    with open(args.worker_output, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+# ---------------------------------------------------------------- điều phối
+
+def _scenarios(args):
+    sizes = {'years': args.years, 'customers': args.customers, 'wells': args.wells}
+    if args.grid == 'full':
+        return [dict(zip(sizes, combo)) for combo in itertools.product(*sizes.values())]
+    seen, out = set(), []
+    for dim, values in sizes.items():
+        for v in values:
+            scenario = dict(BASELINE, **{dim: v})
+            key = tuple(scenario.values())
+            if key not in seen:
+                seen.add(key)
+                out.append(scenario)
+    return out
+
+
+def _curves(results):
+    """Theo từng chiều: các kịch bản chỉ khác nhau ở chiều đó so với kịch bản gốc."""
+    curves = {}
+    for dim in DEFAULT_SIZES:
+        points = sorted(
+            (r for r in results if all(r[k] == BASELINE[k] for k in BASELINE if k != dim)),
+            key=lambda r: r[dim]
+        )
+        if len(points) < 2:
+            continue
+        curves[dim] = {}
+        for name in points[0]['endpoints']:
+            series = [{'x': r[dim], 'p50_ms': r['endpoints'][name]['p50_ms'],
+                       'p95_ms': r['endpoints'][name]['p95_ms'],
+                       'queries': r['endpoints'][name]['queries']} for r in points]
+            first, last = series[0], series[-1]
+            exponent = None
+            if first['p50_ms'] and last['p50_ms'] and last['x'] != first['x']:
+                exponent = math.log(last['p50_ms'] / first['p50_ms']) / math.log(last['x'] / first['x'])
+            curves[dim][name] = {
+                'points': series,
+                'exponent': exponent,
+                'superlinear': exponent is not None and exponent > SUPERLINEAR_EXPONENT,
+                'query_growth': last['queries'] > first['queries'],
+            }
+    return curves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, nargs='+', default=DEFAULT_SIZES['years'])
+    parser.add_argument('--customers', type=int, nargs='+', default=DEFAULT_SIZES['customers'])
+    parser.add_argument('--wells', type=int, nargs='+', default=DEFAULT_SIZES['wells'])
+    parser.add_argument('--grid', choices=('sweep', 'full'), default='sweep')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--warm-cache', action='store_true', help='không xóa cache giữa các lần gọi')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', default=DEFAULT_END_DATE.isoformat())
+    parser.add_argument('--db-dir', default=os.path.join(tempfile.gettempdir(), 'water-bench'))
+    parser.add_argument('--output', default='benchmark_results.json')
+    # chế độ tiến trình con
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-output', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        args.years, args.customers, args.wells = args.years[0], args.customers[0], args.wells[0]
+        run_worker(args)
+        return
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    results = []
+    for sc in _scenarios(args):
+        db_path = os.path.join(
+            args.db_dir, f"bench_y{sc['years']}_c{sc['customers']}_w{sc['wells']}_s{args.seed}_{args.end_date}.db")
+        print(f"== {sc['years']} năm, {sc['customers']} KH, {sc['wells']} giếng ({db_path})", flush=True)
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            out_path = tmp.name
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker',
+               '--years', str(sc['years']), '--customers', str(sc['customers']), '--wells', str(sc['wells']),
+               '--repeat', str(args.repeat), '--warmup', str(args.warmup), '--seed', str(args.seed),
+               '--end-date', args.end_date, '--db', db_path, '--worker-output', out_path]
+        if args.warm_cache:
+            cmd.append('--warm-cache')
+        subprocess.run(cmd, check=True, cwd=args.db_dir)
+        with open(out_path, encoding='utf-8') as f:
+            results.append(json.load(f))
+        os.unlink(out_path)
+
+    report = {
+        'meta': {
+            'end_date': args.end_date, 'seed': args.seed, 'repeat': args.repeat, 'warmup': args.warmup,
+            'warm_cache': args.warm_cache, 'grid': args.grid, 'baseline': BASELINE,
+            'python': sys.version.split()[0],
+        },
+        'scenarios': results,
+        'curves': _curves(results),
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    flagged = [(dim, name) for dim, eps in report['curves'].items()
+               for name, c in eps.items() if c['superlinear'] or c['query_growth']]
+    for dim, name in flagged:
+        c = report['curves'][dim][name]
+        exponent = 'n/a' if c['exponent'] is None else f"{c['exponent']:.2f}"
+        print(f"! {name} theo {dim}: số mũ={exponent} query_growth={c['query_growth']}")
+    print(f"Đã ghi {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Sinh dữ liệu tổng hợp có thể lặp lại (cùng seed -> cùng dữ liệu) cho benchmark.
+
+Khác data_generator.py: số năm / số KH / số giếng tùy chỉnh, chỉ số giếng và KH là lũy kế,
+ghi bằng Core insert theo lô để dựng được DB 10 năm x 5000 KH trong vài phút.
+Phải import sau khi DATABASE_URL đã trỏ tới DB đích (xem run_benchmarks.py).
+"""
+import random
+from datetime import date, timedelta
+from werkzeug.security import generate_password_hash
+from app import db
+from models import (User, UserRole, Well, WaterTank, Customer, WellProduction, CleanWaterPlant,
+                    WastewaterPlant, WaterTankLevel, CustomerReading)
+from customer_consumption import COMPANIES_NHY, COMPANIES_LH
+
+BATCH_ROWS = 50000
+DAILY_READING_SHARE = 0.1  # tỉ lệ KH đọc số hằng ngày, còn lại chốt ngày 25
+
+
+class _BatchWriter:
+    def __init__(self):
+        self.pending = {}
+
+    def add(self, table, row):
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= BATCH_ROWS:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for t in ([table] if table is not None else list(self.pending)):
+            rows = self.pending.pop(t, [])
+            if rows:
+                db.session.execute(t.insert(), rows)
+
+
+def build_synthetic_data(years: int, customers: int, wells: int, end_date: date, seed: int = 42) -> dict:
+    """Ghi dữ liệu [end_date - years, end_date] vào DB hiện tại (DB phải rỗng). Trả về số dòng theo bảng."""
+    rng = random.Random(seed)
+    start_date = end_date - timedelta(days=365 * years - 1)
+
+    db.session.add(User(username='admin', email='admin@bench.local', role=UserRole.ADMIN,
+                        password_hash=generate_password_hash('admin123'), full_name='Benchmark'))
+
+    well_ids = []
+    for i in range(wells):
+        w = Well(code=f'GK{i + 1}', name=f'Giếng khoan {i + 1}', capacity=2000, is_active=True, is_backup=False)
+        db.session.add(w)
+        db.session.flush()
+        well_ids.append(w.id)
+
+    tank_ids = []
+    for cap in (1200, 2000, 4000):
+        t = WaterTank(name=f'Bể chứa {cap}', capacity=cap, tank_type='clean_water')
+        db.session.add(t)
+        db.session.flush()
+        tank_ids.append((t.id, cap))
+
+    customer_rows = []
+    n_daily = max(1, int(customers * DAILY_READING_SHARE))
+    for i in range(customers):
+        if i == 0:
+            name = COMPANIES_NHY[0]
+        elif i == 1:
+            name = COMPANIES_LH[0]
+        else:
+            name = f'Công ty số {i + 1}'
+        c = Customer(company_name=name, water_ratio=round(rng.uniform(0.6, 0.9), 2),
+                     daily_reading=(i < n_daily), is_active=True)
+        db.session.add(c)
+        db.session.flush()
+        customer_rows.append((c.id, c.daily_reading, c.water_ratio))
+    db.session.commit()
+
+    writer = _BatchWriter()
+    wp, cw, ww, tl, cr = (WellProduction.__table__, CleanWaterPlant.__table__, WastewaterPlant.__table__,
+                          WaterTankLevel.__table__, CustomerReading.__table__)
+    well_meter = {wid: rng.uniform(0, 1e5) for wid in well_ids}
+    cust_meter = {cid: rng.uniform(0, 1e5) for cid, _, _ in customer_rows}
+
+    d = start_date
+    while d <= end_date:
+        for wid in well_ids:
+            well_meter[wid] += rng.uniform(1500, 2000)
+            writer.add(wp, {'well_id': wid, 'date': d, 'production': well_meter[wid], 'created_by': 1})
+
+        writer.add(cw, {
+            'date': d, 'electricity': rng.uniform(1000, 2000), 'pac_usage': rng.uniform(50, 100),
+            'naoh_usage': rng.uniform(20, 50), 'polymer_usage': rng.uniform(5, 15),
+            'clean_water_output': rng.uniform(6000, 9000), 'raw_water_jasan': rng.uniform(500, 1500),
+            'created_by': 1,
+        })
+        for plant in (1, 2):
+            flow = rng.uniform(3000, 5000)
+            writer.add(ww, {
+                'plant_number': plant, 'date': d, 'wastewater_meter': flow, 'input_flow_tqt': flow,
+                'output_flow_tqt': flow * 0.95, 'sludge_output': rng.uniform(5, 15),
+                'electricity': rng.uniform(800, 1500), 'chemical_usage': rng.uniform(10, 30) if plant == 2 else 0,
+                'created_by': 1,
+            })
+        for tid, cap in tank_ids:
+            writer.add(tl, {'tank_id': tid, 'date': d, 'level': rng.uniform(cap * 0.3, cap * 0.9), 'created_by': 1})
+
+        for cid, daily, ratio in customer_rows:
+            if not daily and d.day != 25:
+                continue
+            cust_meter[cid] += rng.uniform(100, 500) if daily else rng.uniform(2000, 8000)
+            reading = cust_meter[cid]
+            direct = daily and (cid % 2 == 0)
+            writer.add(cr, {
+                'customer_id': cid, 'date': d, 'clean_water_reading': reading,
+                'clean_water_reading_2': 0.0, 'clean_water_reading_3': 0.0, 'clean_water_outsource': 0.0,
+                'wastewater_reading': reading * ratio if direct else None,
+                'wastewater_calculated': None if direct else reading * ratio,
+                'created_by': 1,
+            })
+        d += timedelta(days=1)
+    writer.flush()
+    db.session.commit()
+
+    return {t.name: db.session.query(t).count() for t in (wp, cw, ww, tl, cr)}
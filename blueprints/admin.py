@@ -1,10 +1,16 @@
 import logging
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+import os
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, send_from_directory, abort
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
 from app import db
 from models import User, Customer, Well, WaterTank
 from utils import check_permissions
+from chart_cache import chart_cache
+from data_version import bump_data_version
+from slow_query_log import read_entries, aggregate_entries, slow_query_log_path, clear_slow_query_log
+from bulk_ingest import INGEST_TYPES
+from file_import import IMPORT_EXTENSIONS, import_file, import_report_dir
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 logger = logging.getLogger(__name__)
@@ -200,7 +206,9 @@ def new_well():
             if hasattr(well, 'is_active'):
                 well.is_active = is_active
             db.session.add(well)
+            bump_data_version()
             db.session.commit()
+            chart_cache.clear()
             flash('Đã thêm giếng khoan', 'success')
             session['active_tab'] = 'wells'
             session['prev_active_tab'] = session.get('prev_active_tab', 'wells')
@@ -252,7 +260,9 @@ def edit_well(well_id):
             well.is_backup = is_backup
         if hasattr(well, 'is_active'):
             well.is_active = is_active
+        bump_data_version()
         db.session.commit()
+        chart_cache.clear()
         flash('Đã cập nhật giếng khoan', 'success')
         session['active_tab'] = 'wells'
         return redirect(url_for('admin.admin'))
@@ -266,7 +276,9 @@ def delete_well(well_id):
     well = Well.query.get_or_404(well_id)
     try:
         db.session.delete(well)
+        bump_data_version()
         db.session.commit()
+        chart_cache.clear()
         flash('Đã xóa giếng khoan', 'success')
     except Exception as e:
         db.session.rollback()
@@ -405,4 +417,74 @@ def delete_tank(tank_id):
     except Exception as e:
         db.session.rollback()
         flash(f'Lỗi xóa bể chứa: {str(e)}', 'error')
-    return redirect(url_for('admin.admin', active_tab='tanks'))
\ No newline at end of file
+    return redirect(url_for('admin.admin', active_tab='tanks'))
+@bp.route('/slow-queries', methods=['GET'], endpoint='slow_queries')
+@login_required
+def slow_queries():
+    if not check_permissions(current_user.role, ['admin']):
+        flash('Bạn không có quyền truy cập mục này', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+    entries = read_entries()
+    groups = aggregate_entries(entries)
+    if request.args.get('full_scan') == '1':
+        groups = [grp for grp in groups if grp['full_scan']]
+    return render_template('admin/slow_queries.html', groups=groups, total=len(entries),
+                           threshold_ms=current_app.config['SLOW_QUERY_MS'], log_path=slow_query_log_path(),
+                           full_scan_only=request.args.get('full_scan') == '1')
+
+@bp.route('/slow-queries/clear', methods=['POST'], endpoint='clear_slow_queries')
+@login_required
+def clear_slow_queries():
+    if not check_permissions(current_user.role, ['admin']):
+        flash('Bạn không có quyền thực hiện hành động này', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+    clear_slow_query_log()
+    flash('Đã xóa nhật ký câu SQL chậm', 'success')
+    return redirect(url_for('admin.slow_queries'))
+
+
+@bp.route('/import', methods=['GET', 'POST'], endpoint='import_readings')
+@login_required
+def import_readings():
+    """Tải lên file .xlsx/.csv lịch sử số liệu (xem file_import.py), hiện kết quả và link báo cáo lỗi."""
+    if not check_permissions(current_user.role, ['admin']):
+        flash('Bạn không có quyền truy cập mục này', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        default_type = request.form.get('type') or None
+        if upload is None or not upload.filename:
+            flash('Chưa chọn file', 'warning')
+        elif os.path.splitext(upload.filename)[1].lower() not in IMPORT_EXTENSIONS:
+            flash(f'Chỉ hỗ trợ file {", ".join(IMPORT_EXTENSIONS)}', 'warning')
+        elif default_type is not None and default_type not in INGEST_TYPES:
+            flash('Loại dữ liệu không hợp lệ', 'warning')
+        else:
+            from blueprints.data_entry import edit_cutoff
+            try:
+                report = import_file(upload.stream, upload.filename, user_id=current_user.id,
+                                     editable_since=edit_cutoff(), default_type=default_type)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("import %s failed", upload.filename)
+                flash(f'Lỗi đọc file {upload.filename}: {e}', 'error')
+            else:
+                if report['report_file']:
+                    report['report_name'] = os.path.basename(report['report_file'])
+                written = sum(report['summary'].get(s, 0) for s in ('inserted', 'updated'))
+                flash(f'Đã nhập {written}/{report["records"]} dòng từ {upload.filename}',
+                      'success' if written == report['records'] else 'warning')
+    return render_template('admin/import.html', report=report, types=INGEST_TYPES,
+                           extensions=IMPORT_EXTENSIONS)
+
+
+@bp.route('/import/reports/<name>', methods=['GET'], endpoint='import_report')
+@login_required
+def import_report(name):
+    if not check_permissions(current_user.role, ['admin']):
+        flash('Bạn không có quyền truy cập mục này', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+    if not (name.startswith('import_') and name.endswith('.csv')):
+        abort(404)
+    return send_from_directory(import_report_dir(), name, as_attachment=True, mimetype='text/csv')
@@ -8,153 +8,42 @@ from models import Well, WellProduction, CleanWaterPlant, WastewaterPlant, Custo
 from sqlalchemy import func, case
 from sqlalchemy.sql import over
 from utils import check_permissions
+from clean_water_series import date_range, load_clean_water_series, load_wells_delta_series
+from customer_consumption import customer_delta_subquery
+from daily_facts import load_daily_facts, daily_fact_series
+from chart_cache import chart_cache
+from data_version import current_data_version
+from kpi_snapshot import get_kpi_snapshot
+from range_context import RangeContext
+from customer_ranking import top_customer_ids
+from archive import entry_source
+from calendar_dim import billing_cycle_bounds
+from query_budget import query_budget
+from read_replica import use_read_replica
 
 bp = Blueprint('charts', __name__)
+use_read_replica(bp)
 logger = logging.getLogger(__name__)
 
 
 @bp.route('/api/kpi-data')
 @login_required
+@query_budget(20, max_repeats=3)
 def kpi_data():
     """API endpoint for KPI dashboard data"""
     try:
         # Optional date param to view historical KPI
         date_str = request.args.get('date')
         today = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
-        month_start = today.replace(day=1)
-        yesterday = today - timedelta(days=1)
-        today_well_production = _clean_water_production_today(today)
-
-        # Monthly production
-        month_well_production = db.session.query(
-            db.func.sum(WellProduction.production)
-        ).filter(WellProduction.date >= month_start).scalar() or 0
-
-        # Clean water output today
-        # Logic mới: nước sạch không Jasan + tồn kho hôm qua - tồn kho hôm nay
-
-        today_clean_output = _get_daily_production(today, yesterday)
-        # Wastewater treatment today
-        today_wastewater = db.session.query(
-            db.func.sum(WastewaterPlant.input_flow_tqt)
-        ).filter(WastewaterPlant.date == today).scalar() or 0
-
-        # Active customers (not date dependent)
-        active_customers = Customer.query.filter_by(is_active=True).count()
-
-        return jsonify({
-            'today_well_production': float(today_well_production),
-            'month_well_production': float(month_well_production),
-            'today_clean_water': float(today_clean_output),
-            'today_wastewater': float(today_wastewater),
-            'active_customers': active_customers
-        })
+        # 1 truy vấn daily_facts cho mọi chỉ số; ngày quá khứ cache đến khi có nhập liệu, hôm nay làm mới nền
+        return jsonify(get_kpi_snapshot(today))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-# tính sản lượng theo ngày
-def _get_daily_production(today, yesterday):
-    clean_without_jasan = _clean_water_without_jasan(today)
-    today_jasan = _get_today_jasan(today)
-
-    inventory_yesterday = _get_tank_inventory_yesterday(yesterday)
-    inventory_today = _get_tank_inventory_today(today)
-    if(today.day==1):
-        return (clean_without_jasan - today_jasan) * 0.97
-    return float((clean_without_jasan - today_jasan) * 0.97 + inventory_yesterday - inventory_today)
-
-
-    #lượng nước sạch nhà máy nước sạch
-def _clean_water_without_jasan(today):
-    production_today = _clean_water_production_today(today)
-    return float(production_today)
-
-
-def _get_today_jasan(today):
-    return db.session.query(
-        db.func.sum(CleanWaterPlant.raw_water_jasan)
-    ).filter(CleanWaterPlant.date == today).scalar() or 0
-
-def _clean_water_production_today(today):
-    # Lấy tổng production của giếng ngày hôm nay
-    cur_sum = db.session.query(
-        db.func.sum(WellProduction.production)
-    ).filter(WellProduction.date == today).scalar() or 0
-    
-    # Kiểm tra xem có phải ngày đầu tháng không
-    if today.day == 1:
-        # Ngày đầu tháng: sum(production) - 0
-        return float(cur_sum)
-    else:
-        # Các ngày khác: today - yesterday
-        prev_day = today - timedelta(days=1)
-        prev_sum = db.session.query(
-            db.func.sum(WellProduction.production)
-        ).filter(WellProduction.date == prev_day).scalar() or 0
-        
-        return float(cur_sum) - float(prev_sum) 
-
-    
-def _calculate_tank_inventory(tank_id: int, level: float) -> float:
-    """
-    Tính lượng nước tồn theo công thức riêng cho từng bể:
-    - Tank 1: tồn = (9 - level) * 115
-    - Tank 2: tồn = (12 - level) * 160  
-    - Tank 3: tồn = (13 - level) * 300
-    """
-    # if tank_id == 1:
-    #     return (9 - level) * 115
-    # elif tank_id == 2:
-    #     return (12 - level) * 160
-    # elif tank_id == 3:
-    #     return (13 - level) * 300
-    # else:
-    #     return 0.0  # Bể không xác định
-    """level đã là thể tích m³ trong DB -> trả về trực tiếp."""
-    return float(level or 0.0)
-
-
-def _get_tank_inventory_yesterday(yesterday):
-    """
-    Tính tổng tồn kho ngày hôm qua và hôm nay của tất cả các bể
-    Trả về tuple (tồn_hôm_qua, tồn_hôm_nay)
-    """
-    # Lấy mực nước của các bể ngày hôm qua
-    yesterday_levels = db.session.query(
-        WaterTankLevel.tank_id,
-        WaterTankLevel.level
-    ).filter(WaterTankLevel.date == yesterday).all()
-    # Tính tổng tồn kho hôm qua
-    total_yesterday = 0.0
-    for tank_level in yesterday_levels:
-        level = float(tank_level.level or 0)
-        inventory = _calculate_tank_inventory(tank_level.tank_id, level)
-        total_yesterday += inventory
-    return total_yesterday
-
-def _get_tank_inventory_today(today):
-    # date_str = request.args.get('date')
-    # today = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
-    
-    # Lấy mực nước của các bể ngày hôm nay
-    today_levels = db.session.query(
-        WaterTankLevel.tank_id,
-        WaterTankLevel.level
-    ).filter(WaterTankLevel.date == today).all()
-    # Tính tổng tồn kho hôm nay
-    total_today = 0.0
-    for tank_level in today_levels:
-        level = float(tank_level.level or 0)
-        inventory = _calculate_tank_inventory(tank_level.tank_id, level)
-        total_today += inventory
-    # print('total_today', total_today)
-
-    return total_today
-
-
 @bp.route('/api/dashboard-data')
 @login_required
+@query_budget(20, max_repeats=3)
 def dashboard_data():
     try:
         start_date_str = request.args.get('start_date')
@@ -166,177 +55,34 @@ def dashboard_data():
             days = int(request.args.get('days', 30))
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
-        # Tính sản lượng giếng theo ngày: ngày n = tổng production ngày n - tổng production ngày (n-1)
-        # Tạo dải ngày
-        dates = []
-        cur = start_date
-        while cur <= end_date:
-            dates.append(cur)
-            cur += timedelta(days=1)
-
-        # Lấy tổng production từ (start_date - 1) đến end_date
-        prev_start = start_date - timedelta(days=1)
-        well_rows = db.session.query(
-            WellProduction.date,
-            db.func.sum(WellProduction.production).label('total_production')
-        ).filter(
-            WellProduction.date >= prev_start,
-            WellProduction.date <= end_date
-        ).group_by(WellProduction.date).all()
-        prod_map = {r.date: float(r.total_production or 0) for r in well_rows}
-        well_series = []
-        for d in dates:
-            prev_day = d - timedelta(days=1)
-            today_sum = prod_map.get(d, 0.0)
-            yesterday_sum = prod_map.get(prev_day, 0.0)
-            if d.day == 1:
-                # Ngày đầu tháng: sum(production) - 0
-                val = float(today_sum)
-            else:
-                val = float(today_sum) - float(yesterday_sum)
-            # print(d.day,float(today_sum),float(yesterday_sum))
-            if val < 0:
-                val = 0.0
-            well_series.append({'date': str(d), 'production': val})
-        # well_series = [v if v >= 0 else 0 for v in well_series]
-        # Sản lượng nước sạch theo ngày dùng _get_daily_production, clamp <0 thành 0
-        clean_water_series = []
-        for d in dates:
-            daily_val = float(_get_daily_production(d, d - timedelta(days=1)))
-            if daily_val < 0:
-                daily_val = 0.0
-            clean_water_series.append({'date': str(d), 'output': daily_val})
-        wastewater_data = db.session.query(
-            WastewaterPlant.date,
-            db.func.sum(WastewaterPlant.input_flow_tqt).label('total_input'),
-            db.func.sum(WastewaterPlant.output_flow_tqt).label('total_output')
-        ).filter(WastewaterPlant.date >= start_date, WastewaterPlant.date <= end_date)\
-         .group_by(WastewaterPlant.date).all()
-
-        # Dữ liệu tiêu thụ khách hàng (khớp với generate_customer_details)
-        calc_start = start_date - timedelta(days=1)
-
-        # Đồng hồ 1/2/3 theo từng khách
-        r1 = func.coalesce(CustomerReading.clean_water_reading, 0)
-        lag_r1 = func.lag(r1).over(
-            partition_by=CustomerReading.customer_id,
-            order_by=CustomerReading.date
-        )
-        delta1 = case(
-            (((r1 - func.coalesce(lag_r1, r1)) < 0), 0),
-            else_=(r1 - func.coalesce(lag_r1, r1))
-        )
-
-        r2 = func.coalesce(getattr(CustomerReading, 'clean_water_reading_2', 0), 0)
-        lag_r2 = func.lag(r2).over(
-            partition_by=CustomerReading.customer_id,
-            order_by=CustomerReading.date
-        )
-        delta2 = case(
-            (((r2 - func.coalesce(lag_r2, r2)) < 0), 0),
-            else_=(r2 - func.coalesce(lag_r2, r2))
-        )
-
-        r3 = func.coalesce(getattr(CustomerReading, 'clean_water_reading_3', 0), 0)
-        lag_r3 = func.lag(r3).over(
-            partition_by=CustomerReading.customer_id,
-            order_by=CustomerReading.date
-        )
-        delta3 = case(
-            (((r3 - func.coalesce(lag_r3, r3)) < 0), 0),
-            else_=(r3 - func.coalesce(lag_r3, r3))
-        )
-
-        companies_NHY = [
-            'Cty TNHH Dệt và Nhuộm Hưng Yên',
+        ctx = RangeContext(start_date, end_date)
+
+        # Sản lượng giếng, nước sạch, nước thải theo ngày đọc từ daily_facts, clamp <0 thành 0
+        # - giếng: ngày n = tổng production ngày n - tổng production ngày (n-1), ngày 1 giữ nguyên
+        # - nước sạch: (giếng - Jasan) * 0.97 + tồn hôm qua - tồn hôm nay
+        labels = [str(d) for d in ctx.dates]
+        well_series = [
+            {'date': d, 'production': v} for d, v in zip(labels, ctx.well_series())
         ]
-        companies_LH = [
-            'Cty TNHH dệt may Lee Hing Việt Nam'
+        clean_water_series = [
+            {'date': d, 'output': v} for d, v in zip(labels, ctx.clean_water_supplied_series())
+        ]
+        wastewater_series = [
+            {'date': str(f.date), 'input': float(f.wastewater_input or 0), 'output': float(f.wastewater_output or 0)}
+            for f in ctx.facts if f.wastewater_input is not None
         ]
 
-        clean_delta_expr = case(
-            (Customer.company_name.in_(companies_NHY), (delta1 * 10) + delta2 + delta3),
-            (Customer.company_name.in_(companies_LH), delta1 + delta2 * 10),
-            else_=delta1
-        )
-
-        total_waste = func.coalesce(
-            CustomerReading.wastewater_reading,
-            CustomerReading.wastewater_calculated
-        )
-        lag_total_waste = func.lag(total_waste).over(
-            partition_by=CustomerReading.customer_id,
-            order_by=CustomerReading.date
-        )
-        wastewater_delta_expr = case(
-            (((total_waste - func.coalesce(lag_total_waste, total_waste)) < 0), 0),
-            else_=(total_waste - func.coalesce(lag_total_waste, total_waste))
-        )
-
-        delta_sq_all = (
-            db.session.query(
-                CustomerReading.date.label('date'),
-                CustomerReading.customer_id.label('customer_id'),
-                clean_delta_expr.label('clean_delta'),
-                wastewater_delta_expr.label('wastewater_delta')
-            )
-            .join(Customer, Customer.id == CustomerReading.customer_id)
-            .filter(
-                CustomerReading.date >= calc_start,
-                CustomerReading.date <= end_date,
-                Customer.is_active.is_(True),
-                Customer.daily_reading.is_(True),
-            )
-        ).subquery()
-
-        top_rows = (
-            db.session.query(
-                delta_sq_all.c.customer_id,
-                func.sum(delta_sq_all.c.clean_delta).label('sum_clean_delta')
-            )
-            .group_by(delta_sq_all.c.customer_id)
-            .order_by(func.sum(delta_sq_all.c.clean_delta).desc())
-            .limit(4)
-            .all()
-        )
-        top_customer_ids = [row.customer_id for row in top_rows]
-
-        customer_rows = (
-            db.session.query(
-                delta_sq_all.c.date,
-                func.sum(delta_sq_all.c.clean_delta).label('total_clean'),
-                func.sum(delta_sq_all.c.wastewater_delta).label('total_waste')
-            )
-            .filter(
-                delta_sq_all.c.date >= start_date,
-                *( [delta_sq_all.c.customer_id.in_(top_customer_ids)] if top_customer_ids else [] )
-            )
-            .group_by(delta_sq_all.c.date)
-            .order_by(delta_sq_all.c.date)
-            .all()
-        )
-
-        customer_map = {
-            row.date: {
-                'clean': float(row.total_clean or 0),
-                'waste': float(row.total_waste or 0)
-            }
-            for row in customer_rows
-        }
-
-        customer_data = []
-        for d in dates:
-            values = customer_map.get(d, {'clean': 0.0, 'waste': 0.0})
-            customer_data.append({
-                'date': str(d),
-                'clean_water': values['clean'],
-                'wastewater': values['waste']
-            })
+        # Dữ liệu tiêu thụ khách hàng Top 4 (khớp với generate_customer_details)
+        customer_clean, customer_waste = ctx.customer_series()
+        customer_data = [
+            {'date': d, 'clean_water': c, 'wastewater': w}
+            for d, c, w in zip(labels, customer_clean, customer_waste)
+        ]
 
         return jsonify({
             'well_production': well_series,
             'clean_water': clean_water_series,
-            'wastewater': [{'date': str(d.date), 'input': float(d.total_input or 0), 'output': float(d.total_output or 0)} for d in wastewater_data],
+            'wastewater': wastewater_series,
             'customer_consumption': customer_data
         })
     except Exception as e:
@@ -393,6 +139,7 @@ def chart_details(chart_type):
 
 @bp.route('/api/chart-details/<chart_type>')
 @login_required
+@query_budget(10, max_repeats=3)
 def api_chart_details(chart_type):
     try:
         days = request.args.get('days', 30, type=int)
@@ -412,42 +159,50 @@ def api_chart_details(chart_type):
             # Chế độ tổng khi chọn tất cả (well_ids trống/None/'all') hoặc aggregate=1
             agg_flag = request.args.get('aggregate', '0').lower() in ('1', 'true', 'yes')
             aggregate = agg_flag or (well_ids_param in (None, '', 'all'))
-            data = get_well_production_range(start_dt, end_dt, well_ids, aggregate=aggregate)
-            print(data)
-
+            ids = well_ids
+            compute = lambda: get_well_production_range(start_dt, end_dt, well_ids, aggregate=aggregate)
         elif chart_type == 'clean-water':
-            data = generate_clean_water_details(start_dt, end_dt)
+            ids, aggregate = None, True
+            compute = lambda: generate_clean_water_details(start_dt, end_dt)
         elif chart_type == 'wastewater':
             plant_ids_param = request.args.get('plant_ids')
             plant_ids = [int(x) for x in plant_ids_param.split(',') if x.strip().isdigit()] if plant_ids_param else None
             aggregate = request.args.get('aggregate', '0').lower() in ('1', 'true', 'yes') or (plant_ids_param in (None, '', 'all'))
-            data = generate_wastewater_details(start_dt, end_dt, plant_ids, aggregate=aggregate)
+            ids = plant_ids
+            compute = lambda: generate_wastewater_details(start_dt, end_dt, plant_ids, aggregate=aggregate)
         elif chart_type == 'customers':
             customer_ids_param = request.args.get('customer_ids')
             customer_ids = [int(x) for x in customer_ids_param.split(',') if x.strip().isdigit()] if customer_ids_param else None
             # For customers: aggregate when no selection (top 10), individual when specific customer selected
             aggregate = customer_ids_param in (None, '', 'all')
-            data = generate_customer_details(start_dt, end_dt, customer_ids, aggregate=aggregate)
+            ids = customer_ids
+            compute = lambda: generate_customer_details(start_dt, end_dt, customer_ids, aggregate=aggregate)
         else:
             return jsonify({'error': 'Invalid chart type'}), 400
+
+        # Khóa cache: loại biểu đồ + dải ngày + bộ lọc đối tượng (giữ thứ tự ID vì ảnh hưởng thứ tự dataset)
+        cache_key = (chart_type, start_dt, end_dt, tuple(ids) if ids else None, aggregate)
+        # version dữ liệu dùng chung: lần ghi ở tiến trình/instance khác cũng làm mục cũ trượt (data_version.py)
+        data = chart_cache.get_or_compute(cache_key, start_dt, end_dt, compute, current_data_version())
         return jsonify(data)
     except Exception as e:
         logger.error(f"Error in chart details API: {str(e)}")
         return jsonify({'error': 'Lỗi khi tải dữ liệu chi tiết'}), 500
 
+@bp.route('/api/chart-cache/stats', methods=['GET'])
+@login_required
+def chart_cache_stats():
+    if not check_permissions(current_user.role, ['admin']):
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify(chart_cache.stats())
+
 def get_well_production_range(start_date, end_date, well_ids=None, aggregate=False):
     # Danh sách ngày
-    dates = []
-    cur = start_date
-    while cur <= end_date:
-        dates.append(cur)
-        cur += timedelta(days=1)
+    dates = date_range(start_date, end_date)
 
     if aggregate:
-        # 1) Tổng sản lượng theo ngày:
-        total_series = []
-        for d in dates:
-            total_series.append(_clean_water_production_today(d))
+        # 1) Tổng sản lượng theo ngày (1 truy vấn gộp cho cả dải ngày):
+        total_series = load_wells_delta_series(start_date, end_date)
         # Hiển thị: nếu giá trị âm thì đưa về 0
         total_series = [v if v >= 0 else 0 for v in total_series]
         # 2) Tổng công suất (tổng capacity của các giếng được tính)
@@ -498,43 +253,34 @@ def get_well_production_range(start_date, end_date, well_ids=None, aggregate=Fal
         return {'chart_data': {'labels': labels, 'datasets': datasets}, 'summary': summary, 'table_data': table_data}
 
     # ===== Chế độ mặc định: từng giếng + đường công suất từng giếng =====
+    wp = entry_source(WellProduction, start_date - timedelta(days=1), end_date)
     q = db.session.query(
-        WellProduction.date, Well.id.label('well_id'), Well.code.label('well_code'),
-        Well.capacity.label('capacity'), db.func.sum(WellProduction.production).label('production')
-    ).join(Well).filter(WellProduction.date >= start_date - timedelta(days=1), WellProduction.date <= end_date)
+        wp.date, Well.id.label('well_id'), Well.code.label('well_code'),
+        Well.capacity.label('capacity'), db.func.sum(wp.daily_delta).label('daily_delta')
+    ).join(Well, Well.id == wp.well_id).filter(wp.date >= start_date - timedelta(days=1), wp.date <= end_date)
     if well_ids:
         q = q.filter(Well.id.in_(well_ids))
-    q = q.group_by(WellProduction.date, Well.id, Well.code, Well.capacity).order_by(WellProduction.date, Well.code)
+    q = q.group_by(wp.date, Well.id, Well.code, Well.capacity).order_by(wp.date, Well.code)
     rows = q.all()
     # print(rows)
 
     dates_set = sorted({r.date for r in rows} or dates)
     dates_set = dates_set[1:]
     labels = [d.strftime('%d/%m') for d in dates_set]
-    wells_map, capacities_map = {}, {}
+    capacities_map = {}
     for r in rows:
-        wells_map.setdefault(r.well_code, {})[r.date] = float(r.production or 0)
         capacities_map[r.well_code] = float(r.capacity or 0)
 
+    # Sản lượng từng giếng lấy daily_delta đã lưu (today - yesterday; ngày 1 lấy today), âm -> 0
+    well_codes = sorted(capacities_map)
+    delta_map = {(r.well_code, r.date): max(float(r.daily_delta or 0), 0.0) for r in rows}
+
     palette = ['rgb(54,162,235)', 'rgb(255,99,132)', 'rgb(75,192,192)', 'rgb(255,206,86)', 'rgb(153,102,255)', 'rgb(255,159,64)']
     datasets, well_colors = [], {}
-    for i, (code, date_dict) in enumerate(sorted(wells_map.items())):
+    for i, code in enumerate(well_codes):
         color = palette[i % len(palette)]
         well_colors[code] = color
-        # Tính sản lượng theo từng giếng: today - yesterday; nếu là ngày 1 thì lấy today
-        series = []
-        for d in dates_set:
-            cur = float(date_dict.get(d, 0) or 0)
-            if d.day == 1:
-                val = cur
-            else:
-                prev = d - timedelta(days=1)
-                prev_val = float(date_dict.get(prev, 0) or 0)
-                val = cur - prev_val
-                # print(prev, prev_val)
-            series.append(val)
-        # Hiển thị: nếu giá trị âm thì đưa về 0
-        series = [v if v >= 0 else 0 for v in series]
+        series = [delta_map.get((code, d), 0.0) for d in dates_set]
 
         datasets.append({
             'label': code,
@@ -582,27 +328,11 @@ def get_well_production_range(start_date, end_date, well_ids=None, aggregate=Fal
 
 def generate_clean_water_details(start_date, end_date):
     """Generate clean water production details from database"""
-    # Generate date range
-    dates = []
-    cur = start_date
-    while cur <= end_date:
-        dates.append(cur)
-        cur += timedelta(days=1)
-    
-    # Query clean water plant data for table breakdown
-    query = CleanWaterPlant.query.filter(
-        CleanWaterPlant.date >= start_date,
-        CleanWaterPlant.date <= end_date
-    ).order_by(CleanWaterPlant.date).all()
-
-    # Generate chart series using _get_daily_production for each day
-    data = []
-    for d in dates:
-        daily_val = _clean_water_production_today(d)
-        daily_jasan = _get_today_jasan(d)
-        data.append(float(daily_val - daily_jasan)*0.97)
-    # Hiển thị trên chart: nếu giá trị âm thì = 0
-    data = [v if v >= 0 else 0 for v in data]
+    dates = date_range(start_date, end_date)
+    series = load_clean_water_series(start_date, end_date)
+
+    # Chart: 0.97 * (giếng - Jasan) theo ngày, nếu giá trị âm thì = 0
+    data = [r['production'] if r['production'] >= 0 else 0 for r in series]
     
     # Calculate summary statistics
     non_zero_data = [v for v in data if v > 0]
@@ -628,47 +358,17 @@ def generate_clean_water_details(start_date, end_date):
     }
     
     # Generate table data with breakdown
-    table_data = []
-    for i in range(len(dates)-1,-1,-1):
-        d =dates[i]
-        record = None
-        for r in query:
-            if r.date == d:
-                record = r
-                break
-        
-        # Lấy Jasan thô (J(n))
-        jasan_raw = float(record.raw_water_jasan or 0) if record else 0.0
-
-        # H(n): tổng sản lượng giếng trong ngày n (today - yesterday)
-        wells_delta = float(_clean_water_production_today(d))
-
-        # (M4+N4+O4)-(M5+N5+O5): tồn kho hôm qua - hôm nay
-        prev_day = d - timedelta(days=1)
-        inventory_yesterday = float(_get_tank_inventory_yesterday(prev_day))
-        inventory_today = float(_get_tank_inventory_today(d))
-
-        # print(inventory_yesterday,inventory_today)
-
-        # 2.2 Nước sạch cấp cho KH trong ngày
-        total = 0.97 * max(wells_delta - jasan_raw, 0.0) + (inventory_yesterday - inventory_today)
-
-        # Nếu cần, vẫn hiển thị riêng clean_output đã lưu trong DB (nếu có)
-        clean_output = float(record.clean_water_output or 0) if record else 0.0
-
-        table_data.append({
-            'date': d.strftime('%d/%m/%Y'),
-            'clean_water_output': clean_output,
-            'raw_water_jasan': jasan_raw,
-            'total_water': total,
-            #debug only
-            # 'wells_delta':wells_delta,
-            # 'jasan_raw':jasan_raw, 
-            # 'inventory_yesterday':inventory_yesterday,
-            # 'inventory_today':inventory_today
-        })
+    # total_water = 0.97 * max(H(n) - J(n), 0) + (tồn kho hôm qua - hôm nay)
+    table_data = [
+        {
+            'date': r['date'].strftime('%d/%m/%Y'),
+            'clean_water_output': r['clean_water_output'],
+            'raw_water_jasan': r['jasan'],
+            'total_water': r['total_water'],
+        }
+        for r in reversed(series)
+    ]
 
-    
     return {
         'chart_data': chart_data,
         'summary': summary,
@@ -684,18 +384,19 @@ def generate_wastewater_details(start_date, end_date, plant_ids=None, aggregate=
         dates.append(cur)
         cur += timedelta(days=1)
 
+    ww = entry_source(WastewaterPlant, start_date, end_date)
     if aggregate:
         # Aggregate mode: show total input/output across selected plants
         query = db.session.query(
-            WastewaterPlant.date,
-            db.func.sum(WastewaterPlant.input_flow_tqt).label('total_input'),
-            db.func.sum(WastewaterPlant.output_flow_tqt).label('total_output')
-        ).filter(WastewaterPlant.date >= start_date, WastewaterPlant.date <= end_date)
+            ww.date,
+            db.func.sum(ww.input_flow_tqt).label('total_input'),
+            db.func.sum(ww.output_flow_tqt).label('total_output')
+        ).filter(ww.date >= start_date, ww.date <= end_date)
         
         if plant_ids:
-            query = query.filter(WastewaterPlant.plant_number.in_(plant_ids))
+            query = query.filter(ww.plant_number.in_(plant_ids))
         
-        rows = query.group_by(WastewaterPlant.date).order_by(WastewaterPlant.date).all()
+        rows = query.group_by(ww.date).order_by(ww.date).all()
         
         # Create data maps
         input_map = {r.date: float(r.total_input or 0) for r in rows}
@@ -755,16 +456,16 @@ def generate_wastewater_details(start_date, end_date, plant_ids=None, aggregate=
     else:
         # Individual plants mode: show each plant separately
         query = db.session.query(
-            WastewaterPlant.date,
-            WastewaterPlant.plant_number,
-            WastewaterPlant.input_flow_tqt,
-            WastewaterPlant.output_flow_tqt
-        ).filter(WastewaterPlant.date >= start_date, WastewaterPlant.date <= end_date)
+            ww.date,
+            ww.plant_number,
+            ww.input_flow_tqt,
+            ww.output_flow_tqt
+        ).filter(ww.date >= start_date, ww.date <= end_date)
         
         if plant_ids:
-            query = query.filter(WastewaterPlant.plant_number.in_(plant_ids))
+            query = query.filter(ww.plant_number.in_(plant_ids))
         
-        rows = query.order_by(WastewaterPlant.date, WastewaterPlant.plant_number).all()
+        rows = query.order_by(ww.date, ww.plant_number).all()
         
         # Organize data by plant
         plants_input = {}
@@ -849,108 +550,14 @@ def generate_customer_details(start_date, end_date, customer_ids=None, aggregate
     """Generate customer consumption details WITH daily-reading customers only (delta = sau - trước)"""
 
     # --- Dải ngày để fill dữ liệu trống ---
-    dates = []
-    calc_start = start_date - timedelta(days=1)
-    cur = start_date
-    while cur <= end_date:
-        dates.append(cur)
-        cur += timedelta(days=1)
-
-    # Đồng hồ 1
-    r1 = func.coalesce(CustomerReading.clean_water_reading, 0)
-    lag_r1 = func.lag(r1).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    delta1 = case(
-        (((r1 - func.coalesce(lag_r1, r1)) < 0), 0),
-        else_=(r1 - func.coalesce(lag_r1, r1))
-    )
-
-    # Đồng hồ 2 (có thể null với KH chỉ có 1 đồng hồ)
-    r2 = func.coalesce(getattr(CustomerReading, "clean_water_reading_2", 0), 0)
-    lag_r2 = func.lag(r2).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    delta2 = case(
-        (((r2 - func.coalesce(lag_r2, r2)) < 0), 0),
-        else_=(r2 - func.coalesce(lag_r2, r2))
-    )
-
-    # Đồng hồ 3 (có thể null với KH chỉ có 1 đồng hồ)
-    r3 = func.coalesce(getattr(CustomerReading, "clean_water_reading_3", 0), 0)
-    lag_r3 = func.lag(r3).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    delta3 = case(
-        (((r3 - func.coalesce(lag_r3, r3)) < 0), 0),
-        else_=(r3 - func.coalesce(lag_r3, r3))
-    )
-
-    companies_NHY = [
-        'Cty TNHH Dệt và Nhuộm Hưng Yên',    # Áp hệ số: đồng hồ 1 * 10, đồng hồ 2 * 1
-    ]
-    companies_LH = [
-        'Cty TNHH dệt may Lee Hing Việt Nam'    # Áp hệ số: đồng hồ 1, đồng hồ 2 * 10
-    ]
-
-    clean_delta_expr = case(
-        (Customer.company_name.in_(companies_NHY), (delta1 * 10) + delta2 + delta3),
-        (Customer.company_name.in_(companies_LH), delta1 + delta2*10), 
-        else_=delta1
-    )
-
-    # Tổng chỉ số NT dùng để trừ: ưu tiên đồng hồ, không có thì dùng tính theo tỉ lệ
-    total_waste = func.coalesce(CustomerReading.wastewater_reading,
-                                CustomerReading.wastewater_calculated)
-
-    # Chỉ số ngày trước theo cùng quy tắc
-    lag_total_waste = func.lag(total_waste).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-
-    # Delta ngày = max(curr - prev, 0) ; nếu không có ngày trước thì = 0
-    wastewater_delta_expr = case(
-        (((total_waste - func.coalesce(lag_total_waste, total_waste)) < 0), 0),
-        else_=(total_waste - func.coalesce(lag_total_waste, total_waste))
-    )
-
+    dates = date_range(start_date, end_date)
 
     # --- Subquery tính delta (chưa lọc theo customer_ids để có thể lấy Top 4) ---
-    delta_sq_all = (
-        db.session.query(
-            CustomerReading.date.label('date'),
-            CustomerReading.customer_id.label('customer_id'),
-            Customer.company_name.label('company_name'),
-            clean_delta_expr.label('clean_delta'),
-            wastewater_delta_expr.label('wastewater_delta')
-        )
-        .join(Customer, Customer.id == CustomerReading.customer_id)
-        .filter(
-            CustomerReading.date >= calc_start,
-            CustomerReading.date <= end_date,
-            Customer.is_active.is_(True),
-            Customer.daily_reading.is_(True),
-        )
-        .subquery()
-    )
+    delta_sq_all = customer_delta_subquery(start_date, end_date)
 
-    # --- Tự chọn Top 4 nếu cần (dựa trên tổng clean_delta) ---
+    # --- Tự chọn Top 4 nếu cần (bảng xếp hạng theo tổng nước sạch) ---
     if aggregate and not customer_ids:
-        top4_rows = (
-            db.session.query(
-                delta_sq_all.c.customer_id,
-                func.sum(delta_sq_all.c.clean_delta).label('sum_clean_delta')
-            )
-            .group_by(delta_sq_all.c.customer_id)
-            .order_by(func.sum(delta_sq_all.c.clean_delta).desc())
-            .limit(4)
-            .all()
-        )
-        customer_ids = [r.customer_id for r in top4_rows] or None
+        customer_ids = top_customer_ids(start_date, end_date) or None
 
     # --- Subquery delta cuối (có thể lọc theo customer_ids nếu truyền/đã xác định Top4)---
     delta_sq = (
@@ -1119,6 +726,7 @@ def generate_customer_details(start_date, end_date, customer_ids=None, aggregate
 
 @bp.route('/api/summary-six-lines')
 @login_required
+@query_budget(20, max_repeats=3)
 def summary_six_lines():
     # --- Phân quyền dựa trên role thay vì username cứng ---
     if not check_permissions(current_user.role, ['leadership', 'plant_manager', 'admin']):
@@ -1135,30 +743,16 @@ def summary_six_lines():
             if start_date > end_date:
                 return jsonify({'error': 'invalid_range'}), 400
         else:
-            # Mặc định kỳ 25 gần nhất, hỗ trợ kỳ trước
-            today = date.today()
-            def _cycle_start(ref_date: date) -> date:
-                if ref_date.day >= 26:
-                    return ref_date.replace(day=26)
-                prev_month = ref_date.replace(day=1) - timedelta(days=1)
-                return prev_month.replace(day=26)
-
-            current_cycle_start = _cycle_start(today)
+            # Mặc định kỳ 26 -> 25 hiện tại, hỗ trợ kỳ trước
+            start_date, end_date = billing_cycle_bounds(date.today())
             if period == 'previous':
-                prev_ref = current_cycle_start - timedelta(days=1)
-                start_date = _cycle_start(prev_ref)
-            else:
-                start_date = current_cycle_start
-            end_date = start_date + timedelta(days=30)
+                start_date, end_date = billing_cycle_bounds(start_date - timedelta(days=1))
     except Exception:
         return jsonify({'error': 'invalid_date'}), 400
 
     # --- Chuẩn bị dải ngày ---
-    dates = []
-    cur = start_date
-    while cur <= end_date:
-        dates.append(cur)
-        cur += timedelta(days=1)
+    ctx = RangeContext(start_date, end_date)
+    dates = ctx.dates
 
     if not dates:
         return jsonify({
@@ -1170,69 +764,13 @@ def summary_six_lines():
 
     labels = [d.strftime('%d/%m') for d in dates]
 
-    def _extract_series(data_resp, dataset_index=0):
-        series = [0.0] * len(dates)
-        try:
-            datasets = data_resp.get('chart_data', {}).get('datasets', [])
-            dataset = datasets[dataset_index]
-            raw_data = dataset.get('data', [])
-            for idx in range(len(dates)):
-                if idx < len(raw_data):
-                    series[idx] = float(raw_data[idx] or 0)
-        except (AttributeError, IndexError, TypeError):
-            pass
-        return series
-
-    # --- Lấy dữ liệu theo đúng logic từng biểu đồ ---
-    wells_resp = get_well_production_range(start_date, end_date, aggregate=True)
-    well_series = _extract_series(wells_resp, 0)
-
-    clean_resp = generate_clean_water_details(start_date, end_date)
-    clean_series = _extract_series(clean_resp, 0)
-
-    customers_resp = generate_customer_details(start_date, end_date, customer_ids=None, aggregate=True)
-    customer_clean_series = _extract_series(customers_resp, 0)
-
-    wastewater_resp = generate_wastewater_details(start_date, end_date, plant_ids=None, aggregate=True)
-    wastewater_series = _extract_series(wastewater_resp, 0)
-
-    # Hóa chất & bùn thải
-    chem_map = defaultdict(float)
-    sludge_map = defaultdict(float)
-
-    clean_chem_expr = (
-        func.coalesce(CleanWaterPlant.pac_usage, 0) +
-        func.coalesce(CleanWaterPlant.naoh_usage, 0) +
-        func.coalesce(CleanWaterPlant.polymer_usage, 0)
-    )
-    clean_chem_rows = (
-        db.session.query(
-            CleanWaterPlant.date,
-            func.sum(clean_chem_expr).label('total_chem')
-        )
-        .filter(CleanWaterPlant.date >= start_date, CleanWaterPlant.date <= end_date)
-        .group_by(CleanWaterPlant.date)
-        .all()
-    )
-    for row in clean_chem_rows:
-        chem_map[row.date] += float(row.total_chem or 0)
-
-    waste_aux_rows = (
-        db.session.query(
-            WastewaterPlant.date,
-            func.sum(func.coalesce(WastewaterPlant.sludge_output, 0)).label('total_sludge'),
-            func.sum(func.coalesce(WastewaterPlant.chemical_usage, 0)).label('total_chem')
-        )
-        .filter(WastewaterPlant.date >= start_date, WastewaterPlant.date <= end_date)
-        .group_by(WastewaterPlant.date)
-        .all()
-    )
-    for row in waste_aux_rows:
-        sludge_map[row.date] += float(row.total_sludge or 0)
-        chem_map[row.date] += float(row.total_chem or 0)
-
-    chem_series = [chem_map.get(d, 0.0) for d in dates]
-    sludge_series = [sludge_map.get(d, 0.0) for d in dates]
+    # --- Chỉ lấy đúng các series cần vẽ (daily_facts + 1 truy vấn tiêu thụ KH Top 4) ---
+    well_series = ctx.well_series()
+    clean_series = ctx.clean_water_series()
+    customer_clean_series, _ = ctx.customer_series()
+    wastewater_series = ctx.wastewater_series()
+    chem_series = ctx.chemical_series()
+    sludge_series = ctx.sludge_series()
 
     # Nước thải cân theo NM xử lý; tổng hợp giữ nguyên công thức NT + HC + BT
     total_series = [
@@ -1257,6 +795,7 @@ def summary_six_lines():
     })
 
 @bp.route('/api/customer-details', methods=['GET'], endpoint='customer_details_api')
+@query_budget(8, max_repeats=3)
 def customer_details_api():
     start = request.args.get('start_date')
     end = request.args.get('end_date')
@@ -1287,30 +826,9 @@ def customer_details_api():
         ]
         customer_ids = valid_ids[:4] if valid_ids else None
 
-    # Nếu không chọn khách hàng → chọn Top 4 trong nhóm hàng ngày
+    # Nếu không chọn khách hàng → chọn Top 4 trong nhóm hàng ngày (bảng xếp hạng theo tiêu thụ)
     if not customer_ids:
-        top4_rows = (
-            db.session.query(
-                Customer.id.label('cid'),
-                db.func.sum(
-                    CustomerReading.clean_water_reading +
-                    db.func.coalesce(CustomerReading.clean_water_reading_2, 0) +
-                    db.func.coalesce(CustomerReading.clean_water_reading_3, 0)
-                ).label('sum_clean')
-            )
-            .join(Customer)
-            .filter(
-                Customer.is_active == True,
-                Customer.daily_reading == True, 
-                CustomerReading.date >= start_date,
-                CustomerReading.date <= end_date,
-            )
-            .group_by(Customer.id)
-            .order_by(db.desc('sum_clean'))
-            .limit(4)
-            .all()
-        )
-        customer_ids = [r.cid for r in top4_rows] or None
+        customer_ids = top_customer_ids(start_date, end_date) or None
 
     # Gọi hàm sinh dữ liệu (đã có điều kiện daily_reading bên trong)
     data = generate_customer_details(
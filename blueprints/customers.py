@@ -1,9 +1,15 @@
 import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_required, current_user
+from sqlalchemy import func
 from app import db
 from models import Customer, CustomerReading
 from utils import check_permissions
+from chart_cache import chart_cache
+from kpi_snapshot import clear_kpi_cache
+from data_version import bump_data_version
+from customer_ranking import rebuild_customer_rankings, delete_customer_rankings
+from monthly_rollup import refresh_monthly_rollups
 
 bp = Blueprint('customers', __name__)
 logger = logging.getLogger(__name__)
@@ -62,7 +68,11 @@ def edit_customer(customer_id):
         if water_ratio is not None:
             customer.water_ratio = water_ratio
         db.session.add(customer)
+        rebuild_customer_rankings(customer.id)  # hệ số đồng hồ theo tên KH
+        bump_data_version()
         db.session.commit()
+        chart_cache.clear()
+        clear_kpi_cache()
         flash('Cập nhật khách hàng thành công.', 'success')
         session['active_tab'] = 'customers'
         return redirect(url_for('admin.admin'))
@@ -121,7 +131,10 @@ def new_customer():
             is_active=is_active
         )
         db.session.add(customer)
+        bump_data_version()
         db.session.commit()
+        chart_cache.clear()
+        clear_kpi_cache()
         flash('Thêm khách hàng thành công.', 'success')
         session['active_tab'] = 'customers'
         session['prev_active_tab'] = session.get('prev_active_tab', 'customers')
@@ -139,8 +152,18 @@ def delete_customer(customer_id):
         return redirect(url_for('admin.admin') + '#customers')
     customer = Customer.query.get_or_404(customer_id)
     try:
+        lo, hi = db.session.query(
+            func.min(CustomerReading.date), func.max(CustomerReading.date)
+        ).filter(CustomerReading.customer_id == customer.id).one()
         CustomerReading.query.filter_by(customer_id=customer.id).delete()
-        db.session.delete(customer); db.session.commit()
+        delete_customer_rankings(customer.id)
+        if lo and hi:
+            refresh_monthly_rollups(lo, hi)  # nước thải BB DN các tháng KH từng có số
+        db.session.delete(customer)
+        bump_data_version()
+        db.session.commit()
+        chart_cache.clear()
+        clear_kpi_cache()
         flash(f"Đã xóa khách hàng #{customer.id} - {customer.company_name}.", 'success')
     except Exception:
         db.session.rollback()
@@ -1,16 +1,36 @@
+import hmac
 import logging
+import math
 from datetime import datetime, date, timedelta
+from typing import Optional
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
 from flask_login import login_required, current_user
-from app import db
-from models import Well, Customer, WaterTank, WellProduction, CleanWaterPlant, WastewaterPlant, WaterTankLevel, CustomerReading
+from app import app, db
+from models import User, Well, Customer, WaterTank, WellProduction, CleanWaterPlant, WastewaterPlant, WaterTankLevel, CustomerReading
 from utils import check_permissions
 from model_helper import exists_by_keys, partial_update_fields, build_insert_payload, coerce_opt
+from clean_water_series import load_wells_delta_series
+from daily_facts import refresh_daily_facts_for_entry
+from monthly_rollup import refresh_monthly_rollups_for_entry
+from chart_cache import chart_cache
+from kpi_snapshot import invalidate_kpi_for_entry
+from data_version import bump_data_version
+from customer_consumption import update_reading_deltas
+from customer_ranking import refresh_customer_rankings
+from well_production import update_well_deltas
+from entry_upsert import upsert_entries, entry_lock_status
+from archive import is_archived_date
+from sqlite_profile import retry_on_locked, is_database_locked
+from query_budget import query_budget
+from read_replica import note_primary_write
+from bulk_ingest import ingest_records, iter_ndjson, iter_json_array, NDJSON_MIMETYPES, INGEST_TYPES
 
 bp = Blueprint('data_entry', __name__)
 logger = logging.getLogger(__name__)
 EDIT_WINDOW_HOURS = 48 # cho phép sửa dữ liệu nhập liệu trong vòng 48h
+INGEST_API_KEY_HEADER = 'X-API-Key'
 COMPANIES_OUTSOURCE = [
     'Công ty TNHH May Minh Anh',
     'Công ty TNHH mây tre xuất khẩu Phú Minh',
@@ -23,6 +43,19 @@ COMPANIES_OUTSOURCE = [
     'Công ty TNHH SX và TM Trung Dũng',
 ]
 
+# (khóa, tiền tố tên ô trong form: <tiền tố>_<customer_id>, nhãn báo lỗi)
+CUSTOMER_READING_FIELDS = (
+    ('cw1', 'clean_water', 'ĐH 1'),
+    ('cw2', 'clean_water_2', 'ĐH 2'),
+    ('cw3', 'clean_water_3', 'ĐH 3'),
+    ('outsource', 'clean_water_outsource', 'nước mua ngoài'),
+    ('ww', 'wastewater', 'nước thải'),
+)
+CUSTOMER_READING_UPDATE_COLUMNS = (
+    'clean_water_reading', 'clean_water_reading_2', 'clean_water_reading_3', 'clean_water_outsource',
+    'wastewater_reading', 'wastewater_calculated',
+)
+
 # Whitelist model + khóa duy nhất và kiểu dữ liệu cho khóa
 MODEL_EXISTS_MAP = {
     'clean_water_plant': (CleanWaterPlant, {'date': 'date'}),
@@ -32,11 +65,15 @@ MODEL_EXISTS_MAP = {
     'water_tank_level': (WaterTankLevel, {'date': 'date', 'tank_id': 'int'}),
 }
 
+def edit_cutoff() -> datetime:
+    """Dòng tạo từ thời điểm này trở đi còn sửa được."""
+    return datetime.utcnow() - timedelta(hours=EDIT_WINDOW_HOURS)
+
 def can_edit(instance) -> bool:
     """Cho phép sửa trong vòng 48h từ lúc tạo."""
     if not getattr(instance, "created_at", None):
         return False
-    return (datetime.utcnow() - instance.created_at) <= timedelta(hours=EDIT_WINDOW_HOURS)
+    return instance.created_at >= edit_cutoff()
 
 def parse_ymd(s: str) -> date:
     if not s:
@@ -63,6 +100,7 @@ def data_entry():
 
 @bp.route('/api/exists/<model_key>')
 @login_required
+@query_budget(5, max_repeats=3)
 def model_exists(model_key):
     """
     API tổng quát kiểm tra trùng dữ liệu theo khóa.
@@ -82,9 +120,50 @@ def model_exists(model_key):
         filters[k] = v
     return jsonify({'exists': exists_by_keys(Model, filters)})
 
+@bp.route('/api/entry-status')
+@login_required
+@query_budget(3, max_repeats=3)
+def entry_status():
+    """
+    GET ?date=YYYY-MM-DD
+    Trạng thái đã có/còn sửa được của cả 5 bảng nhập liệu và mọi đối tượng trong ngày, 1 lần gọi
+    (thay cho 5 API */exists; hạn sửa 48h tính trong SQL). Trả:
+      {date, archived,
+       clean_water_plant: {exists, editable, locked},
+       well_production | water_tank_level | customer_reading: {exists, editable_ids, locked_ids},
+       wastewater_plant: {exists, editable_numbers, locked_numbers}}
+    """
+    try:
+        the_date = parse_ymd(request.args.get('date'))
+    except ValueError:
+        return jsonify({'error': 'missing or invalid date'}), 400
+    status = entry_lock_status(the_date, edit_cutoff())
+
+    def _by_entity(model, editable_key='editable_ids', locked_key='locked_ids'):
+        rows = status[model]
+        return {
+            'exists': bool(rows),
+            editable_key: sorted(k for k, ok in rows.items() if ok),
+            locked_key: sorted(k for k, ok in rows.items() if not ok),
+        }
+
+    clean = status[CleanWaterPlant]
+    clean_editable = any(clean.values())
+    return jsonify({
+        'date': the_date.isoformat(),
+        'archived': any(is_archived_date(model, the_date) for model, _ in MODEL_EXISTS_MAP.values()),
+        'clean_water_plant': {'exists': bool(clean), 'editable': clean_editable,
+                              'locked': bool(clean) and not clean_editable},
+        'well_production': _by_entity(WellProduction),
+        'wastewater_plant': _by_entity(WastewaterPlant, 'editable_numbers', 'locked_numbers'),
+        'water_tank_level': _by_entity(WaterTankLevel),
+        'customer_reading': _by_entity(CustomerReading),
+    })
+
 # Back-compat: endpoint cũ cho CleanWaterPlant (gọi hàm tổng quát)
 @bp.route('/api/clean-water-plant/exists')
 @login_required
+@query_budget(5, max_repeats=3)
 def clean_water_plant_exists():
     """
     GET ?date=YYYY-MM-DD
@@ -105,24 +184,6 @@ def clean_water_plant_exists():
     editable = can_edit(entry)
     return jsonify({'exists': True, 'editable': editable, 'locked': not editable})
 
-def _clean_water_production_today_entry(today):
-    # Lấy tổng production của giếng ngày hôm nay
-    cur_sum = db.session.query(
-        db.func.sum(WellProduction.production)
-    ).filter(WellProduction.date == today).scalar() or 0
-    
-    # Kiểm tra xem có phải ngày đầu tháng không
-    if today.day == 1:
-        # Ngày đầu tháng: sum(production) - 0
-        return float(cur_sum)
-    else:
-        # Các ngày khác: today - yesterday
-        prev_day = today - timedelta(days=1)
-        prev_sum = db.session.query(
-            db.func.sum(WellProduction.production)
-        ).filter(WellProduction.date == prev_day).scalar() or 0
-        
-        return float(cur_sum) - float(prev_sum)
 def _compute_clean_water_output_for_date(the_date: date, jasan_raw:float):
     """
     NS SX ngày n = 0.97 * ( H(n) - J(n) )
@@ -131,7 +192,7 @@ def _compute_clean_water_output_for_date(the_date: date, jasan_raw:float):
     """
     try:
         # H(n): tổng giếng theo ngày
-        wells_delta = float(_clean_water_production_today_entry(the_date))  # đã là today - yesterday
+        wells_delta = float(load_wells_delta_series(the_date, the_date)[0])  # đã là today - yesterday
         print('test',wells_delta)
 
         # J(n): Jasan thô trong ngày
@@ -157,6 +218,22 @@ def _compute_clean_water_output_for_date(the_date: date, jasan_raw:float):
         return {'ready': False, 'value': None, 'detail': {'error': str(e)}}
 
 
+def _invalidate_caches(entry_date: date, end_date: Optional[date] = None) -> None:
+    # gọi sau commit: cache biểu đồ và KPI có dải ngày chứa ngày n..end_date+1 (mặc định end_date = n)
+    chart_cache.invalidate_dates(entry_date, (end_date or entry_date) + timedelta(days=1))
+    invalidate_kpi_for_entry(entry_date, end_date)
+    note_primary_write(entry_date)
+
+
+@bp.errorhandler(OperationalError)
+def _database_busy(e):
+    # retry_on_locked đã thử lại hết lượt mà CSDL vẫn khóa
+    if not is_database_locked(e):
+        raise e
+    db.session.rollback()
+    flash('Cơ sở dữ liệu đang bận, vui lòng lưu lại sau ít giây.', 'warning')
+    return redirect(url_for('data_entry.data_entry'))
+
 # Helper: ở lại đúng tab
 def _redirect_to_tab(anchor: str):
     return redirect(url_for('data_entry.data_entry') + f'#{anchor}')
@@ -177,6 +254,7 @@ def parse_float_opt(val):
 
 @bp.route('/api/well-production/exists')
 @login_required
+@query_budget(5, max_repeats=3)
 def well_production_exists():
     """
     Input: date, well_ids=[]
@@ -225,6 +303,7 @@ def well_production_exists():
 
 @bp.route('/api/wastewater-plant/exists')
 @login_required
+@query_budget(5, max_repeats=3)
 def wastewater_plant_exists():
     # GET ?date=YYYY-MM-DD&plant_numbers=1,2
     date_str = request.args.get('date')
@@ -258,6 +337,7 @@ def wastewater_plant_exists():
 
 @bp.route('/api/water-tank-level/exists')
 @login_required
+@query_budget(5, max_repeats=3)
 def water_tank_level_exists():
     """GET ?date=YYYY-MM-DD&tank_ids=1,2,3 -> {exists: bool, tanks: [ids]}"""
     date_str = request.args.get('date')
@@ -291,38 +371,56 @@ def water_tank_level_exists():
 
 @bp.route('/submit-well-data', methods=['POST'])
 @login_required
+@retry_on_locked
+@query_budget(20, max_repeats=3)
 def submit_well_data():
     try:
         entry_date = parse_ymd(request.form['date'])  # <-- CHUYỂN THÀNH date
-        flag = 0
-        for well_id in request.form.getlist('well_ids'):
-            wid = int(well_id)
+        if is_archived_date(WellProduction, entry_date):
+            flash(f"Năm {entry_date.year} đã lưu trữ, không thể nhập/sửa.", "warning")
+            return redirect(url_for('data_entry.data_entry'))
+        rows = []
+        for wid in [int(w) for w in request.form.getlist('well_ids')]:
             raw = (request.form.get(f'production_{wid}', '') or '').strip()
-            production = float(raw) if raw != '' else 0.0
-            existing = db.session.query(WellProduction).filter_by(
-                well_id=wid, date=entry_date                # <-- dùng date
-            ).first()
-
-            if not existing:
-                db.session.add(WellProduction(
-                    well_id=wid,
-                    date=entry_date,                        # <-- date object
-                    production=production,
-                    created_by=current_user.id
-                ))
-                flag = 1
-                # print("1",flag)
+            rows.append({
+                'well_id': wid,
+                'date': entry_date,
+                'production': float(raw) if raw != '' else 0.0,
+                'created_by': current_user.id,
+            })
+
+        # 1 truy vấn IN lấy các dòng đã có + 1 câu INSERT ... ON CONFLICT cho cả lô (hạn sửa edit_cutoff() xét theo lô)
+        result = upsert_entries(WellProduction, rows, update_columns=['production'], editable_since=edit_cutoff())
+        inserted = len(result['inserted'])
+        updated = len(result['updated'])
+        locked_ids = [well_id for well_id, _ in result['locked']]
+
+        if inserted == 0 and updated == 0:
+            if locked_ids:
+                flash(f"Ngày {entry_date.strftime('%d/%m/%Y')} đã khóa (quá {EDIT_WINDOW_HOURS} giờ).", "warning")
             else:
-                if not can_edit(existing):
-                    flash(f"Ngày {entry_date.strftime('%d/%m/%Y')} đã khóa (quá 24 giờ).", "warning")
-                    return redirect(url_for('data_entry.data_entry'))
-                existing.production = production
-                flag = 1
-                # print(2,flag)
+                flash('Không có dữ liệu để lưu', 'warning')
+            return redirect(url_for('data_entry.data_entry'))
+
+        # daily_delta của ngày này và ngày kế tiếp
+        update_well_deltas([well_id for well_id, _ in result['inserted'] + result['updated']], entry_date)
+        refresh_daily_facts_for_entry(entry_date)
+        bump_data_version()
         db.session.commit()
-        if flag: flash('Đã lưu dữ liệu giếng.', 'success')
+        _invalidate_caches(entry_date)
+        parts = []
+        if inserted:
+            parts.append(f'Thêm mới {inserted} giếng')
+        if updated:
+            parts.append(f'Cập nhật {updated} giếng')
+        flash(f'Đã lưu dữ liệu giếng: {"; ".join(parts)}.', 'success')
+        if locked_ids:
+            flash(f'Bỏ qua các giếng đã khóa (quá {EDIT_WINDOW_HOURS} giờ): {", ".join(str(i) for i in locked_ids)}.',
+                  'warning')
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # retry_on_locked chạy lại
         flash(f'Lỗi lưu dữ liệu giếng: {e}', 'danger')
 
     return redirect(url_for('data_entry.data_entry'))
@@ -331,13 +429,17 @@ def submit_well_data():
 
 @bp.route('/clean-water/submit', methods=['POST'], endpoint='submit_clean_water_plant')
 @login_required
+@retry_on_locked
+@query_budget(20, max_repeats=3)
 def submit_clean_water_plant():
     if not check_permissions(current_user.role, ['data_entry', 'plant_manager', 'admin']):
         flash('You do not have permission to perform this action', 'error')
         return redirect(url_for('dashboard.dashboard'))
     try:
         entry_date = parse_ymd(request.form['date'])
-        existing = CleanWaterPlant.query.filter_by(date=entry_date).first()
+        if is_archived_date(CleanWaterPlant, entry_date):
+            flash(f'Năm {entry_date.year} đã lưu trữ, không thể nhập/sửa.', 'warning')
+            return redirect(url_for('data_entry.data_entry') + '#clean-water')
         field_types = {
             'electricity': 'float',
             'pac_usage': 'float',
@@ -353,26 +455,34 @@ def submit_clean_water_plant():
         payload = build_insert_payload(request.form, field_types)
         payload['clean_water_output'] = compute_res.get('value') if compute_res.get('ready') else None
 
-        if existing:
-            if not can_edit(existing):
-                flash(f'Ngày {entry_date:%d/%m/%Y} đã khóa (quá 24 giờ).', 'warning')
-                return redirect(url_for('data_entry.data_entry') + '#clean-water')
-            for field, value in payload.items():
-                setattr(existing, field, value)
-            db.session.commit()
+        result = upsert_entries(
+            CleanWaterPlant, [{'date': entry_date, **payload, 'created_by': current_user.id}],
+            update_columns=payload.keys(), editable_since=edit_cutoff()
+        )
+        if result['locked']:
+            flash(f'Ngày {entry_date:%d/%m/%Y} đã khóa (quá 24 giờ).', 'warning')
+            return redirect(url_for('data_entry.data_entry') + '#clean-water')
+        refresh_daily_facts_for_entry(entry_date)
+        refresh_monthly_rollups_for_entry(entry_date)
+        bump_data_version()
+        db.session.commit()
+        _invalidate_caches(entry_date)
+        if result['updated']:
             flash('Cập nhật dữ liệu nhà máy nước sạch thành công', 'success')
         else:
-            db.session.add(CleanWaterPlant(date=entry_date, **payload, created_by=current_user.id))
-            db.session.commit()
             flash('Thêm mới dữ liệu nhà máy nước sạch thành công', 'success')
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # retry_on_locked chạy lại
         flash(f'Error saving data: {str(e)}', 'error')
     return redirect(url_for('data_entry.data_entry') + '#clean-water')
 
 
 @bp.route('/submit-wastewater-plant', methods=['POST'])
 @login_required
+@retry_on_locked
+@query_budget(20, max_repeats=3)
 def submit_wastewater_plant():
     if not check_permissions(current_user.role, ['data_entry', 'plant_manager', 'admin']):
         flash('You do not have permission to perform this action', 'error')
@@ -381,45 +491,55 @@ def submit_wastewater_plant():
         entry_date = parse_ymd(request.form['date'])
         plant_number = int(request.form['plant_number'])
         anchor = f'wastewater-{plant_number}'
+        if is_archived_date(WastewaterPlant, entry_date):
+            flash(f'Năm {entry_date.year} đã lưu trữ, không thể nhập/sửa.', 'warning')
+            return _redirect_to_tab(anchor)
 
-        existing = WastewaterPlant.query.filter_by(date=entry_date, plant_number=plant_number).first()
         fields = ['wastewater_meter', 'input_flow_tqt', 'output_flow_tqt', 'sludge_output', 'electricity', 'chemical_usage']
         payload = {}
         for f in fields:
             v = parse_float_opt(request.form.get(f))
             payload[f] = v if v is not None else 0.0
 
-        if existing:
-            if not can_edit(existing):
-                flash(f'Ngày {entry_date:%d/%m/%Y} cho NMNT {plant_number} đã khóa (quá 24 giờ).', 'warning')
-                return _redirect_to_tab(anchor)
-            for field, value in payload.items():
-                setattr(existing, field, value)
-            db.session.commit()
+        result = upsert_entries(
+            WastewaterPlant,
+            [{'plant_number': plant_number, 'date': entry_date, 'created_by': current_user.id, **payload}],
+            update_columns=payload.keys(), editable_since=edit_cutoff()
+        )
+        if result['locked']:
+            flash(f'Ngày {entry_date:%d/%m/%Y} cho NMNT {plant_number} đã khóa (quá 24 giờ).', 'warning')
+            return _redirect_to_tab(anchor)
+        refresh_daily_facts_for_entry(entry_date)
+        refresh_monthly_rollups_for_entry(entry_date)
+        bump_data_version()
+        db.session.commit()
+        _invalidate_caches(entry_date)
+        if result['updated']:
             flash(f'Cập nhật dữ liệu NMNT {plant_number} thành công', 'success')
         else:
-            db.session.add(WastewaterPlant(
-                plant_number=plant_number, date=entry_date, created_by=current_user.id, **payload
-            ))
-            db.session.commit()
             flash(f'Thêm mới dữ liệu NMNT {plant_number} thành công', 'success')
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # retry_on_locked chạy lại
         flash(f'Error saving data: {str(e)}', 'error')
     return _redirect_to_tab(anchor)
 
 
 @bp.route('/submit-tank-levels', methods=['POST'])
 @login_required
+@retry_on_locked
+@query_budget(20, max_repeats=3)
 def submit_tank_levels():
     if not check_permissions(current_user.role, ['data_entry', 'plant_manager', 'admin']):
         flash('You do not have permission to perform this action', 'error')
         return redirect(url_for('dashboard.dashboard'))
     try:
         entry_date = parse_ymd(request.form['date'])
-        inserted = 0
-        updated = 0
-        locked_ids = []
+        if is_archived_date(WaterTankLevel, entry_date):
+            flash(f'Năm {entry_date.year} đã lưu trữ, không thể nhập/sửa.', 'warning')
+            return redirect(url_for('data_entry.data_entry') + '#tanks')
+        rows = []
 
         for tank_id_raw in request.form.getlist('tank_ids'):
             try:
@@ -432,22 +552,12 @@ def submit_tank_levels():
             if level is None:
                 continue  # không nhập
 
-            existing = WaterTankLevel.query.filter_by(tank_id=tank_id, date=entry_date).first()
-            if existing:
-                if not can_edit(existing):
-                    locked_ids.append(tank_id)
-                    continue
-                existing.level = level
-                updated += 1
-                continue
+            rows.append({'tank_id': tank_id, 'date': entry_date, 'level': level, 'created_by': current_user.id})
 
-            db.session.add(WaterTankLevel(
-                tank_id=tank_id,
-                date=entry_date,
-                level=level,
-                created_by=current_user.id
-            ))
-            inserted += 1
+        result = upsert_entries(WaterTankLevel, rows, update_columns=['level'], editable_since=edit_cutoff())
+        inserted = len(result['inserted'])
+        updated = len(result['updated'])
+        locked_ids = [tank_id for tank_id, _ in result['locked']]
 
         if inserted == 0 and updated == 0:
             if locked_ids:
@@ -456,7 +566,10 @@ def submit_tank_levels():
                 flash('Không có dữ liệu để lưu', 'warning')
             return redirect(url_for('data_entry.data_entry') + '#tanks')
 
+        refresh_daily_facts_for_entry(entry_date)
+        bump_data_version()
         db.session.commit()
+        _invalidate_caches(entry_date)
         parts = []
         if inserted:
             parts.append(f'Thêm mới {inserted} bể')
@@ -467,12 +580,15 @@ def submit_tank_levels():
             flash(f'Bỏ qua các bể đã khóa (quá 24 giờ): {", ".join(str(i) for i in locked_ids)}.', 'warning')
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # retry_on_locked chạy lại
         flash(f'Lỗi khi lưu dữ liệu: {str(e)}', 'error')
     return redirect(url_for('data_entry.data_entry') + '#tanks')
 
 
 @bp.route('/api/customer-readings/exists')
 @login_required
+@query_budget(5, max_repeats=3)
 def customer_readings_exists():
     # GET ?date=YYYY-MM-DD&customer_ids=1,2,3
     date_str = request.args.get('date')
@@ -504,18 +620,24 @@ def customer_readings_exists():
 
 @bp.route('/submit-customer-readings', methods=['POST'])
 @login_required
+@retry_on_locked
+@query_budget(30, max_repeats=3)
 def submit_customer_readings():
     if not check_permissions(current_user.role, ['data_entry', 'plant_manager', 'admin']):
         flash('You do not have permission to perform this action', 'error')
         return redirect(url_for('dashboard.dashboard'))
     try:
         entry_date = parse_ymd(request.form['date'])
+        if is_archived_date(CustomerReading, entry_date):
+            flash(f'Năm {entry_date.year} đã lưu trữ, không thể nhập/sửa.', 'warning')
+            return redirect(url_for('data_entry.data_entry') + '#customers')
         customer_ids = [int(x) for x in request.form.getlist('customer_ids') if str(x).isdigit()]
         if not customer_ids:
             flash('Không có khách hàng nào để lưu', 'warning')
             return redirect(url_for('data_entry.data_entry') + '#customers')
 
         def _pfloat(val):
+            # None nếu để trống; ValueError nếu không phải số
             s = ('' if val is None else str(val).strip())
             if s == '':
                 return None
@@ -523,89 +645,75 @@ def submit_customer_readings():
                 s = s.replace(',', '.')
             else:
                 s = s.replace(',', '')
-            try:
-                return float(s)
-            except ValueError:
-                return None
+            v = float(s)
+            if not math.isfinite(v):
+                raise ValueError(s)
+            return v
 
+        # 1 truy vấn lấy hệ số NT của cả lô
+        ratios = dict(db.session.query(Customer.id, Customer.water_ratio).filter(Customer.id.in_(customer_ids)).all())
+
+        # Kiểm tra từng KH, gom toàn bộ lỗi để báo trong 1 lần
+        errors = {}
         filled = {}
         for cid in customer_ids:
-            cw1_raw = request.form.get(f'clean_water_{cid}', '')
-            cw2_raw = request.form.get(f'clean_water_2_{cid}', '')
-            cw3_raw = request.form.get(f'clean_water_3_{cid}', '')
-            ww_raw  = request.form.get(f'wastewater_{cid}', '')
-            outsource_raw = request.form.get(f'clean_water_outsource_{cid}', '')
-            cw1_val = _pfloat(cw1_raw)
-            cw2_val = _pfloat(cw2_raw)
-            cw3_val = _pfloat(cw3_raw)
-            outsource_val = _pfloat(outsource_raw)
-            ww_val  = _pfloat(ww_raw) if ww_raw != '' else None
-            if any(val is not None for val in (cw1_val, cw2_val, cw3_val, outsource_val, ww_val)):
-                filled[cid] = {
-                    'cw1': cw1_val,
-                    'cw2': cw2_val,
-                    'cw3': cw3_val,
-                    'outsource': outsource_val,
-                    'ww': ww_val,
-                }
+            vals, bad = {}, []
+            for key, field, label in CUSTOMER_READING_FIELDS:
+                raw = request.form.get(f'{field}_{cid}', '')
+                try:
+                    vals[key] = _pfloat(raw)
+                except ValueError:
+                    vals[key] = None
+                    bad.append(f'{label} "{raw}" không phải số')
+                    continue
+                if vals[key] is not None and vals[key] < 0:
+                    bad.append(f'{label} âm')
+            if not any(v is not None for v in vals.values()) and not bad:
+                continue  # không nhập
+            if cid not in ratios:
+                bad.append('không tồn tại')
+            if bad:
+                errors[cid] = bad
+                continue
+            filled[cid] = vals
 
+        if errors:
+            flash('Bỏ qua dữ liệu không hợp lệ: ' + '; '.join(
+                f'KH {cid}: {", ".join(msgs)}' for cid, msgs in errors.items()), 'warning')
         if not filled:
-            flash('Không có dữ liệu để lưu', 'warning')
+            if not errors:
+                flash('Không có dữ liệu để lưu', 'warning')
             return redirect(url_for('data_entry.data_entry') + '#customers')
 
-        existing_rows = CustomerReading.query.filter(
-            CustomerReading.date == entry_date,
-            CustomerReading.customer_id.in_(list(filled.keys()))
-        ).all()
-        exist_ids = {r.customer_id for r in existing_rows}
-        existing_map = {r.customer_id: r for r in existing_rows}
-
-        inserted = 0
-        updated = 0
-        locked_ids = []
+        # Nước thải tính theo hệ số cho cả lô (chỉ khi không nhập số đồng hồ NT)
+        rows = []
         for cid, vals in filled.items():
-            cw1_val, cw2_val,cw3_val, ww_val = vals['cw1'], vals['cw2'], vals['cw3'],vals['ww']
-            customer = Customer.query.get(cid)
             try:
-                ratio = float(customer.water_ratio or 0)
+                ratio = float(ratios[cid] or 0)
             except (TypeError, ValueError):
                 ratio = 0.0
-
-            outsource_val = vals['outsource']
-            total_clean = (cw1_val or 0.0) + (cw2_val or 0.0) + (cw3_val or 0.0)
-            total_with_outsource = total_clean + (outsource_val or 0.0)
-            ww_calc = None if ww_val is not None else (
-                total_with_outsource * ratio
-                if any(v is not None for v in (cw1_val, cw2_val, cw3_val, outsource_val))
-                else None
-            )
-
-            existing = existing_map.get(cid)
-            if existing:
-                if not can_edit(existing):
-                    locked_ids.append(cid)
-                    continue
-                existing.clean_water_reading = (cw1_val if cw1_val is not None else 0.0)
-                existing.clean_water_reading_2 = (cw2_val if cw2_val is not None else 0.0)
-                existing.clean_water_reading_3 = (cw3_val if cw3_val is not None else 0.0)
-                existing.clean_water_outsource = (outsource_val if outsource_val is not None else 0.0)
-                existing.wastewater_reading = ww_val
-                existing.wastewater_calculated = (ww_calc if ww_val is None else None)
-                updated += 1
-                continue
-
-            db.session.add(CustomerReading(
-                customer_id=cid,
-                date=entry_date,
-                clean_water_reading=(cw1_val if cw1_val is not None else 0.0),
-                clean_water_reading_2=(cw2_val if cw2_val is not None else 0.0),
-                clean_water_reading_3=(cw3_val if cw3_val is not None else 0.0),
-                clean_water_outsource=(outsource_val if outsource_val is not None else 0.0),
-                wastewater_reading=ww_val,
-                wastewater_calculated=(ww_calc if ww_val is None else None),
-                created_by=current_user.id
-            ))
-            inserted += 1
+            clean_vals = (vals['cw1'], vals['cw2'], vals['cw3'], vals['outsource'])
+            ww_calc = None
+            if vals['ww'] is None and any(v is not None for v in clean_vals):
+                ww_calc = sum(v or 0.0 for v in clean_vals) * ratio
+            rows.append({
+                'customer_id': cid,
+                'date': entry_date,
+                'clean_water_reading': vals['cw1'] if vals['cw1'] is not None else 0.0,
+                'clean_water_reading_2': vals['cw2'] if vals['cw2'] is not None else 0.0,
+                'clean_water_reading_3': vals['cw3'] if vals['cw3'] is not None else 0.0,
+                'clean_water_outsource': vals['outsource'] if vals['outsource'] is not None else 0.0,
+                'wastewater_reading': vals['ww'],
+                'wastewater_calculated': ww_calc,
+                'created_by': current_user.id,
+            })
+
+        # 1 truy vấn IN lấy dòng đã có + 1 câu INSERT ... ON CONFLICT cho cả dòng mới lẫn dòng sửa
+        result = upsert_entries(CustomerReading, rows, update_columns=CUSTOMER_READING_UPDATE_COLUMNS,
+                                editable_since=edit_cutoff())
+        inserted = len(result['inserted'])
+        updated = len(result['updated'])
+        locked_ids = [cid for cid, _ in result['locked']]
 
         if inserted == 0 and updated == 0:
             if locked_ids:
@@ -614,7 +722,14 @@ def submit_customer_readings():
                 flash('Không có dữ liệu để lưu', 'warning')
             return redirect(url_for('data_entry.data_entry') + '#customers')
 
+        # Δ của dòng vừa lưu và dòng kế tiếp (so với lần đọc trước của từng KH), rồi bảng xếp hạng
+        saved_ids = [cid for cid, _ in result['inserted'] + result['updated']]
+        last_changed = update_reading_deltas(saved_ids, entry_date)
+        refresh_customer_rankings(entry_date, last_changed, saved_ids)
+        refresh_monthly_rollups_for_entry(entry_date)
+        bump_data_version()
         db.session.commit()
+        _invalidate_caches(entry_date, last_changed)
         parts = []
         if inserted:
             parts.append(f'Thêm mới {inserted} khách hàng')
@@ -625,5 +740,63 @@ def submit_customer_readings():
             flash(f'Bỏ qua các khách hàng đã khóa (quá 24 giờ): {", ".join(str(i) for i in locked_ids)}.', 'warning')
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # retry_on_locked chạy lại
         flash(f'Error saving data: {str(e)}', 'error')
     return redirect(url_for('data_entry.data_entry') + '#customers')
+
+
+def _ingest_api_user(token: str) -> Optional[User]:
+    """User ứng với khóa API (INGEST_API_KEYS), None nếu khóa sai hoặc user không còn hoạt động."""
+    username = None
+    for key, name in app.config['INGEST_API_KEYS'].items():
+        if hmac.compare_digest(key.encode(), token.encode()):
+            username = name
+    if username is None:
+        return None
+    return User.query.filter_by(username=username, is_active=True).first()
+
+
+@bp.route('/api/ingest', methods=['POST'])
+def ingest_entries():
+    """
+    Nạp hàng loạt số liệu giếng/bể/KH/NMNT/NMNS (vd. xuất từ SCADA/PLC), xem bulk_ingest.py.
+    Xác thực: header X-API-Key với khóa trong INGEST_API_KEYS (máy gửi tự động, không cần phiên đăng nhập/cookie;
+    bản ghi ghi nhận theo user gắn với khóa), hoặc phiên đăng nhập như các trang khác. Khóa sai -> 401.
+    Thân request: mảng JSON (Content-Type: application/json) hoặc NDJSON (application/x-ndjson), mỗi bản ghi
+      {"type": "well_production", "date": "YYYY-MM-DD", "well_id": 1, "production": 123.4}
+    Query: type=<loại mặc định cho bản ghi không có type>, results=errors (chỉ trả bản ghi không ghi được).
+    Ghi theo khối INGEST_CHUNK_ROWS bản ghi/transaction; khóa 48h, kỳ báo cáo đã khóa và năm lưu trữ được tôn trọng.
+    Trả: {records, chunks, summary: {trạng thái: số bản ghi}, date_range, results: [{index, type, status, error?}], error?}
+    Ví dụ: curl -H "X-API-Key: <khóa>" -H "Content-Type: application/x-ndjson" --data-binary @readings.ndjson .../api/ingest
+    """
+    api_key = request.headers.get(INGEST_API_KEY_HEADER)
+    if api_key is not None:
+        user = _ingest_api_user(api_key)
+        if user is None:
+            return jsonify({'error': 'invalid API key'}), 401
+    elif current_user.is_authenticated:
+        user = current_user
+    else:
+        return app.login_manager.unauthorized()
+    if not check_permissions(user.role, ['data_entry', 'plant_manager', 'admin']):
+        return jsonify({'error': 'forbidden'}), 403
+    default_type = request.args.get('type') or None
+    if default_type is not None and default_type not in INGEST_TYPES:
+        return jsonify({'error': f'type "{default_type}" không hợp lệ'}), 400
+    if request.mimetype in NDJSON_MIMETYPES:
+        records = iter_ndjson(request.stream)
+    elif request.mimetype == 'application/json':
+        records = iter_json_array(request.stream)
+    else:
+        return jsonify({'error': 'Content-Type phải là application/json hoặc application/x-ndjson'}), 415
+
+    max_records = app.config['INGEST_MAX_RECORDS']
+    report = ingest_records(
+        records, user_id=user.id, editable_since=edit_cutoff(), default_type=default_type,
+        chunk_rows=app.config['INGEST_CHUNK_ROWS'], max_records=max_records,
+        keep_results=request.args.get('results') != 'errors',
+    )
+    if report.get('error'):
+        return jsonify(report), (413 if report['records'] >= max_records else 400)
+    return jsonify(report)
@@ -3,14 +3,31 @@ import logging
 from flask import Blueprint, request, jsonify
 from models import db, WellProduction, CleanWaterPlant, WaterTank,WaterTankLevel, WastewaterPlant,Customer,CustomerReading,Well
 from sqlalchemy import func
-from datetime import timedelta
+from datetime import datetime, timedelta
 from collections import defaultdict
+from archive import entry_source
+from query_budget import query_budget
+from read_replica import use_read_replica
 
-bp = Blueprint("history", __name__, url_prefix="/api") 
+bp = Blueprint("history", __name__, url_prefix="/api")
+use_read_replica(bp)
 logger = logging.getLogger(__name__)
 
 
+def _parse_date_opt(s):
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date() if s else None
+    except ValueError:
+        return None
+
+
+def _range_source(model, start_date_str, end_date_str):
+    # start_date/end_date truyền vào: chỉ đọc thêm bảng lưu trữ khi dải chạm năm đã lưu trữ
+    return entry_source(model, _parse_date_opt(start_date_str), _parse_date_opt(end_date_str))
+
+
 @bp.route("/well-productions/history", methods=["GET"])
+@query_budget(8, max_repeats=3)
 def well_productions_history():
     try:
         page = int(request.args.get("page", 1))
@@ -18,13 +35,15 @@ def well_productions_history():
     except ValueError:
         return jsonify({"error": "page/per_page must be integers"}), 400
 
-    q = db.session.query(WellProduction)
+    # danh sách toàn bộ lịch sử -> gồm cả các năm đã lưu trữ
+    wp = entry_source(WellProduction)
+    q = db.session.query(wp)
 
     well_id = request.args.get("well_id")
     if well_id:
-        q = q.filter(WellProduction.well_id == int(well_id))
+        q = q.filter(wp.well_id == int(well_id))
 
-    q = q.order_by(WellProduction.date.desc(), WellProduction.id.desc())
+    q = q.order_by(wp.date.desc(), wp.id.desc())
     pagination = q.paginate(page=page, per_page=per_page, error_out=False)
 
     items = [
@@ -52,6 +71,7 @@ def well_productions_history():
 
 # blueprints/history.py
 @bp.route("/well-productions/history/pivot", methods=["GET"])
+@query_budget(8, max_repeats=3)
 def well_productions_history_pivot():
     """
     Bảng pivot: mỗi dòng = 1 ngày, phân trang theo ngày (mặc định 20/ngày).
@@ -66,9 +86,6 @@ def well_productions_history_pivot():
     except ValueError:
         return jsonify({"error": "page must be a positive integer"}), 400
 
-    # --- Base query ---
-    q_base = db.session.query(WellProduction)
-
     # --- Phạm vi ngày ---
     start_date_str = request.args.get("start_date")
     end_date_str = request.args.get("end_date")
@@ -78,16 +95,19 @@ def well_productions_history_pivot():
 
     if start_date_str or end_date_str:
         # Ưu tiên khoảng ngày truyền vào (nếu có)
+        wp = _range_source(WellProduction, start_date_str, end_date_str)
+        q_base = db.session.query(wp)
         if start_date_str:
-            q_base = q_base.filter(WellProduction.date >= start_date_str)
+            q_base = q_base.filter(wp.date >= start_date_str)
         if end_date_str:
-            q_base = q_base.filter(WellProduction.date <= end_date_str)
+            q_base = q_base.filter(wp.date <= end_date_str)
     else:
         # Dựa trên ngày MỚI NHẤT có trong DB, lấy về N ngày gần nhất
         latest_date = db.session.query(func.max(WellProduction.date)).scalar()
         if latest_date:
             cutoff = latest_date - timedelta(days=range_days - 1)
-            q_base = q_base.filter(WellProduction.date >= cutoff)
+            wp = entry_source(WellProduction, cutoff, latest_date)
+            q_base = db.session.query(wp).filter(wp.date >= cutoff)
         else:
             # Không có dữ liệu
             return jsonify(
@@ -107,13 +127,13 @@ def well_productions_history_pivot():
         except Exception:
             return jsonify({"error": "well_ids must be comma-separated integers"}), 400
         if well_id_list:
-            q_base = q_base.filter(WellProduction.well_id.in_(well_id_list))
+            q_base = q_base.filter(wp.well_id.in_(well_id_list))
 
     # --- Lấy danh sách NGÀY distinct để phân trang ---
     dates_q = (
-        q_base.with_entities(WellProduction.date)
+        q_base.with_entities(wp.date)
         .distinct()
-        .order_by(WellProduction.date.desc())
+        .order_by(wp.date.desc())
     )
 
     all_dates = [row.date for row in dates_q.all()]  # đã được filter theo range_days
@@ -134,15 +154,15 @@ def well_productions_history_pivot():
 
     # --- Lấy dữ liệu các ngày trong trang và pivot ---
     rs = (db.session.query(
-            WellProduction.date,
+            wp.date,
             Well.code.label('well_code'),
-            WellProduction.production
+            wp.production
          )
-         .join(Well, WellProduction.well_id == Well.id)
-         .filter(WellProduction.date.in_(page_dates)))
+         .join(Well, wp.well_id == Well.id)
+         .filter(wp.date.in_(page_dates)))
 
     if well_id_list:
-        rs = rs.filter(WellProduction.well_id.in_(well_id_list))
+        rs = rs.filter(wp.well_id.in_(well_id_list))
 
     rows = rs.all()
 
@@ -177,6 +197,7 @@ def well_productions_history_pivot():
     })
 
 @bp.route("/clean-water/consumption/history", methods=["GET"])
+@query_budget(8, max_repeats=3)
 def clean_water_consumption_history():
     """
     Lịch sử theo ngày cho Nhà máy nước sạch:
@@ -193,9 +214,6 @@ def clean_water_consumption_history():
         return jsonify({"error": "page must be a positive integer"}), 400
     per_page = 20
 
-    # --- base query ---
-    q_base = db.session.query(CleanWaterPlant)
-
     # --- phạm vi ngày ---
     start_date_str = request.args.get("start_date")
     end_date_str = request.args.get("end_date")
@@ -207,15 +225,18 @@ def clean_water_consumption_history():
         range_days = 30
 
     if start_date_str or end_date_str:
+        cw = _range_source(CleanWaterPlant, start_date_str, end_date_str)
+        q_base = db.session.query(cw)
         if start_date_str:
-            q_base = q_base.filter(CleanWaterPlant.date >= start_date_str)
+            q_base = q_base.filter(cw.date >= start_date_str)
         if end_date_str:
-            q_base = q_base.filter(CleanWaterPlant.date <= end_date_str)
+            q_base = q_base.filter(cw.date <= end_date_str)
     else:
         latest_date = db.session.query(func.max(CleanWaterPlant.date)).scalar()
         if latest_date:
             cutoff = latest_date - timedelta(days=range_days - 1)
-            q_base = q_base.filter(CleanWaterPlant.date >= cutoff)
+            cw = entry_source(CleanWaterPlant, cutoff, latest_date)
+            q_base = db.session.query(cw).filter(cw.date >= cutoff)
         else:
             return jsonify(
                 {
@@ -241,9 +262,9 @@ def clean_water_consumption_history():
 
     # --- danh sách ngày distinct để phân trang (đÃ áp filter) ---
     dates_q = (
-        q_base.with_entities(CleanWaterPlant.date)
+        q_base.with_entities(cw.date)
         .distinct()
-        .order_by(CleanWaterPlant.date.desc())
+        .order_by(cw.date.desc())
     )
     all_dates = [r.date for r in dates_q.all()]
     total_dates = len(all_dates)
@@ -277,16 +298,16 @@ def clean_water_consumption_history():
     # --- lấy dữ liệu cho các ngày trong trang ---
     rs = (
         db.session.query(
-            CleanWaterPlant.date,
-            CleanWaterPlant.electricity,
-            CleanWaterPlant.pac_usage,
-            CleanWaterPlant.naoh_usage,
-            CleanWaterPlant.polymer_usage,
-            CleanWaterPlant.clean_water_output,
-            CleanWaterPlant.raw_water_jasan,
+            cw.date,
+            cw.electricity,
+            cw.pac_usage,
+            cw.naoh_usage,
+            cw.polymer_usage,
+            cw.clean_water_output,
+            cw.raw_water_jasan,
         )
-        .filter(CleanWaterPlant.date.in_(page_dates))
-        .order_by(CleanWaterPlant.date.desc())
+        .filter(cw.date.in_(page_dates))
+        .order_by(cw.date.desc())
         .all()
     )
 
@@ -333,6 +354,7 @@ def clean_water_consumption_history():
     )
 
 @bp.route("/water-tanks/history/pivot", methods=["GET"])
+@query_budget(8, max_repeats=3)
 def water_tanks_history_pivot():
     """
     Bảng pivot bể chứa: mỗi dòng = 1 ngày, mỗi cột = 1 bể.
@@ -349,10 +371,7 @@ def water_tanks_history_pivot():
         return jsonify({"error": "page must be a positive integer"}), 400
     per_page = 20
 
-    # 2) Base query
-    q_base = db.session.query(WaterTankLevel)
-
-    # 3) Phạm vi ngày
+    # 2) Phạm vi ngày
     start_date_str = request.args.get("start_date")
     end_date_str   = request.args.get("end_date")
     try:
@@ -362,16 +381,20 @@ def water_tanks_history_pivot():
     if range_days not in (30, 60, 90):
         range_days = 30
 
+    # 3) Base query (đọc thêm bảng lưu trữ nếu dải ngày chạm năm đã lưu trữ)
     if start_date_str or end_date_str:
+        tl = _range_source(WaterTankLevel, start_date_str, end_date_str)
+        q_base = db.session.query(tl)
         if start_date_str:
-            q_base = q_base.filter(WaterTankLevel.date >= start_date_str)
+            q_base = q_base.filter(tl.date >= start_date_str)
         if end_date_str:
-            q_base = q_base.filter(WaterTankLevel.date <= end_date_str)
+            q_base = q_base.filter(tl.date <= end_date_str)
     else:
         latest_date = db.session.query(func.max(WaterTankLevel.date)).scalar()
         if latest_date:
             cutoff = latest_date - timedelta(days=range_days - 1)
-            q_base = q_base.filter(WaterTankLevel.date >= cutoff)
+            tl = entry_source(WaterTankLevel, cutoff, latest_date)
+            q_base = db.session.query(tl).filter(tl.date >= cutoff)
         else:
             return jsonify({
                 "columns": ["date"],
@@ -388,12 +411,12 @@ def water_tanks_history_pivot():
         except Exception:
             return jsonify({"error": "tank_ids must be comma-separated integers"}), 400
         if tank_id_list:
-            q_base = q_base.filter(WaterTankLevel.tank_id.in_(tank_id_list))
+            q_base = q_base.filter(tl.tank_id.in_(tank_id_list))
 
     # 5) Lấy danh sách NGÀY distinct (đã áp filter) để phân trang
-    dates_q = (q_base.with_entities(WaterTankLevel.date)
+    dates_q = (q_base.with_entities(tl.date)
                      .distinct()
-                     .order_by(WaterTankLevel.date.desc()))
+                     .order_by(tl.date.desc()))
     all_dates = [r.date for r in dates_q.all()]
     total_dates = len(all_dates)
     if total_dates == 0:
@@ -409,13 +432,13 @@ def water_tanks_history_pivot():
 
     # 6) Lấy dữ liệu các ngày trong trang + join để lấy tên bể
     rs = (db.session.query(
-            WaterTankLevel.date,
-            WaterTankLevel.tank_id,
-            WaterTankLevel.level,
+            tl.date,
+            tl.tank_id,
+            tl.level,
             WaterTank.name
           )
-          .join(WaterTank, WaterTank.id == WaterTankLevel.tank_id)
-          .filter(WaterTankLevel.date.in_(page_dates))
+          .join(WaterTank, WaterTank.id == tl.tank_id)
+          .filter(tl.date.in_(page_dates))
           .all())
 
     if not rs:
@@ -457,6 +480,7 @@ def water_tanks_history_pivot():
     })
 
 @bp.route("/wastewater/history/pivot", methods=["GET"])
+@query_budget(8, max_repeats=3)
 def wastewater_history_pivot():
     """
     Lịch sử nước thải (pivot theo ngày).
@@ -479,23 +503,24 @@ def wastewater_history_pivot():
     aggregate = (request.args.get("aggregate", "false").lower() == "true")
     include_extra = (request.args.get("include_extra", "false").lower() == "true")
 
-    q_base = db.session.query(WastewaterPlant).filter(WastewaterPlant.plant_number.in_(plant_list))
-
     # phạm vi ngày
     start_date = request.args.get("start_date")
     end_date = request.args.get("end_date")
     if start_date or end_date:
-        if start_date: q_base = q_base.filter(WastewaterPlant.date >= start_date)
-        if end_date:   q_base = q_base.filter(WastewaterPlant.date <= end_date)
+        ww = _range_source(WastewaterPlant, start_date, end_date)
+        q_base = db.session.query(ww).filter(ww.plant_number.in_(plant_list))
+        if start_date: q_base = q_base.filter(ww.date >= start_date)
+        if end_date:   q_base = q_base.filter(ww.date <= end_date)
     else:
         latest = db.session.query(func.max(WastewaterPlant.date)).scalar()
         if not latest:
             return jsonify({"columns":["date"], "rows":[], "meta":{"page":1,"pages":1,"per_page":per_page,"total":0,"range_days":range_days}})
         cutoff = latest - timedelta(days=range_days-1)
-        q_base = q_base.filter(WastewaterPlant.date >= cutoff)
+        ww = entry_source(WastewaterPlant, cutoff, latest)
+        q_base = db.session.query(ww).filter(ww.plant_number.in_(plant_list), ww.date >= cutoff)
 
     # ngày distinct để phân trang
-    dates_q = (q_base.with_entities(WastewaterPlant.date).distinct().order_by(WastewaterPlant.date.desc()))
+    dates_q = (q_base.with_entities(ww.date).distinct().order_by(ww.date.desc()))
     all_dates = [r.date for r in dates_q.all()]
     total_dates = len(all_dates)
     pages = max(1, (total_dates + per_page - 1) // per_page)
@@ -504,17 +529,17 @@ def wastewater_history_pivot():
 
     # lấy dữ liệu trang
     rs = (db.session.query(
-            WastewaterPlant.date,
-            WastewaterPlant.plant_number,
-            WastewaterPlant.wastewater_meter,
-            WastewaterPlant.input_flow_tqt,
-            WastewaterPlant.output_flow_tqt,
-            WastewaterPlant.sludge_output,
-            WastewaterPlant.electricity,
-            WastewaterPlant.chemical_usage,
+            ww.date,
+            ww.plant_number,
+            ww.wastewater_meter,
+            ww.input_flow_tqt,
+            ww.output_flow_tqt,
+            ww.sludge_output,
+            ww.electricity,
+            ww.chemical_usage,
         )
-        .filter(WastewaterPlant.date.in_(page_dates),
-                WastewaterPlant.plant_number.in_(plant_list))
+        .filter(ww.date.in_(page_dates),
+                ww.plant_number.in_(plant_list))
         .all())
 
     # pivot
@@ -587,6 +612,7 @@ def wastewater_history_pivot():
     })
 
 @bp.route("/customer-readings/history", methods=["GET"])
+@query_budget(8, max_repeats=3)
 def customer_readings_history():
     """
     Lịch sử chỉ số khách hàng (dạng danh sách).
@@ -595,9 +621,11 @@ def customer_readings_history():
     - q: chuỗi tìm kiếm (company_name LIKE)
     - type: daily | monthly (lọc theo customer.daily_reading)
     - customer_ids: "1,2,3" (optional)
+    - source: actual | calculated (lọc theo cột sinh wastewater_measured, có index)
     Trả về: (date, company_name, type, ratio, clean_1, clean_2,clean_3, wastewater_value, source)
-      wastewater_value = wastewater_reading (nếu có) else wastewater_calculated
+      wastewater_value = wastewater_effective (wastewater_reading nếu có, else wastewater_calculated)
       source = "actual" | "calculated"
+      kèm clean_total = clean_water_total (tổng 3 đồng hồ)
     """
     # phân trang
     try:
@@ -609,20 +637,22 @@ def customer_readings_history():
     per_page = 20
 
     # base query join khách hàng
-    q = (db.session.query(
-            CustomerReading.id,
-            CustomerReading.date,
-            Customer.company_name,
-            Customer.daily_reading,
-            Customer.water_ratio,
-            CustomerReading.clean_water_reading,
-            CustomerReading.clean_water_reading_2,
-            CustomerReading.clean_water_reading_3,
-            CustomerReading.wastewater_reading,
-            CustomerReading.wastewater_calculated,
+    def _base_query(cr):
+        return (db.session.query(
+                cr.id,
+                cr.date,
+                Customer.company_name,
+                Customer.daily_reading,
+                Customer.water_ratio,
+                cr.clean_water_reading,
+                cr.clean_water_reading_2,
+                cr.clean_water_reading_3,
+                cr.clean_water_total,
+                cr.wastewater_effective,
+                cr.wastewater_measured,
+            )
+            .join(Customer, Customer.id == cr.customer_id)
         )
-        .join(Customer, Customer.id == CustomerReading.customer_id)
-    )
 
     # phạm vi ngày
     start_date_str = request.args.get("start_date")
@@ -635,15 +665,18 @@ def customer_readings_history():
         range_days = 30
 
     if start_date_str or end_date_str:
+        cr = _range_source(CustomerReading, start_date_str, end_date_str)
+        q = _base_query(cr)
         if start_date_str:
-            q = q.filter(CustomerReading.date >= start_date_str)
+            q = q.filter(cr.date >= start_date_str)
         if end_date_str:
-            q = q.filter(CustomerReading.date <= end_date_str)
+            q = q.filter(cr.date <= end_date_str)
     else:
         latest = db.session.query(func.max(CustomerReading.date)).scalar()
         if latest:
             cutoff = latest - timedelta(days=range_days - 1)
-            q = q.filter(CustomerReading.date >= cutoff)
+            cr = entry_source(CustomerReading, cutoff, latest)
+            q = _base_query(cr).filter(cr.date >= cutoff)
         else:
             return jsonify({
                 "columns": ["date","company","type","ratio","clean_1","clean_2","clean_3","wastewater","source"],
@@ -657,6 +690,11 @@ def customer_readings_history():
         is_daily = (type_filter == "daily")
         q = q.filter(Customer.daily_reading == is_daily)
 
+    # lọc theo nguồn số nước thải
+    source_filter = (request.args.get("source") or "").strip().lower()
+    if source_filter in ("actual", "calculated"):
+        q = q.filter(cr.wastewater_measured == (source_filter == "actual"))
+
     # lọc theo customer_ids
     ids_param = request.args.get("customer_ids")
     if ids_param:
@@ -665,7 +703,7 @@ def customer_readings_history():
         except Exception:
             return jsonify({"error":"customer_ids must be comma-separated integers"}), 400
         if id_list:
-            q = q.filter(CustomerReading.customer_id.in_(id_list))
+            q = q.filter(cr.customer_id.in_(id_list))
 
     # search theo tên công ty
     q_text = (request.args.get("q") or "").strip()
@@ -674,19 +712,12 @@ def customer_readings_history():
         q = q.filter(Customer.company_name.ilike(like_expr))
 
     # order mới nhất trước
-    q = q.order_by(CustomerReading.date.desc(), CustomerReading.id.desc())
+    q = q.order_by(cr.date.desc(), cr.id.desc())
 
     # paginate
     pagination = q.paginate(page=page, per_page=per_page, error_out=False)
 
     def _row_to_dict(row):
-        # tính nước thải hiển thị & nguồn
-        if row.wastewater_reading is not None:
-            ww_val = float(row.wastewater_reading or 0)
-            source = "actual"
-        else:
-            ww_val = float(row.wastewater_calculated or 0)
-            source = "calculated"
         return {
             "date": row.date.strftime("%d/%m/%Y") if row.date else None,
             "company": row.company_name,
@@ -695,8 +726,9 @@ def customer_readings_history():
             "clean_1": float(row.clean_water_reading or 0),
             "clean_2": float(row.clean_water_reading_2 or 0),
             "clean_3": float(row.clean_water_reading_3 or 0),
-            "wastewater": ww_val,
-            "source": source
+            "clean_total": float(row.clean_water_total or 0),
+            "wastewater": float(row.wastewater_effective or 0),
+            "source": "actual" if row.wastewater_measured else "calculated"
         }
 
     items = [_row_to_dict(row) for row in pagination.items]
@@ -5,7 +5,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app import db
 from models import CleanWaterPlant, WaterTankLevel, WaterTank, CustomerReading, Customer
-from sqlalchemy import func, extract, case
+from sqlalchemy import func, case
+from monthly_rollup import monthly_clean_water, monthly_wastewater, monthly_customer_wastewater
+from archive import entry_source
+from read_replica import use_read_replica
 from utils import generate_daily_report, generate_monthly_report, check_permissions
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
@@ -13,6 +16,7 @@ import unicodedata
 import re
 
 bp = Blueprint('reports', __name__)
+use_read_replica(bp)
 logger = logging.getLogger(__name__)
 
 
@@ -142,8 +146,9 @@ def _build_clean_water_plant_report_wb(start_dt: date, end_dt: date) -> Workbook
     dates = list(_date_range(start_dt, end_dt))
 
     # Clean water plant data
-    plant_rows = db.session.query(CleanWaterPlant.date, CleanWaterPlant.clean_water_output, CleanWaterPlant.raw_water_jasan) \
-        .filter(CleanWaterPlant.date >= start_dt, CleanWaterPlant.date <= end_dt) \
+    cw = entry_source(CleanWaterPlant, start_dt, end_dt)
+    plant_rows = db.session.query(cw.date, cw.clean_water_output, cw.raw_water_jasan) \
+        .filter(cw.date >= start_dt, cw.date <= end_dt) \
         .all()
     clean_map = {r[0]: float(r[1] or 0) for r in plant_rows}
     raw_jasan_map = {r[0]: float(r[2] or 0) for r in plant_rows}
@@ -170,8 +175,9 @@ def _build_clean_water_plant_report_wb(start_dt: date, end_dt: date) -> Workbook
             tank_by_label[lbl] = t.id
 
     # Fetch levels
-    levels = db.session.query(WaterTankLevel.date, WaterTankLevel.tank_id, WaterTankLevel.level) \
-        .filter(WaterTankLevel.date >= start_dt, WaterTankLevel.date <= end_dt, WaterTankLevel.tank_id.in_(tank_by_label.values() if tank_by_label else [-1])) \
+    tl = entry_source(WaterTankLevel, start_dt, end_dt)
+    levels = db.session.query(tl.date, tl.tank_id, tl.level) \
+        .filter(tl.date >= start_dt, tl.date <= end_dt, tl.tank_id.in_(tank_by_label.values() if tank_by_label else [-1])) \
         .all()
     levels_map = {lbl: {} for lbl in desired_tank_labels}
     for dt_val, tank_id, level in levels:
@@ -199,41 +205,14 @@ def _build_clean_water_plant_report_wb(start_dt: date, end_dt: date) -> Workbook
         26: (1.0,  1.0),  # Lệ Tinh
     }
 
-    # ==== Tính Δ cho 2 đồng hồ (window function) ====
-    r1 = func.coalesce(CustomerReading.clean_water_reading, 0.0)
-    lag_r1 = func.lag(r1).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    delta1 = case(((r1 - func.coalesce(lag_r1, r1)) < 0, 0.0),
-                else_=(r1 - func.coalesce(lag_r1, r1)))
-
-    r2 = func.coalesce(getattr(CustomerReading, "clean_water_reading_2", 0.0), 0.0)
-    lag_r2 = func.lag(r2).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    delta2 = case(((r2 - func.coalesce(lag_r2, r2)) < 0, 0.0),
-                else_=(r2 - func.coalesce(lag_r2, r2)))
-
-    r3 = func.coalesce(getattr(CustomerReading, "clean_water_reading_3", 0.0), 0.0)
-    lag_r3 = func.lag(r3).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    delta3 = case(((r3 - func.coalesce(lag_r3, r3)) < 0, 0.0),
-                else_=(r3 - func.coalesce(lag_r3, r3)))
+    # ==== Δ các đồng hồ đã lưu sẵn trên CustomerReading ====
+    cr = entry_source(CustomerReading, start_dt, end_dt)
+    delta1 = func.coalesce(cr.clean_water_delta, 0.0)
+    delta2 = func.coalesce(cr.clean_water_delta_2, 0.0)
+    delta3 = func.coalesce(cr.clean_water_delta_3, 0.0)
 
     # Δ lượng nước mua ngoài theo khách hàng
-    outsource_val = func.coalesce(CustomerReading.clean_water_outsource, 0.0)
-    lag_outsource = func.lag(outsource_val).over(
-        partition_by=CustomerReading.customer_id,
-        order_by=CustomerReading.date
-    )
-    outsource_delta_expr = case(
-        ((outsource_val - func.coalesce(lag_outsource, outsource_val)) < 0, 0.0),
-        else_=(outsource_val - func.coalesce(lag_outsource, outsource_val))
-    )
+    outsource_delta_expr = func.coalesce(cr.clean_water_outsource_delta, 0.0)
 
     # ==== CASE hệ số theo ID (fallback 1.0 nếu không match) ====
     whens_k1 = [(Customer.id == cid, f1) for cid, (f1, _) in FACTOR_BY_ID.items()]
@@ -242,25 +221,22 @@ def _build_clean_water_plant_report_wb(start_dt: date, end_dt: date) -> Workbook
     k2 = case(*whens_k2, else_=1.0) if whens_k2 else 1.0
     clean_delta_expr = (delta1 * k1) + (delta2 * k2) + delta3
 
-    # ==== Dải ngày cho LAG: cần (start_dt - 1) ====
-    calc_start = start_dt - timedelta(days=1)
-
-    # === LỚP 1: subquery tính delta theo dòng (dùng lag) ===
+    # === LỚP 1: subquery delta theo dòng ===
     delta_sq = (
         db.session.query(
-            CustomerReading.date.label('date'),
-            CustomerReading.customer_id.label('customer_id'),
+            cr.date.label('date'),
+            cr.customer_id.label('customer_id'),
             clean_delta_expr.label('clean_delta')
         )
-        .join(Customer, Customer.id == CustomerReading.customer_id)
+        .join(Customer, Customer.id == cr.customer_id)
         .filter(
-            CustomerReading.date >= calc_start,
-            CustomerReading.date <= end_dt,
+            cr.date >= start_dt,
+            cr.date <= end_dt,
             Customer.is_active.is_(True)
         )
     ).subquery()
 
-    # === LỚP 2: tổng theo (date, customer) (sum trên subquery, KHÔNG dùng lag ở đây) ===
+    # === LỚP 2: tổng theo (date, customer) ===
     readings = (
         db.session.query(
             delta_sq.c.date,
@@ -273,14 +249,14 @@ def _build_clean_water_plant_report_wb(start_dt: date, end_dt: date) -> Workbook
 
     outsource_sq = (
         db.session.query(
-            CustomerReading.date.label('date'),
-            CustomerReading.customer_id.label('customer_id'),
+            cr.date.label('date'),
+            cr.customer_id.label('customer_id'),
             outsource_delta_expr.label('delta_outsource')
         )
-        .join(Customer, Customer.id == CustomerReading.customer_id)
+        .join(Customer, Customer.id == cr.customer_id)
         .filter(
-            CustomerReading.date >= calc_start,
-            CustomerReading.date <= end_dt,
+            cr.date >= start_dt,
+            cr.date <= end_dt,
             Customer.is_active.is_(True)
         )
     ).subquery()
@@ -376,27 +352,14 @@ def _build_nmns_monthly_power_chem_wb(start_dt: date, end_dt: date) -> Workbook:
     start_year_dt = date(year, 1, 1)
     last_month = end_dt.month
 
-    # Lấy tổng theo tháng từ DB
-    q = db.session.query(
-        extract('year', CleanWaterPlant.date).label('y'),
-        extract('month', CleanWaterPlant.date).label('m'),
-        func.sum(func.coalesce(CleanWaterPlant.electricity, 0)).label('electricity'),
-        func.sum(func.coalesce(CleanWaterPlant.pac_usage, 0)).label('pac'),
-        func.sum(func.coalesce(CleanWaterPlant.naoh_usage, 0)).label('naoh'),
-        func.sum(func.coalesce(CleanWaterPlant.polymer_usage, 0)).label('polymer'),
-        func.sum(func.coalesce(CleanWaterPlant.clean_water_output, 0)).label('water')
-    ).filter(
-        CleanWaterPlant.date >= start_year_dt,
-        CleanWaterPlant.date <= end_dt
-    ).group_by('y', 'm').order_by('y', 'm')
-
-    monthly = {(int(r.y), int(r.m)): {
-        'electricity': float(r.electricity or 0),
-        'pac': float(r.pac or 0),
-        'naoh': float(r.naoh or 0),
-        'polymer': float(r.polymer or 0),
-        'water': float(r.water or 0),
-    } for r in q.all()}
+    # Lấy tổng theo tháng từ bảng tổng monthly_clean_water
+    monthly = {k: {
+        'electricity': v['electricity'],
+        'pac': v['pac_usage'],
+        'naoh': v['naoh_usage'],
+        'polymer': v['polymer_usage'],
+        'water': v['clean_water_output'],
+    } for k, v in monthly_clean_water(start_year_dt, end_dt).items()}
 
     # Workbook setup
     wb = Workbook()
@@ -544,8 +507,6 @@ def _build_monthly_wastewater_1_wb(start_dt: date, end_dt: date) -> Workbook:
       8. Hóa chất sử dụng (kg) = sum(chemical_usage)
       9. Tỷ lệ điện (kW/m3) theo nước BB chốt = Điện / (Nước thải BB DN)
     """
-    from models import WastewaterPlant, CustomerReading, Customer
-
     year = end_dt.year
     start_year_dt = date(year, 1, 1)
     last_month = end_dt.month
@@ -554,52 +515,25 @@ def _build_monthly_wastewater_1_wb(start_dt: date, end_dt: date) -> Workbook:
     months = list(range(1, last_month + 1))
 
     # 1) BB DN = sum(wastewater_reading) + sum(wastewater_calculated) per month (logic mới)
-    bb_rows = db.session.query(
-        extract('year', CustomerReading.date).label('y'),
-        extract('month', CustomerReading.date).label('m'),
-        func.sum(func.coalesce(CustomerReading.wastewater_reading, 0)).label('ww_read'),
-        func.sum(func.coalesce(CustomerReading.wastewater_calculated, 0)).label('ww_calc'),
-    ).filter(
-        # CustomerReading.customer_id == 1,
-        CustomerReading.date >= start_year_dt,
-        CustomerReading.date <= end_dt
-    ).group_by('y', 'm').all()
-    bb_by_month = {
-        (int(r.y), int(r.m)): float((r.ww_read or 0) + (r.ww_calc or 0))
-        for r in bb_rows
-    }
+    bb_by_month = monthly_customer_wastewater(start_year_dt, end_dt)
 
     # 2..5,7,8 from WastewaterPlant for plant_number==1
-    wp = db.session.query(
-        extract('year', WastewaterPlant.date).label('y'),
-        extract('month', WastewaterPlant.date).label('m'),
-        func.sum(func.coalesce(WastewaterPlant.wastewater_meter, 0)).label('meter'),
-        func.sum(func.coalesce(WastewaterPlant.input_flow_tqt, 0)).label('tqt_in'),
-        func.sum(func.coalesce(WastewaterPlant.output_flow_tqt, 0)).label('tqt_out'),
-        func.sum(func.coalesce(WastewaterPlant.sludge_output, 0)).label('sludge'),
-        func.sum(func.coalesce(WastewaterPlant.electricity, 0)).label('electricity'),
-        func.sum(func.coalesce(WastewaterPlant.chemical_usage, 0)).label('chem')
-    ).filter(
-        WastewaterPlant.date >= start_year_dt,
-        WastewaterPlant.date <= end_dt,
-        WastewaterPlant.plant_number == 1
-    ).group_by('y', 'm').all()
-    wp_by_month = {(int(r.y), int(r.m)): r for r in wp}
+    wp_by_month = monthly_wastewater(start_year_dt, end_dt, 1)
 
     # Prepare values per month
     def get_month_val(key, m):
         row = wp_by_month.get((year, m))
         if not row:
             return 0.0
-        return float(getattr(row, key) or 0)
+        return row[key]
 
     bb_vals = [bb_by_month.get((year, m), 0.0) for m in months]
-    meter_vals = [get_month_val('meter', m) for m in months]
-    tqt_in_vals = [get_month_val('tqt_in', m) for m in months]
-    tqt_out_vals = [get_month_val('tqt_out', m) for m in months]
-    sludge_vals = [get_month_val('sludge', m) for m in months]
+    meter_vals = [get_month_val('wastewater_meter', m) for m in months]
+    tqt_in_vals = [get_month_val('input_flow_tqt', m) for m in months]
+    tqt_out_vals = [get_month_val('output_flow_tqt', m) for m in months]
+    sludge_vals = [get_month_val('sludge_output', m) for m in months]
     electricity_vals = [get_month_val('electricity', m) for m in months]
-    chem_vals = [get_month_val('chem', m) for m in months]
+    chem_vals = [get_month_val('chemical_usage', m) for m in months]
 
     # Ratios per month
     def safe_ratio(num, den):
@@ -717,8 +651,6 @@ def _build_monthly_wastewater_2_wb(start_dt: date, end_dt: date) -> Workbook:
       8. Hóa chất sử dụng (kg) = sum(chemical_usage)
       9. Tỷ lệ điện (kW/m3) theo nước BB chốt = Điện / (Nước thải BB DN)
     """
-    from models import WastewaterPlant, CustomerReading, Customer
-
     year = end_dt.year
     start_year_dt = date(year, 1, 1)
     last_month = end_dt.month
@@ -727,51 +659,25 @@ def _build_monthly_wastewater_2_wb(start_dt: date, end_dt: date) -> Workbook:
     months = list(range(1, last_month + 1))
 
     # 1) BB DN = sum(wastewater_reading) + sum(wastewater_calculated) per month 
-    bb_rows = db.session.query(
-        extract('year', CustomerReading.date).label('y'),
-        extract('month', CustomerReading.date).label('m'),
-        func.sum(func.coalesce(CustomerReading.wastewater_reading, 0)).label('ww_read'),
-        func.sum(func.coalesce(CustomerReading.wastewater_calculated, 0)).label('ww_calc'),
-    ).filter(
-        CustomerReading.date >= start_year_dt,
-        CustomerReading.date <= end_dt
-    ).group_by('y', 'm').all()
-    bb_by_month = {
-        (int(r.y), int(r.m)): float((r.ww_read or 0) + (r.ww_calc or 0))
-        for r in bb_rows
-    }
+    bb_by_month = monthly_customer_wastewater(start_year_dt, end_dt)
 
     # 2..5,7,8 from WastewaterPlant for plant_number==2
-    wp = db.session.query(
-        extract('year', WastewaterPlant.date).label('y'),
-        extract('month', WastewaterPlant.date).label('m'),
-        func.sum(func.coalesce(WastewaterPlant.wastewater_meter, 0)).label('meter'),
-        func.sum(func.coalesce(WastewaterPlant.input_flow_tqt, 0)).label('tqt_in'),
-        func.sum(func.coalesce(WastewaterPlant.output_flow_tqt, 0)).label('tqt_out'),
-        func.sum(func.coalesce(WastewaterPlant.sludge_output, 0)).label('sludge'),
-        func.sum(func.coalesce(WastewaterPlant.electricity, 0)).label('electricity'),
-        func.sum(func.coalesce(WastewaterPlant.chemical_usage, 0)).label('chem')
-    ).filter(
-        WastewaterPlant.date >= start_year_dt,
-        WastewaterPlant.date <= end_dt,
-        WastewaterPlant.plant_number == 2
-    ).group_by('y', 'm').all()
-    wp_by_month = {(int(r.y), int(r.m)): r for r in wp}
+    wp_by_month = monthly_wastewater(start_year_dt, end_dt, 2)
 
     # Prepare values per month
     def get_month_val(key, m):
         row = wp_by_month.get((year, m))
         if not row:
             return 0.0
-        return float(getattr(row, key) or 0)
+        return row[key]
 
     bb_vals = [bb_by_month.get((year, m), 0.0) for m in months]
-    meter_vals = [get_month_val('meter', m) for m in months]
-    tqt_in_vals = [get_month_val('tqt_in', m) for m in months]
-    tqt_out_vals = [get_month_val('tqt_out', m) for m in months]
-    sludge_vals = [get_month_val('sludge', m) for m in months]
+    meter_vals = [get_month_val('wastewater_meter', m) for m in months]
+    tqt_in_vals = [get_month_val('input_flow_tqt', m) for m in months]
+    tqt_out_vals = [get_month_val('output_flow_tqt', m) for m in months]
+    sludge_vals = [get_month_val('sludge_output', m) for m in months]
     electricity_vals = [get_month_val('electricity', m) for m in months]
-    chem_vals = [get_month_val('chem', m) for m in months]
+    chem_vals = [get_month_val('chemical_usage', m) for m in months]
 
     # Ratios per month
     def safe_ratio(num, den):
@@ -0,0 +1,427 @@
+"""
+Nạp số liệu hàng loạt cho 5 bảng nhập liệu (vd. file xuất từ SCADA/PLC: nhiều ngày x giếng x bể x KH trong 1 lần gửi).
+
+- Thân request được đọc dần (iter_ndjson / iter_json_array), không nạp cả payload vào bộ nhớ.
+- Mỗi bản ghi được kiểm tra bằng coercer của model_helper; bản ghi lỗi chỉ bị bỏ qua kèm lý do.
+- Ghi theo khối chunk_rows bản ghi, mỗi khối 1 transaction: upsert_entries theo bảng (khóa 48h, năm lưu trữ),
+  bỏ qua ngày thuộc kỳ báo cáo đã khóa, rồi làm mới Δ và các bảng dẫn xuất 1 lần cho dải ngày của khối.
+
+Bản ghi: {"type": "well_production", "date": "2025-01-31", "well_id": 3, "production": 1234.5}
+(type có thể bỏ nếu truyền default_type). Kết quả từng bản ghi theo thứ tự gửi (index tính từ 0):
+inserted | updated | locked (quá 48h) | archived | period_locked | superseded (trùng khóa, bản ghi sau thắng) | invalid.
+"""
+import codecs
+import json
+import logging
+import math
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app import db
+from models import Well, WaterTank, Customer, ReportPeriod, \
+    WellProduction, WaterTankLevel, CustomerReading, WastewaterPlant, CleanWaterPlant
+from model_helper import coerce_opt
+from entry_upsert import UPSERT_KEYS, upsert_entries
+from archive import archived_years
+from clean_water_series import load_wells_delta_series
+from well_production import update_well_deltas
+from customer_consumption import update_reading_deltas
+from customer_ranking import refresh_customer_rankings
+from daily_facts import refresh_daily_facts
+from monthly_rollup import refresh_monthly_rollups
+from chart_cache import chart_cache
+from kpi_snapshot import invalidate_kpi_for_entry
+from data_version import bump_data_version
+from read_replica import note_primary_write
+from sqlite_profile import retry_on_locked
+
+logger = logging.getLogger(__name__)
+READ_BYTES = 64 * 1024
+CLEAN_WATER_FACTOR = 0.97  # NS SX = 0.97 * (H(n) - J(n)), như form NMNS
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+# loại bản ghi -> (model, cột mã đối tượng, {cột số liệu: kiểu}); thứ tự = thứ tự ghi trong khối
+# (giếng trước NMNS vì sản lượng NMNS tính từ Δ giếng của ngày)
+INGEST_TYPES = {
+    'well_production': (WellProduction, 'well_id', {'production': 'float'}),
+    'water_tank_level': (WaterTankLevel, 'tank_id', {'level': 'float'}),
+    'customer_reading': (CustomerReading, 'customer_id', {
+        'clean_water_reading': 'float', 'clean_water_reading_2': 'float', 'clean_water_reading_3': 'float',
+        'clean_water_outsource': 'float', 'wastewater_reading': 'float',
+    }),
+    'wastewater_plant': (WastewaterPlant, 'plant_number', {
+        'wastewater_meter': 'float', 'input_flow_tqt': 'float', 'output_flow_tqt': 'float',
+        'sludge_output': 'float', 'electricity': 'float', 'chemical_usage': 'float',
+    }),
+    'clean_water_plant': (CleanWaterPlant, None, {
+        'electricity': 'float', 'pac_usage': 'float', 'naoh_usage': 'float', 'polymer_usage': 'float',
+        'raw_water_jasan': 'float',
+    }),
+}
+# cột được ghi đè khi dòng đã có (giống form nhập liệu)
+UPDATE_COLUMNS = {
+    'well_production': ('production',),
+    'water_tank_level': ('level',),
+    'customer_reading': ('clean_water_reading', 'clean_water_reading_2', 'clean_water_reading_3',
+                         'clean_water_outsource', 'wastewater_reading', 'wastewater_calculated'),
+    'wastewater_plant': tuple(INGEST_TYPES['wastewater_plant'][2]),
+    'clean_water_plant': tuple(INGEST_TYPES['clean_water_plant'][2]) + ('clean_water_output',),
+}
+WRITTEN = ('inserted', 'updated')
+
+
+class PayloadError(ValueError):
+    """Thân request không đọc tiếp được (sai cấu trúc JSON): dừng nạp, các khối đã ghi vẫn giữ."""
+
+
+def iter_ndjson(stream) -> Iterator[Tuple[Any, Optional[str]]]:
+    """(bản ghi, None) hoặc (None, lỗi) cho từng dòng không rỗng; dòng hỏng không chặn các dòng sau."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:
+            yield None, f'JSON không hợp lệ: {e}'
+
+
+def iter_json_array(stream, read_size: int = READ_BYTES) -> Iterator[Tuple[Any, Optional[str]]]:
+    """(bản ghi, None) cho từng object của mảng JSON ở gốc, đọc stream theo từng đoạn read_size byte."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    state = {'buf': '', 'pos': 0, 'eof': False}
+
+    def peek() -> str:
+        # ký tự khác khoảng trắng kế tiếp (không tiêu thụ), '' nếu hết dữ liệu
+        while True:
+            buf, pos = state['buf'], state['pos']
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if state['eof']:
+                return ''
+            read_more()
+
+    def read_more() -> None:
+        data = stream.read(read_size)
+        state['eof'] = not data
+        state['buf'] = state['buf'][state['pos']:] + utf8.decode(data, final=state['eof'])
+        state['pos'] = 0
+
+    if peek() != '[':
+        raise PayloadError('Thân JSON phải là 1 mảng bản ghi')
+    state['pos'] += 1
+    closing = peek() == ']'
+    while not closing:
+        if peek() != '{':
+            raise PayloadError('Mỗi phần tử của mảng phải là 1 object')
+        while True:
+            try:
+                value, end = decoder.raw_decode(state['buf'], state['pos'])
+                break
+            except json.JSONDecodeError as e:
+                if state['eof']:
+                    raise PayloadError(f'JSON không hợp lệ: {e}')
+                read_more()
+        state['pos'] = end
+        yield value, None
+        sep = peek()
+        if sep == ',':
+            state['pos'] += 1
+        elif sep == ']':
+            closing = True
+        else:
+            raise PayloadError('Thiếu dấu "," hoặc "]" giữa các phần tử')
+    state['pos'] += 1
+    if peek() != '':
+        raise PayloadError('Dữ liệu thừa sau mảng JSON')
+
+
+def _number(raw: Any, type_name: str) -> Optional[float]:
+    # None nếu bỏ trống; ValueError nếu không phải số hữu hạn >= 0
+    if raw is None or raw == '':
+        return None
+    if isinstance(raw, bool):
+        raise ValueError(f'"{raw}" không phải số')
+    value = coerce_opt(raw, type_name)
+    if value is None or not math.isfinite(value):
+        raise ValueError(f'"{raw}" không phải số')
+    if value < 0:
+        raise ValueError('giá trị âm')
+    return value
+
+
+def _in_periods(d: date, periods: List[Tuple[date, date]]) -> bool:
+    return any(start <= d <= end for start, end in periods)
+
+
+class BulkIngest:
+    """
+    Nạp 1 payload: feed() từng bản ghi, finish() ghi khối cuối và trả báo cáo.
+    known: mã giếng/bể/KH hợp lệ và hệ số NT của KH, nạp 1 lần cho cả payload.
+    """
+
+    def __init__(self, user_id: Optional[int], editable_since: datetime, default_type: Optional[str] = None,
+                 chunk_rows: int = 2000, keep_results: bool = True):
+        self.user_id = user_id
+        self.editable_since = editable_since
+        self.default_type = default_type
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self.keep_results = keep_results
+        self.pending: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.results: List[Dict[str, Any]] = []
+        self.summary = Counter()
+        self.count = 0
+        self.chunks = 0
+        self.first_date: Optional[date] = None
+        self.last_date: Optional[date] = None
+        self.dates: Dict[Any, date] = {}
+        self.refs: Dict[int, Dict[str, Any]] = {}
+        self.known = {
+            'well_production': {wid for (wid,) in db.session.query(Well.id)},
+            'water_tank_level': {tid for (tid,) in db.session.query(WaterTank.id)},
+            'customer_reading': dict(db.session.query(Customer.id, Customer.water_ratio).all()),
+        }
+
+    def _result(self, index: int, type_name: Optional[str], status: str, error: Optional[str] = None,
+                ref: Optional[Dict[str, Any]] = None) -> None:
+        self.summary[status] += 1
+        if self.keep_results or status not in WRITTEN:
+            item = {'index': index, 'type': type_name, 'status': status}
+            if ref:
+                item.update(ref)
+            if error:
+                item['error'] = error
+            self.results.append(item)
+
+    def _date(self, raw: Any) -> date:
+        # nhiều bản ghi chung 1 ngày: nhớ kết quả theo chuỗi
+        if isinstance(raw, datetime):
+            return raw.date()
+        if isinstance(raw, date):
+            return raw
+        if raw in self.dates:
+            return self.dates[raw]
+        try:
+            the_date = coerce_opt(raw, 'date')
+        except (TypeError, ValueError):
+            raise ValueError(f'date "{raw}" không đúng dạng YYYY-MM-DD')
+        if the_date is None:
+            raise ValueError('thiếu date')
+        self.dates[raw] = the_date
+        return the_date
+
+    def parse(self, obj: Any) -> Tuple[str, Dict[str, Any]]:
+        """(loại, dòng để upsert) của 1 bản ghi; ValueError kèm lý do nếu không hợp lệ."""
+        if not isinstance(obj, dict):
+            raise ValueError('bản ghi phải là object')
+        type_name = obj.get('type') or self.default_type
+        if type_name not in INGEST_TYPES:
+            raise ValueError(f'type "{type_name}" không hợp lệ')
+        model, entity_key, fields = INGEST_TYPES[type_name]
+        the_date = self._date(obj.get('date'))
+        row = {'date': the_date, 'created_by': self.user_id}
+
+        if entity_key:
+            raw_id = obj.get(entity_key)
+            entity = coerce_opt(raw_id, 'int') if not isinstance(raw_id, bool) else None
+            if entity is None:
+                raise ValueError(f'thiếu hoặc sai {entity_key}')
+            if (type_name in self.known and entity not in self.known[type_name]) or entity < 1:
+                raise ValueError(f'{entity_key} {entity} không tồn tại')
+            row[entity_key] = entity
+
+        values, errors = {}, []
+        for field, type_ in fields.items():
+            try:
+                values[field] = _number(obj.get(field), type_)
+            except ValueError as e:
+                errors.append(f'{field}: {e}')
+        if errors:
+            raise ValueError('; '.join(errors))
+        if all(v is None for v in values.values()):
+            raise ValueError('không có số liệu')
+
+        if type_name == 'customer_reading':
+            # giống form: đồng hồ nước sạch bỏ trống = 0; không có số NT thì tính theo hệ số
+            clean = [values[f] for f in ('clean_water_reading', 'clean_water_reading_2',
+                                         'clean_water_reading_3', 'clean_water_outsource')]
+            ratio = float(self.known[type_name].get(row['customer_id']) or 0)
+            ww_calc = None
+            if values['wastewater_reading'] is None and any(v is not None for v in clean):
+                ww_calc = sum(v or 0.0 for v in clean) * ratio
+            for field in fields:
+                if field != 'wastewater_reading' and values[field] is None:
+                    values[field] = 0.0
+            values['wastewater_calculated'] = ww_calc
+        else:
+            values = {f: (0.0 if v is None else v) for f, v in values.items()}
+        row.update(values)
+        return type_name, row
+
+    def feed(self, obj: Any, error: Optional[str] = None, ref: Optional[Dict[str, Any]] = None) -> None:
+        """ref: vị trí bản ghi trong nguồn (vd. {'sheet': ..., 'row': ...}), được chép vào kết quả."""
+        index = self.count
+        self.count += 1
+        if error is not None:
+            self._result(index, None, 'invalid', error, ref)
+            return
+        try:
+            type_name, row = self.parse(obj)
+        except ValueError as e:
+            self._result(index, obj.get('type') if isinstance(obj, dict) else None, 'invalid', str(e), ref)
+            return
+        self.pending.append((index, type_name, row))
+        if ref:
+            self.refs[index] = ref
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        statuses, written = self._write_chunk(self.pending)
+        for index, type_name, _ in self.pending:
+            status, error = statuses[index]
+            self._result(index, type_name, status, error, self.refs.get(index))
+        self.pending = []
+        self.refs.clear()
+        self.chunks += 1
+        if written:
+            lo, hi, changed = written
+            chart_cache.invalidate_dates(lo, changed + timedelta(days=1))
+            invalidate_kpi_for_entry(lo, changed)
+            note_primary_write(hi)
+            self.first_date = min(lo, self.first_date or lo)
+            self.last_date = max(hi, self.last_date or hi)
+
+    @retry_on_locked
+    def _write_chunk(self, chunk: List[Tuple[int, str, Dict[str, Any]]]):
+        """
+        Ghi 1 khối trong 1 transaction (có commit). Trả về ({index: (trạng thái, lỗi)},
+        (ngày đầu, ngày cuối đã ghi, ngày muộn nhất có Δ thay đổi)).
+        Chỉ ghi vào session + DB, không đụng kết quả của đối tượng để retry_on_locked chạy lại được cả khối.
+        """
+        lo = min(row['date'] for _, _, row in chunk)
+        hi = max(row['date'] for _, _, row in chunk)
+        periods = db.session.query(ReportPeriod.period_start, ReportPeriod.period_end).filter(
+            ReportPeriod.is_locked.is_(True), ReportPeriod.period_start <= hi, ReportPeriod.period_end >= lo
+        ).all()
+
+        by_type = defaultdict(list)
+        for index, type_name, row in chunk:
+            by_type[type_name].append((index, row))
+
+        statuses: Dict[int, Tuple[str, Optional[str]]] = {}
+        written_dates: Dict[str, List[date]] = {}
+        written_ids: Dict[str, List[int]] = {}
+        last_changed: Optional[date] = None
+        for type_name, (model, entity_key, _) in INGEST_TYPES.items():
+            items = by_type.get(type_name)
+            if not items:
+                continue
+            keys = UPSERT_KEYS[model]
+            archived = set(archived_years(model))
+            candidates = {}
+            for index, row in items:
+                if row['date'].year in archived:
+                    statuses[index] = ('archived', f'năm {row["date"].year} đã lưu trữ')
+                elif _in_periods(row['date'], periods):
+                    statuses[index] = ('period_locked', 'ngày thuộc kỳ báo cáo đã khóa')
+                else:
+                    key = tuple(row[k] for k in keys)
+                    if key in candidates:
+                        statuses[candidates[key][0]] = ('superseded', 'trùng khóa với bản ghi sau trong cùng khối')
+                    candidates[key] = (index, row)
+            if not candidates:
+                continue
+
+            if type_name == 'clean_water_plant':
+                self._fill_clean_water_output([row for _, row in candidates.values()])
+            result = upsert_entries(model, [row for _, row in candidates.values()],
+                                    update_columns=UPDATE_COLUMNS[type_name], editable_since=self.editable_since)
+            for status in ('inserted', 'updated', 'locked'):
+                for key in result[status]:
+                    statuses[candidates[key][0]] = (status, 'quá hạn sửa 48 giờ' if status == 'locked' else None)
+
+            saved = result['inserted'] + result['updated']
+            if not saved:
+                continue
+            dates = [candidates[key][1]['date'] for key in saved]
+            written_dates[type_name] = dates
+            if entity_key:
+                written_ids[type_name] = sorted({candidates[key][1][entity_key] for key in saved})
+
+            # Δ phụ thuộc dòng vừa ghi: giếng trước khi tính sản lượng NMNS, KH trước bảng xếp hạng
+            if type_name == 'well_production':
+                update_well_deltas(written_ids[type_name], min(dates), max(dates))
+            elif type_name == 'customer_reading':
+                last_changed = update_reading_deltas(written_ids[type_name], min(dates), max(dates))
+                refresh_customer_rankings(min(dates), last_changed, written_ids[type_name])
+
+        if not written_dates:
+            db.session.rollback()
+            return statuses, None
+        all_dates = [d for dates in written_dates.values() for d in dates]
+        w_lo, w_hi = min(all_dates), max(all_dates)
+        # lần đọc số kế tiếp của KH (Δ vừa sửa) có thể cách dải ngày của khối nhiều ngày
+        changed = max(w_hi, last_changed or w_hi)
+        # daily_facts không dùng số đọc KH
+        fact_dates = [d for t, dates in written_dates.items() if t != 'customer_reading' for d in dates]
+        if fact_dates:
+            refresh_daily_facts(min(fact_dates), max(fact_dates) + timedelta(days=1))
+        monthly = [d for t in ('clean_water_plant', 'wastewater_plant', 'customer_reading')
+                   for d in written_dates.get(t, [])]
+        if monthly:
+            refresh_monthly_rollups(min(monthly), max(monthly))
+        bump_data_version()
+        db.session.commit()
+        return statuses, (w_lo, w_hi, changed)
+
+    @staticmethod
+    def _fill_clean_water_output(rows: List[Dict[str, Any]]) -> None:
+        # NS SX ngày n = 0.97 * max(H(n) - J(n), 0): H(n) = tổng Δ giếng của ngày (1 truy vấn cho cả dải)
+        lo = min(r['date'] for r in rows)
+        hi = max(r['date'] for r in rows)
+        db.session.flush()
+        deltas = load_wells_delta_series(lo, hi)
+        for r in rows:
+            wells_delta = deltas[(r['date'] - lo).days]
+            r['clean_water_output'] = CLEAN_WATER_FACTOR * max(wells_delta - max(r['raw_water_jasan'], 0.0), 0.0)
+
+    def finish(self, error: Optional[str] = None) -> Dict[str, Any]:
+        self.flush()
+        report = {
+            'records': self.count,
+            'chunks': self.chunks,
+            'summary': dict(self.summary),
+            'date_range': [self.first_date.isoformat(), self.last_date.isoformat()] if self.first_date else None,
+            'results': self.results,
+        }
+        if error:
+            report['error'] = error
+        logger.info("bulk ingest: %s records in %s chunks %s", self.count, self.chunks, dict(self.summary))
+        return report
+
+
+def ingest_records(records: Iterable[tuple], user_id: Optional[int], editable_since: datetime,
+                   default_type: Optional[str] = None, chunk_rows: int = 2000, max_records: Optional[int] = None,
+                   keep_results: bool = True) -> Dict[str, Any]:
+    """
+    Nạp các bản ghi (obj, lỗi đọc[, vị trí]) từ iter_ndjson / iter_json_array / file_import, commit theo khối.
+    Lỗi cấu trúc payload hoặc vượt max_records: dừng đọc, vẫn ghi các bản ghi đã đọc, báo trong report['error'].
+    keep_results=False: chỉ trả kết quả của bản ghi không ghi được.
+    """
+    job = BulkIngest(user_id, editable_since, default_type=default_type, chunk_rows=chunk_rows,
+                     keep_results=keep_results)
+    try:
+        for item in records:
+            if max_records is not None and job.count >= max_records:
+                return job.finish(f'Vượt quá {max_records} bản ghi mỗi lần gửi, các bản ghi sau không được nạp')
+            job.feed(*item)
+    except PayloadError as e:
+        return job.finish(str(e))
+    return job.finish()
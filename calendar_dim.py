@@ -0,0 +1,164 @@
+"""
+Bảng lịch calendar_day: chuỗi theo ngày và tổng theo kỳ 26 -> 25 tính trong SQL.
+
+- dense_daily(): LEFT JOIN từ calendar_day sang bảng dữ liệu, GROUP BY ngày -> mỗi ngày trong dải đúng 1 dòng,
+  ngày không có dữ liệu trả về 0 (không dựng danh sách ngày + dict.get trong Python).
+- Migration f3c81d6b9a27 điền sẵn từ min(CALENDAR_FIRST_DATE, ngày nhập liệu sớm nhất) tới hết năm + 10;
+  lúc khởi động ensure_calendar() nối thêm cho năm mới. Các đường ghi (daily_facts, bảng tổng tháng, tiêu thụ KH)
+  gọi extend_calendar() trong transaction của mình nên mọi ngày có dữ liệu đều nằm trong bảng lịch.
+- Đường đọc không bao giờ ghi (có thể chạy trên bản sao chỉ đọc): phần dải nằm ngoài bảng lịch không có dữ liệu,
+  dense_daily() trả 0 cho các ngày đó, các truy vấn theo tháng cắt dải bằng clip_to_calendar().
+"""
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, func, select
+from app import db
+from models import CalendarDay
+from db_compat import dialect_insert
+
+calendar_table = CalendarDay.__table__
+CALENDAR_FIRST_DATE = date(2015, 1, 1)
+CALENDAR_YEARS_AHEAD = 10
+
+_coverage = {'first': None, 'last': None}
+_coverage_lock = threading.Lock()
+
+
+def billing_cycle_start(d: date) -> date:
+    """Kỳ chốt số: từ ngày 26 đến ngày 25 tháng sau."""
+    if d.day >= 26:
+        return d.replace(day=26)
+    prev_month = d.replace(day=1) - timedelta(days=1)
+    return prev_month.replace(day=26)
+
+
+def billing_cycle_end(cycle_start: date) -> date:
+    return (cycle_start.replace(day=1) + timedelta(days=32)).replace(day=25)
+
+
+def calendar_row(d: date) -> Dict[str, Any]:
+    iso_year, iso_week, weekday = d.isocalendar()
+    return {
+        'date': d,
+        'year': d.year,
+        'month': d.month,
+        'month_start': d.replace(day=1),
+        'is_month_start': d.day == 1,
+        'iso_year': iso_year,
+        'iso_week': iso_week,
+        'weekday': weekday,
+        'billing_cycle_start': billing_cycle_start(d),
+        'prev_date': d - timedelta(days=1),
+    }
+
+
+def _rows(start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    return [calendar_row(start_date + timedelta(days=i)) for i in range((end_date - start_date).days + 1)]
+
+
+def _insert_days(rows: List[Dict[str, Any]]) -> None:
+    # nhiều tiến trình cùng khởi động / cùng nối dải: ngày đã có thì bỏ qua
+    insert = dialect_insert()
+    if insert is not None:
+        db.session.execute(insert(calendar_table).on_conflict_do_nothing(index_elements=['date']), rows)
+    else:
+        db.session.execute(calendar_table.insert(), rows)
+
+
+def ensure_calendar(start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """
+    Bổ sung các ngày còn thiếu ở 2 đầu bảng lịch để phủ [start_date, end_date]
+    (mặc định CALENDAR_FIRST_DATE -> 31/12 năm nay + CALENDAR_YEARS_AHEAD). Không commit. Trả về số ngày đã thêm.
+    """
+    start_date = start_date or CALENDAR_FIRST_DATE
+    end_date = end_date or date(date.today().year + CALENDAR_YEARS_AHEAD, 12, 31)
+    first, last = db.session.query(func.min(calendar_table.c.date), func.max(calendar_table.c.date)).one()
+    if first is None:
+        missing = [(start_date, end_date)]
+    else:
+        missing = [(start_date, first - timedelta(days=1)), (last + timedelta(days=1), end_date)]
+    rows = [r for a, b in missing if a <= b for r in _rows(a, b)]
+    if rows:
+        _insert_days(rows)
+    # chỉ nhớ dải đã có trước lần chèn này: transaction có thể rollback, đường đọc tự đọc lại khi cần
+    if first is not None:
+        with _coverage_lock:
+            _coverage.update(first=first, last=last)
+    return len(rows)
+
+
+def calendar_coverage(refresh: bool = False) -> Tuple[Optional[date], Optional[date]]:
+    """(ngày đầu, ngày cuối) của bảng lịch; nhớ trong tiến trình, refresh=True đọc lại min/max (chỉ đọc)."""
+    with _coverage_lock:
+        first, last = _coverage['first'], _coverage['last']
+    if first is None or refresh:
+        first, last = db.session.query(func.min(calendar_table.c.date), func.max(calendar_table.c.date)).one()
+        with _coverage_lock:
+            _coverage.update(first=first, last=last)
+    return first, last
+
+
+def _covers(span: Tuple[Optional[date], Optional[date]], start_date: date, end_date: date) -> bool:
+    return span[0] is not None and span[0] <= start_date and end_date <= span[1]
+
+
+def is_covered(start_date: date, end_date: date) -> bool:
+    # tiến trình khác có thể vừa nối thêm: lệch thì đọc lại min/max
+    return _covers(calendar_coverage(), start_date, end_date) or \
+        _covers(calendar_coverage(refresh=True), start_date, end_date)
+
+
+def clip_to_calendar(start_date: date, end_date: date) -> Optional[Tuple[date, date]]:
+    """Phần giao của [start_date, end_date] với bảng lịch, None nếu rỗng. Chỉ đọc."""
+    if start_date > end_date:
+        return None
+    if is_covered(start_date, end_date):
+        return start_date, end_date
+    first, last = calendar_coverage()
+    if first is None:
+        return None
+    lo, hi = max(start_date, first), min(end_date, last)
+    return (lo, hi) if lo <= hi else None
+
+
+def extend_calendar(start_date: date, end_date: date) -> int:
+    """Đường ghi: nối bảng lịch để phủ [start_date, end_date] trong transaction đang mở (không commit)."""
+    if start_date > end_date or _covers(calendar_coverage(), start_date, end_date):
+        return 0
+    return ensure_calendar(start_date, end_date)
+
+
+def dense_daily(source, date_column, values: Iterable[Any], start_date: date, end_date: date,
+                on: Iterable[Any] = ()) -> List[Tuple]:
+    """
+    [(ngày, tổng value 1, tổng value 2, ...)] cho mọi ngày trong [start_date, end_date], 0 nếu không có dữ liệu.
+    source là bảng/model/alias dữ liệu, date_column là cột ngày của nó;
+    `on` là điều kiện lọc dữ liệu (nằm trong ON của LEFT JOIN để không làm mất ngày trống).
+    """
+    values = list(values)
+    span = clip_to_calendar(start_date, end_date)
+    rows = []
+    if span is not None:
+        cal = calendar_table.c
+        query = (
+            select(cal.date, *[func.coalesce(func.sum(v), 0.0) for v in values])
+            .select_from(calendar_table.outerjoin(source, and_(date_column == cal.date, *on)))
+            .where(cal.date >= span[0], cal.date <= span[1])
+            .group_by(cal.date)
+            .order_by(cal.date)
+        )
+        rows = db.session.execute(query).all()
+    if span == (start_date, end_date) or start_date > end_date:
+        return rows
+    # ngoài bảng lịch không có dữ liệu (xem docstring module)
+    by_date = {r[0]: r for r in rows}
+    zeros = (0.0,) * len(values)
+    return [by_date.get(d) or (d,) + zeros
+            for d in (start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1))]
+
+
+def billing_cycle_bounds(d: date) -> Tuple[date, date]:
+    """(ngày đầu, ngày cuối) của kỳ chứa d."""
+    start = billing_cycle_start(d)
+    return start, billing_cycle_end(start)
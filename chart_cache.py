@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Hashable, Optional
+from app import app
+
+
+class ChartCache:
+    """
+    Cache kết quả chi tiết biểu đồ trong bộ nhớ tiến trình.
+    - LRU: vượt quá max_entries thì bỏ mục lâu không dùng nhất
+    - TTL: mục quá ttl_seconds giây coi như hết hạn
+    - version: mục tính ở phiên bản dữ liệu khác (data_version.py, do tiến trình khác ghi) coi như trượt
+    Mỗi mục ghi kèm dải ngày [start_date, end_date] để chỉ xóa mục bị ảnh hưởng khi nhập liệu.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, start_date, end_date, value, version)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.version_misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, version: Optional[int] = None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if entry[4] != version:
+                del self._entries[key]
+                self.version_misses += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def set(self, key: Hashable, start_date: date, end_date: date, value: Any,
+            version: Optional[int] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, start_date, end_date, value, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, start_date: date, end_date: date, compute: Callable[[], Any],
+                       version: Optional[int] = None):
+        """version: current_data_version() đọc trước khi tính (xem data_version.py)."""
+        value = self.get(key, version)
+        if value is None:
+            value = compute()
+            self.set(key, start_date, end_date, value, version)
+        return value
+
+    def invalidate_dates(self, first_date: date, last_date: date) -> int:
+        """
+        Xóa các mục có dải ngày giao với [first_date, last_date]. Người gọi truyền đủ dải ngày có số liệu
+        dẫn xuất thay đổi (nhập liệu ngày n đổi Δ ngày n+1; sửa chỉ số KH đổi Δ lần đọc kế tiếp).
+        """
+        with self._lock:
+            stale = [
+                key for key, (_, start, end, _, _) in self._entries.items()
+                if start <= last_date and end >= first_date
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'version_misses': self.version_misses,
+                'invalidations': self.invalidations,
+            }
+
+
+chart_cache = ChartCache(
+    max_entries=app.config['CHART_CACHE_MAX_ENTRIES'],
+    ttl_seconds=app.config['CHART_CACHE_TTL_SECONDS'],
+)
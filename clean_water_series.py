@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List
+from sqlalchemy import func
+from models import WellProduction, CleanWaterPlant, WaterTankLevel
+from archive import entry_source
+from calendar_dim import dense_daily
+
+CLEAN_WATER_FACTOR = 0.97  # hệ số thu hồi nước sạch sau xử lý
+
+
+def date_range(start_date: date, end_date: date) -> List[date]:
+    dates = []
+    cur = start_date
+    while cur <= end_date:
+        dates.append(cur)
+        cur += timedelta(days=1)
+    return dates
+
+
+def load_wells_delta_series(start_date: date, end_date: date) -> List[float]:
+    """Tổng sản lượng giếng theo ngày (chưa clamp) cho [start_date, end_date]: SUM(daily_delta) theo ngày."""
+    wp = entry_source(WellProduction, start_date, end_date)
+    rows = dense_daily(wp, wp.date, [wp.daily_delta], start_date, end_date)
+    return [float(r[1]) for r in rows]
+
+
+def load_clean_water_series(start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    """
+    Chuỗi nước sạch theo ngày cho [start_date, end_date].
+    Giếng (daily_delta đã lưu), Jasan và bể chứa (thêm ngày start_date - 1) được nạp bằng 3 truy vấn
+    LEFT JOIN bảng lịch (đủ mọi ngày, ngày trống = 0), sau đó tính toàn bộ chuỗi trong 1 vòng lặp.
+
+    Mỗi phần tử:
+      - wells_total: tổng chỉ số giếng ghi nhận trong ngày
+      - wells_delta: H(n) tổng sản lượng giếng trong ngày
+      - jasan: J(n) nước thô Jasan
+      - clean_water_output: giá trị NMNS đã lưu trong DB
+      - chemicals: hóa chất NMNS (PAC + Xút + Polymer)
+      - inventory_prev / inventory: tồn bể ngày n-1 / ngày n (level đã là m³)
+      - production: 0.97 * (H(n) - J(n))
+      - supplied: production + tồn hôm qua - tồn hôm nay (ngày 1 không cộng tồn)
+      - total_water: 0.97 * max(H(n) - J(n), 0) + tồn hôm qua - tồn hôm nay
+    """
+    prev_start = start_date - timedelta(days=1)
+    wp = entry_source(WellProduction, start_date, end_date)
+    well_rows = dense_daily(wp, wp.date, [wp.production, wp.daily_delta], start_date, end_date)
+
+    cw = entry_source(CleanWaterPlant, start_date, end_date)
+    chemicals_expr = (
+        func.coalesce(cw.pac_usage, 0) +
+        func.coalesce(cw.naoh_usage, 0) +
+        func.coalesce(cw.polymer_usage, 0)
+    )
+    plant_rows = dense_daily(cw, cw.date, [cw.raw_water_jasan, cw.clean_water_output, chemicals_expr],
+                             start_date, end_date)
+
+    # tồn bể từ ngày start_date - 1: inventory_rows[i] là ngày trước của well_rows[i]
+    tl = entry_source(WaterTankLevel, prev_start, end_date)
+    inventory_rows = dense_daily(tl, tl.date, [tl.level], prev_start, end_date)
+
+    series = []
+    for i, (w, p) in enumerate(zip(well_rows, plant_rows)):
+        d = w[0]
+        wells_delta = float(w[2])
+        jasan = float(p[1])
+        inventory_prev = float(inventory_rows[i][1])
+        inventory = float(inventory_rows[i + 1][1])
+        production = (wells_delta - jasan) * CLEAN_WATER_FACTOR
+        if d.day == 1:
+            supplied = production
+        else:
+            supplied = production + inventory_prev - inventory
+        series.append({
+            'date': d,
+            'wells_total': float(w[1]),
+            'wells_delta': wells_delta,
+            'jasan': jasan,
+            'clean_water_output': float(p[2]),
+            'chemicals': float(p[3]),
+            'inventory_prev': inventory_prev,
+            'inventory': inventory,
+            'production': production,
+            'supplied': supplied,
+            'total_water': CLEAN_WATER_FACTOR * max(wells_delta - jasan, 0.0) + (inventory_prev - inventory),
+        })
+    return series
@@ -0,0 +1,159 @@
+import click
+from app import app, db
+from model_helper import coerce_opt
+
+
+def _publish_data_version():
+    """Báo cho cache của các tiến trình web rằng dữ liệu đã đổi (xem data_version.py)."""
+    from data_version import bump_data_version
+    bump_data_version()
+    db.session.commit()
+
+
+@app.cli.command('backfill-daily-facts')
+@click.option('--start', 'start_str', default=None, help='YYYY-MM-DD (mặc định: ngày dữ liệu sớm nhất)')
+@click.option('--end', 'end_str', default=None, help='YYYY-MM-DD (mặc định: ngày dữ liệu mới nhất)')
+def backfill_daily_facts_command(start_str, end_str):
+    """Dựng lại bảng daily_facts từ dữ liệu gốc."""
+    from daily_facts import backfill_daily_facts
+    total = backfill_daily_facts(coerce_opt(start_str, 'date'), coerce_opt(end_str, 'date'))
+    _publish_data_version()
+    click.echo(f'daily_facts: đã ghi {total} ngày')
+
+
+@app.cli.command('backfill-customer-deltas')
+@click.option('--customer-id', 'customer_ids', multiple=True, type=int, help='Chỉ tính cho KH này (lặp lại được)')
+def backfill_customer_deltas_command(customer_ids):
+    """Tính Δ chỉ số cho toàn bộ lịch sử CustomerReading."""
+    from customer_consumption import backfill_reading_deltas
+    total = backfill_reading_deltas(list(customer_ids) or None)
+    _publish_data_version()
+    click.echo(f'customer_reading: đã cập nhật {total} dòng')
+
+
+@app.cli.command('backfill-well-deltas')
+@click.option('--well-id', 'well_ids', multiple=True, type=int, help='Chỉ tính cho giếng này (lặp lại được)')
+def backfill_well_deltas_command(well_ids):
+    """Tính daily_delta cho toàn bộ lịch sử WellProduction."""
+    from well_production import backfill_well_deltas
+    total = backfill_well_deltas(list(well_ids) or None)
+    _publish_data_version()
+    click.echo(f'well_production: đã cập nhật {total} dòng')
+
+
+@app.cli.command('backfill-customer-rankings')
+def backfill_customer_rankings_command():
+    """Dựng lại bảng tiêu thụ KH theo ngày và theo kỳ 26 -> 25."""
+    from customer_ranking import backfill_customer_rankings
+    total = backfill_customer_rankings()
+    _publish_data_version()
+    click.echo(f'customer rankings: đã dựng {total} kỳ')
+
+
+@app.cli.command('backfill-monthly-rollups')
+@click.option('--start', 'start_str', default=None, help='YYYY-MM-DD (mặc định: ngày dữ liệu sớm nhất)')
+@click.option('--end', 'end_str', default=None, help='YYYY-MM-DD (mặc định: ngày dữ liệu mới nhất)')
+def backfill_monthly_rollups_command(start_str, end_str):
+    """Dựng lại các bảng tổng theo tháng (NMNS, NMNT, nước thải KH) cho báo cáo tháng."""
+    from monthly_rollup import backfill_monthly_rollups
+    total = backfill_monthly_rollups(coerce_opt(start_str, 'date'), coerce_opt(end_str, 'date'))
+    _publish_data_version()
+    click.echo(f'monthly rollups: đã ghi {total} tháng')
+
+
+@app.cli.command('check-db-compat')
+def check_db_compat_command():
+    """Kiểm tra nhanh CSDL đang cấu hình (SQLite/PostgreSQL): upsert 5 bảng nhập liệu, nhóm theo tháng. Không ghi lại gì."""
+    from db_compat import run_compat_checks
+    failed = 0
+    for name, ok, detail in run_compat_checks():
+        failed += 0 if ok else 1
+        click.echo(f"{'OK  ' if ok else 'FAIL'} {name}: {detail}")
+    if failed:
+        raise SystemExit(1)
+
+
+@app.cli.command('archive-year')
+@click.argument('year', type=int)
+@click.option('--force', is_flag=True, help='Bỏ qua kiểm tra kỳ báo cáo đã khóa')
+def archive_year_command(year, force):
+    """Chuyển dữ liệu gốc của 1 năm đã chốt sang bảng lưu trữ archive_<bảng>_<năm>."""
+    from archive import archive_year
+    try:
+        moved = archive_year(year, force=force)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in moved.items():
+        click.echo(f'{table}: đã chuyển {count} dòng')
+    click.echo(f'Tiến trình web nhận thay đổi sau tối đa {app.config["ARCHIVE_REGISTRY_TTL_SECONDS"]} giây')
+
+
+@app.cli.command('archive-closed-years')
+def archive_closed_years_command():
+    """Lưu trữ mọi năm đã kết thúc có toàn bộ kỳ báo cáo đã khóa."""
+    from archive import archive_closed_years
+    moved = archive_closed_years()
+    for year, count in moved.items():
+        click.echo(f'{year}: đã chuyển {count} dòng')
+    if not moved:
+        click.echo('Không có năm nào đủ điều kiện lưu trữ')
+
+
+@app.cli.command('restore-year')
+@click.argument('year', type=int)
+def restore_year_command(year):
+    """Đưa dữ liệu 1 năm từ bảng lưu trữ về bảng nóng."""
+    from archive import restore_year
+    restored = restore_year(year)
+    for table, count in restored.items():
+        click.echo(f'{table}: đã khôi phục {count} dòng')
+    if not restored:
+        click.echo(f'Năm {year} chưa lưu trữ')
+
+
+@app.cli.command('replica-status')
+def replica_status_command():
+    """Trạng thái bản sao chỉ đọc (DATABASE_REPLICA_URL): kết nối, lag, có đang dùng cho biểu đồ/báo cáo không."""
+    from read_replica import replica_status
+    status = replica_status()
+    if not status['configured']:
+        click.echo('Chưa cấu hình DATABASE_REPLICA_URL: mọi truy vấn đọc CSDL chính')
+        return
+    for key, value in status.items():
+        click.echo(f'{key}: {value}')
+
+
+@app.cli.command('import-readings')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--type', 'default_type', default=None,
+              help='Loại bản ghi cho dòng không có cột type và sheet không đặt tên theo loại '
+                   '(well_production, water_tank_level, customer_reading, wastewater_plant, clean_water_plant)')
+@click.option('--sheet', 'sheets', multiple=True, help='Chỉ nhập sheet này của file .xlsx (lặp lại được)')
+@click.option('--chunk-rows', type=int, default=None, help='Số dòng mỗi transaction (mặc định INGEST_CHUNK_ROWS)')
+@click.option('--report', 'report_path', default=None, help='File CSV báo cáo lỗi (mặc định trong IMPORT_REPORT_DIR)')
+@click.option('--username', default=None, help='Ghi created_by là người dùng này')
+def import_readings_command(path, default_type, sheets, chunk_rows, report_path, username):
+    """Nhập lịch sử số liệu giếng/bể/KH/NMNT/NMNS từ file .xlsx hoặc .csv (đọc từng dòng, commit theo khối)."""
+    from models import User
+    from bulk_ingest import INGEST_TYPES
+    from blueprints.data_entry import edit_cutoff
+    from file_import import import_file
+    if default_type is not None and default_type not in INGEST_TYPES:
+        raise click.BadParameter(f'"{default_type}" không hợp lệ', param_hint='--type')
+    user_id = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.BadParameter(f'không có người dùng "{username}"', param_hint='--username')
+        user_id = user.id
+    report = import_file(path, path, user_id=user_id, editable_since=edit_cutoff(), default_type=default_type,
+                         sheets=list(sheets) or None, chunk_rows=chunk_rows, report_path=report_path)
+    click.echo(f'{report["records"]} dòng, {report["chunks"]} khối, {report["elapsed_seconds"]} giây')
+    for status, count in sorted(report['summary'].items()):
+        click.echo(f'  {status}: {count}')
+    if report['date_range']:
+        click.echo(f'Dải ngày đã ghi: {report["date_range"][0]} -> {report["date_range"][1]}')
+    if report.get('error'):
+        click.echo(f'Dừng giữa chừng: {report["error"]}')
+    if report['report_file']:
+        click.echo(f'Báo cáo lỗi: {report["report_file"]}')
@@ -0,0 +1,182 @@
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, case, select, update
+from app import db
+from models import Customer, CustomerReading
+from archive import entry_source
+
+logger = logging.getLogger(__name__)
+
+COMPANIES_NHY = [
+    'Cty TNHH Dệt và Nhuộm Hưng Yên',    # Áp hệ số: đồng hồ 1 * 10, đồng hồ 2 * 1
+]
+COMPANIES_LH = [
+    'Cty TNHH dệt may Lee Hing Việt Nam'    # Áp hệ số: đồng hồ 1, đồng hồ 2 * 10
+]
+
+# (cột chỉ số, cột Δ lưu sẵn)
+READING_DELTA_COLUMNS = (
+    ('clean_water_reading', 'clean_water_delta'),
+    ('clean_water_reading_2', 'clean_water_delta_2'),
+    ('clean_water_reading_3', 'clean_water_delta_3'),
+    ('clean_water_outsource', 'clean_water_outsource_delta'),
+)
+
+
+def reading_deltas(row, prev_row) -> Dict[str, Optional[float]]:
+    """
+    Δ của 1 dòng chỉ số so với dòng trước đó của cùng KH (prev_row=None nếu là lần đọc đầu).
+    Giữ đúng quy tắc cũ của lag(): dòng đầu -> 0, âm -> 0; NT không có chỉ số -> NULL.
+    """
+    deltas = {}
+    for value_col, delta_col in READING_DELTA_COLUMNS:
+        if prev_row is None:
+            deltas[delta_col] = 0.0
+        else:
+            cur = getattr(row, value_col) or 0.0
+            prev = getattr(prev_row, value_col) or 0.0
+            deltas[delta_col] = max(cur - prev, 0.0)
+
+    # chỉ số NT dùng để trừ: cột sinh wastewater_effective (ưu tiên đồng hồ, không có thì tính theo tỉ lệ)
+    cur_waste = row.wastewater_effective
+    prev_waste = prev_row.wastewater_effective if prev_row is not None else None
+    if cur_waste is None:
+        deltas['wastewater_delta'] = None
+    elif prev_waste is None:
+        deltas['wastewater_delta'] = 0.0
+    else:
+        deltas['wastewater_delta'] = max(cur_waste - prev_waste, 0.0)
+    return deltas
+
+
+def _neighbour_rows(customer_ids: List[int], the_date: date, before: bool) -> Dict[int, CustomerReading]:
+    """
+    Dòng gần nhất trước (before=True) hoặc sau the_date của từng KH.
+    Dòng trước có thể nằm ở năm đã lưu trữ (KH chốt số tháng 1 so với tháng 12 năm trước).
+    """
+    if before:
+        cr = entry_source(CustomerReading, None, the_date)
+        bound = func.max(cr.date)
+        cond = cr.date < the_date
+    else:
+        cr = CustomerReading
+        bound = func.min(cr.date)
+        cond = cr.date > the_date
+    nearest = (
+        select(cr.customer_id, bound.label('date'))
+        .where(cr.customer_id.in_(customer_ids), cond)
+        .group_by(cr.customer_id)
+        .subquery()
+    )
+    rows = (
+        db.session.query(cr)
+        .join(nearest, (cr.customer_id == nearest.c.customer_id) &
+                       (cr.date == nearest.c.date))
+        .order_by(cr.id)
+        .all()
+    )
+    return {r.customer_id: r for r in rows}
+
+
+def update_reading_deltas(customer_ids: Iterable[int], the_date: date, end_date: Optional[date] = None) -> date:
+    """
+    Tính lại Δ cho các dòng từ ngày the_date tới end_date (mặc định end_date = the_date) của các KH
+    và sửa dòng kế tiếp sau end_date (Δ của nó phụ thuộc dòng cuối). Gọi sau khi đã add/sửa dòng, trước commit.
+    Trả về ngày muộn nhất có Δ thay đổi (để làm mới các bảng tổng hợp).
+    """
+    end_date = end_date or the_date
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return end_date
+    db.session.flush()
+    value_cols = [getattr(CustomerReading, c) for c, _ in READING_DELTA_COLUMNS]
+    current = db.session.query(
+        CustomerReading.id, CustomerReading.customer_id, CustomerReading.date,
+        *value_cols, CustomerReading.wastewater_effective
+    ).filter(
+        CustomerReading.customer_id.in_(customer_ids),
+        CustomerReading.date >= the_date,
+        CustomerReading.date <= end_date
+    ).order_by(CustomerReading.date, CustomerReading.id).all()
+    prev_map = _neighbour_rows(customer_ids, the_date, before=True)
+    next_map = _neighbour_rows(customer_ids, end_date, before=False)
+
+    # UPDATE theo khóa chính cho cả lô (không qua unit of work)
+    updates = []
+    last = dict(prev_map)
+    for row in current:
+        updates.append({'id': row.id, **reading_deltas(row, last.get(row.customer_id))})
+        last[row.customer_id] = row
+    for cid, row in next_map.items():
+        updates.append({'id': row.id, **reading_deltas(row, last.get(cid))})
+    if updates:
+        db.session.execute(update(CustomerReading), updates)
+    return max([end_date] + [r.date for r in next_map.values()])
+
+
+def backfill_reading_deltas(customer_ids: Optional[Iterable[int]] = None) -> int:
+    """Tính Δ cho toàn bộ lịch sử chỉ số, commit theo từng KH. Trả về số dòng đã cập nhật."""
+    if customer_ids is None:
+        customer_ids = [
+            cid for (cid,) in db.session.query(CustomerReading.customer_id).distinct().all()
+        ]
+    value_cols = [getattr(CustomerReading, c) for c, _ in READING_DELTA_COLUMNS]
+
+    total = 0
+    for cid in customer_ids:
+        rows = db.session.query(
+            CustomerReading.id, CustomerReading.date, *value_cols, CustomerReading.wastewater_effective
+        ).filter(
+            CustomerReading.customer_id == cid
+        ).order_by(CustomerReading.date, CustomerReading.id).all()
+
+        updates = []
+        # dòng đầu tiên của bảng nóng so với lần đọc cuối trong năm đã lưu trữ (nếu có)
+        prev = _neighbour_rows([cid], rows[0].date, before=True).get(cid) if rows else None
+        for r in rows:
+            updates.append({'id': r.id, **reading_deltas(r, prev)})
+            prev = r
+        if updates:
+            db.session.execute(update(CustomerReading), updates)
+        db.session.commit()
+        total += len(updates)
+        logger.info("customer_reading: backfilled %s rows for customer %s", len(updates), cid)
+    return total
+
+
+def customer_delta_subquery(start_date: date, end_date: date, active_daily_only: bool = True):
+    """
+    Subquery tiêu thụ theo (ngày, khách hàng) cho KH đang hoạt động, đọc số hằng ngày
+    (active_daily_only=False: mọi KH).
+    Cột: date, customer_id, company_name, clean_delta, wastewater_delta.
+    Dùng Δ đã lưu trên CustomerReading nên chỉ cần đọc đúng dải [start_date, end_date].
+    """
+    cr = entry_source(CustomerReading, start_date, end_date)
+    delta1 = func.coalesce(cr.clean_water_delta, 0)
+    delta2 = func.coalesce(cr.clean_water_delta_2, 0)
+    delta3 = func.coalesce(cr.clean_water_delta_3, 0)
+
+    clean_delta_expr = case(
+        (Customer.company_name.in_(COMPANIES_NHY), (delta1 * 10) + delta2 + delta3),
+        (Customer.company_name.in_(COMPANIES_LH), delta1 + delta2 * 10),
+        else_=delta1
+    )
+
+    query = (
+        db.session.query(
+            cr.date.label('date'),
+            cr.customer_id.label('customer_id'),
+            Customer.company_name.label('company_name'),
+            clean_delta_expr.label('clean_delta'),
+            cr.wastewater_delta.label('wastewater_delta')
+        )
+        .join(Customer, Customer.id == cr.customer_id)
+        .filter(
+            cr.date >= start_date,
+            cr.date <= end_date,
+        )
+    )
+    if active_daily_only:
+        query = query.filter(Customer.is_active.is_(True), Customer.daily_reading.is_(True))
+    return query.subquery()
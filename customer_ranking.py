@@ -0,0 +1,170 @@
+import logging
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import func, select, union_all
+from app import db
+from models import Customer, CustomerReading, CustomerDailyConsumption, CustomerCycleConsumption
+from customer_consumption import customer_delta_subquery
+from calendar_dim import calendar_table, billing_cycle_start, billing_cycle_end, dense_daily, extend_calendar
+
+logger = logging.getLogger(__name__)
+daily_table = CustomerDailyConsumption.__table__
+cycle_table = CustomerCycleConsumption.__table__
+TOP_CUSTOMERS = 4
+BACKFILL_CHUNK_CYCLES = 12
+
+
+def _split_range(start_date: date, end_date: date) -> Tuple[List[date], List[Tuple[date, date]]]:
+    """Tách [start_date, end_date] thành các kỳ trọn vẹn và các đoạn ngày lẻ ở 2 đầu."""
+    cycles = []
+    c = billing_cycle_start(start_date)
+    if c < start_date:
+        c = billing_cycle_end(c) + timedelta(days=1)
+    first_full = c
+    while billing_cycle_end(c) <= end_date:
+        cycles.append(c)
+        c = billing_cycle_end(c) + timedelta(days=1)
+    if not cycles:
+        return [], [(start_date, end_date)]
+
+    partial = []
+    if start_date < first_full:
+        partial.append((start_date, first_full - timedelta(days=1)))
+    last_end = billing_cycle_end(cycles[-1])
+    if last_end < end_date:
+        partial.append((last_end + timedelta(days=1), end_date))
+    return cycles, partial
+
+
+def _customer_filter(col, customer_ids):
+    return [col.in_(customer_ids)] if customer_ids is not None else []
+
+
+def refresh_customer_rankings(start_date: date, end_date: date,
+                              customer_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Tính lại tiêu thụ theo ngày cho [start_date, end_date] và các kỳ chứa dải này
+    (chỉ các KH customer_ids nếu truyền). Không commit.
+    """
+    if start_date > end_date:
+        return
+    customer_ids = list(customer_ids) if customer_ids is not None else None
+
+    # 1) Bảng ngày: tính từ Δ đã lưu trên CustomerReading
+    sq = customer_delta_subquery(start_date, end_date, active_daily_only=False)
+    rows = db.session.query(
+        sq.c.date, sq.c.customer_id,
+        func.sum(sq.c.clean_delta), func.sum(sq.c.wastewater_delta)
+    ).filter(
+        *_customer_filter(sq.c.customer_id, customer_ids)
+    ).group_by(sq.c.date, sq.c.customer_id).all()
+
+    db.session.execute(daily_table.delete().where(
+        daily_table.c.date >= start_date, daily_table.c.date <= end_date,
+        *_customer_filter(daily_table.c.customer_id, customer_ids)
+    ))
+    if rows:
+        db.session.execute(daily_table.insert(), [
+            {'date': d, 'customer_id': cid, 'clean_water': float(clean or 0), 'wastewater': float(waste or 0)}
+            for d, cid, clean, waste in rows
+        ])
+
+    # 2) Bảng kỳ: cộng lại từ bảng ngày cho các kỳ bị ảnh hưởng, gộp theo kỳ của bảng lịch ngay trong SQL
+    first_cycle = billing_cycle_start(start_date)
+    last_cycle = billing_cycle_start(end_date)
+    extend_calendar(first_cycle, billing_cycle_end(last_cycle))
+    cal = calendar_table.c
+    per_cycle = (
+        select(cal.billing_cycle_start, daily_table.c.customer_id,
+               func.sum(daily_table.c.clean_water), func.sum(daily_table.c.wastewater))
+        .select_from(daily_table.join(calendar_table, cal.date == daily_table.c.date))
+        .where(
+            daily_table.c.date >= first_cycle,
+            daily_table.c.date <= billing_cycle_end(last_cycle),
+            *_customer_filter(daily_table.c.customer_id, customer_ids)
+        )
+        .group_by(cal.billing_cycle_start, daily_table.c.customer_id)
+    )
+    db.session.execute(cycle_table.delete().where(
+        cycle_table.c.cycle_start >= first_cycle, cycle_table.c.cycle_start <= last_cycle,
+        *_customer_filter(cycle_table.c.customer_id, customer_ids)
+    ))
+    db.session.execute(cycle_table.insert().from_select(
+        ['cycle_start', 'customer_id', 'clean_water', 'wastewater'], per_cycle
+    ))
+
+
+def rebuild_customer_rankings(customer_id: int) -> None:
+    """Tính lại toàn bộ lịch sử của 1 KH (đổi tên/hệ số). Không commit."""
+    lo, hi = db.session.query(
+        func.min(CustomerReading.date), func.max(CustomerReading.date)
+    ).filter(CustomerReading.customer_id == customer_id).one()
+    if lo and hi:
+        refresh_customer_rankings(lo, hi, [customer_id])
+
+
+def delete_customer_rankings(customer_id: int) -> None:
+    db.session.execute(daily_table.delete().where(daily_table.c.customer_id == customer_id))
+    db.session.execute(cycle_table.delete().where(cycle_table.c.customer_id == customer_id))
+
+
+def backfill_customer_rankings(chunk_cycles: int = BACKFILL_CHUNK_CYCLES) -> int:
+    """Dựng lại 2 bảng xếp hạng cho toàn bộ lịch sử, commit theo từng nhóm kỳ. Trả về số kỳ."""
+    lo, hi = db.session.query(func.min(CustomerReading.date), func.max(CustomerReading.date)).one()
+    if not lo or not hi:
+        return 0
+    total = 0
+    c = billing_cycle_start(lo)
+    while c <= hi:
+        chunk_start = c
+        for _ in range(chunk_cycles):
+            chunk_end = billing_cycle_end(c)
+            c = chunk_end + timedelta(days=1)
+            total += 1
+            if c > hi:
+                break
+        refresh_customer_rankings(chunk_start, chunk_end)
+        db.session.commit()
+        logger.info("customer rankings: rebuilt %s -> %s", chunk_start, chunk_end)
+    return total
+
+
+def top_customer_ids(start_date: date, end_date: date, limit: int = TOP_CUSTOMERS) -> List[int]:
+    """
+    Top N KH (đang hoạt động, đọc số hằng ngày) theo tổng nước sạch trong [start_date, end_date].
+    Kỳ trọn vẹn đọc từ bảng kỳ, đoạn lẻ đọc từ bảng ngày; hòa thì ưu tiên ID nhỏ.
+    """
+    cycles, partial = _split_range(start_date, end_date)
+    parts = []
+    if cycles:
+        parts.append(
+            select(cycle_table.c.customer_id, cycle_table.c.clean_water)
+            .where(cycle_table.c.cycle_start.in_(cycles))
+        )
+    for a, b in partial:
+        parts.append(
+            select(daily_table.c.customer_id, daily_table.c.clean_water)
+            .where(daily_table.c.date >= a, daily_table.c.date <= b)
+        )
+    combined = (parts[0] if len(parts) == 1 else union_all(*parts)).subquery()
+
+    total = func.sum(combined.c.clean_water)
+    rows = (
+        db.session.query(combined.c.customer_id)
+        .join(Customer, Customer.id == combined.c.customer_id)
+        .filter(Customer.is_active.is_(True), Customer.daily_reading.is_(True))
+        .group_by(combined.c.customer_id)
+        .order_by(total.desc(), combined.c.customer_id)
+        .limit(limit)
+        .all()
+    )
+    return [r[0] for r in rows]
+
+
+def customer_daily_series(start_date: date, end_date: date,
+                          customer_ids: List[int]) -> List[Tuple[date, float, float]]:
+    """[(ngày, nước sạch, nước thải)] liên tục theo ngày (0 nếu không có), cộng cho các KH chỉ định."""
+    return dense_daily(
+        daily_table, daily_table.c.date, [daily_table.c.clean_water, daily_table.c.wastewater],
+        start_date, end_date, on=[daily_table.c.customer_id.in_(customer_ids or [])]
+    )
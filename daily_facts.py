@@ -0,0 +1,137 @@
+import logging
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func
+from app import db
+from models import DailyFact, WellProduction, CleanWaterPlant, WaterTankLevel, WastewaterPlant
+from clean_water_series import date_range, load_clean_water_series
+from archive import entry_source
+from calendar_dim import extend_calendar
+
+logger = logging.getLogger(__name__)
+facts_table = DailyFact.__table__
+BACKFILL_CHUNK_DAYS = 366
+
+
+def compute_daily_facts(start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    """Tính các chỉ số dẫn xuất theo ngày từ dữ liệu gốc cho [start_date, end_date]."""
+    clean_rows = load_clean_water_series(start_date, end_date)
+
+    ww = entry_source(WastewaterPlant, start_date, end_date)
+    ww_rows = db.session.query(
+        ww.date,
+        func.sum(ww.input_flow_tqt),
+        func.sum(ww.output_flow_tqt),
+        func.sum(func.coalesce(ww.sludge_output, 0)),
+        func.sum(func.coalesce(ww.chemical_usage, 0))
+    ).filter(
+        ww.date >= start_date,
+        ww.date <= end_date
+    ).group_by(ww.date).all()
+    ww_map = {r[0]: r for r in ww_rows}
+
+    now = datetime.utcnow()
+    facts = []
+    for r in clean_rows:
+        d = r['date']
+        ww = ww_map.get(d)
+        facts.append({
+            'date': d,
+            'well_total': r['wells_total'],
+            'well_delta': r['wells_delta'],
+            'raw_water_jasan': r['jasan'],
+            'clean_water_production': r['production'],
+            'clean_water_supplied': r['supplied'],
+            'tank_inventory': r['inventory'],
+            'tank_inventory_change': r['inventory_prev'] - r['inventory'],
+            # NULL khi chưa có dòng NMNT trong ngày (dashboard chỉ hiển thị ngày có dữ liệu)
+            'wastewater_input': float(ww[1] or 0) if ww else None,
+            'wastewater_output': float(ww[2] or 0) if ww else None,
+            'sludge_output': float(ww[3] or 0) if ww else 0.0,
+            'chemical_usage': r['chemicals'] + (float(ww[4] or 0) if ww else 0.0),
+            'updated_at': now,
+        })
+    return facts
+
+
+def refresh_daily_facts(start_date: date, end_date: date) -> int:
+    """Tính lại và ghi đè daily_facts cho [start_date, end_date]. Không commit."""
+    if start_date > end_date:
+        return 0
+    extend_calendar(start_date, end_date)
+    facts = compute_daily_facts(start_date, end_date)
+    db.session.execute(facts_table.delete().where(
+        facts_table.c.date >= start_date, facts_table.c.date <= end_date
+    ))
+    if facts:
+        db.session.execute(facts_table.insert(), facts)
+    return len(facts)
+
+
+def refresh_daily_facts_for_entry(entry_date: date) -> int:
+    """Nhập liệu ngày n (giếng, NMNS, NMNT, bể) ảnh hưởng delta ngày n và ngày n+1."""
+    return refresh_daily_facts(entry_date, entry_date + timedelta(days=1))
+
+
+def _empty_fact(d: date) -> SimpleNamespace:
+    # ngày sau hôm nay: chưa có số liệu (NMNT chưa nhập -> NULL như compute_daily_facts)
+    row = {c.name: 0.0 for c in facts_table.c}
+    row.update(date=d, wastewater_input=None, wastewater_output=None, updated_at=None)
+    return SimpleNamespace(**row)
+
+
+def load_daily_facts(start_date: date, end_date: date) -> Dict[date, Any]:
+    """
+    Đọc daily_facts cho [start_date, end_date] (1 truy vấn theo khóa chính). Không ghi: các GET có thể chạy trên
+    bản sao chỉ đọc. Ngày thiếu tới hôm nay (chưa backfill) được tính từ dữ liệu gốc cho đoạn từ ngày thiếu
+    đầu tiên tới ngày thiếu cuối cùng nhưng không lưu; ngày sau hôm nay không có trong kết quả.
+    Ghi daily_facts chỉ do các hàm submit_* / bulk ingest và `flask backfill-daily-facts`.
+    """
+    rows = db.session.query(*facts_table.c).filter(
+        facts_table.c.date >= start_date,
+        facts_table.c.date <= end_date
+    ).all()
+    facts = {r.date: r for r in rows}
+    missing = [d for d in date_range(start_date, min(end_date, date.today())) if d not in facts]
+    if missing:
+        for f in compute_daily_facts(missing[0], missing[-1]):
+            facts.setdefault(f['date'], SimpleNamespace(**f))
+    return facts
+
+
+def daily_fact_series(start_date: date, end_date: date) -> List[Any]:
+    """Danh sách daily_facts liên tục theo ngày cho [start_date, end_date] (ngày sau hôm nay: dòng rỗng)."""
+    facts = load_daily_facts(start_date, end_date)
+    return [facts.get(d) or _empty_fact(d) for d in date_range(start_date, end_date)]
+
+
+def _raw_date_bounds():
+    bounds = []
+    for col in (WellProduction.date, CleanWaterPlant.date, WaterTankLevel.date, WastewaterPlant.date):
+        lo, hi = db.session.query(func.min(col), func.max(col)).one()
+        if lo and hi:
+            bounds.append((lo, hi))
+    if not bounds:
+        return None, None
+    return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+
+def backfill_daily_facts(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                         chunk_days: int = BACKFILL_CHUNK_DAYS) -> int:
+    """Dựng lại daily_facts theo từng khối ngày, commit sau mỗi khối. Trả về số ngày đã ghi."""
+    lo, hi = _raw_date_bounds()
+    start_date = start_date or lo
+    end_date = end_date or hi
+    if not start_date or not end_date:
+        return 0
+
+    total = 0
+    cur = start_date
+    while cur <= end_date:
+        chunk_end = min(cur + timedelta(days=chunk_days - 1), end_date)
+        total += refresh_daily_facts(cur, chunk_end)
+        db.session.commit()
+        logger.info("daily_facts: rebuilt %s -> %s", cur, chunk_end)
+        cur = chunk_end + timedelta(days=1)
+    return total
@@ -189,6 +189,14 @@ def generate_sample_data():
             print(f"Generated data up to {current_date}")
     
     db.session.commit()
+
+    # Tính Δ chỉ số giếng, khách hàng và bảng xếp hạng KH cho dữ liệu mẫu
+    from well_production import backfill_well_deltas
+    from customer_consumption import backfill_reading_deltas
+    backfill_well_deltas()
+    backfill_reading_deltas()
+    from customer_ranking import backfill_customer_rankings
+    backfill_customer_rankings()
     print("Sample data generation completed!")
     
     # Write user accounts to info.txt
@@ -0,0 +1,52 @@
+"""
+Phiên bản dữ liệu dùng chung: cache trong bộ nhớ (chart_cache, kpi_snapshot) chỉ xóa được mục của tiến trình
+đã ghi, các tiến trình/instance khác (gunicorn nhiều worker, autoscale) vẫn giữ bản cũ tới hết TTL.
+
+- Mọi đường ghi số liệu gọi bump_data_version() trong transaction của mình (trước commit).
+- Đường đọc lấy current_data_version() (1 truy vấn/request, nhớ trong g) trước khi tính và gắn vào mục cache;
+  mục có version khác version hiện tại coi như trượt. Đọc version trước khi tính nên nếu có lần ghi xen giữa,
+  mục mới mang version cũ và bị tính lại ở request sau, không bao giờ ngược lại.
+"""
+from datetime import datetime
+from flask import g, has_app_context
+from sqlalchemy import select
+from app import db
+from models import DataVersion
+from db_compat import dialect_insert
+
+version_table = DataVersion.__table__
+VERSION_ROW_ID = 1
+_G_KEY = 'data_version'
+
+
+def bump_data_version() -> None:
+    """Tăng version trong transaction đang mở (không commit)."""
+    now = datetime.utcnow()
+    insert = dialect_insert()
+    if insert is not None:
+        db.session.execute(
+            insert(version_table).values(id=VERSION_ROW_ID, version=1, updated_at=now).on_conflict_do_update(
+                index_elements=['id'], set_={'version': version_table.c.version + 1, 'updated_at': now}
+            )
+        )
+    else:
+        result = db.session.execute(
+            version_table.update().where(version_table.c.id == VERSION_ROW_ID)
+            .values(version=version_table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            db.session.execute(version_table.insert().values(id=VERSION_ROW_ID, version=1, updated_at=now))
+    if has_app_context():
+        g.pop(_G_KEY, None)
+
+
+def current_data_version() -> int:
+    """Version hiện tại (0 nếu chưa ghi lần nào); trong 1 request chỉ đọc 1 lần."""
+    if has_app_context() and _G_KEY in g:
+        return g.get(_G_KEY)
+    value = db.session.execute(
+        select(version_table.c.version).where(version_table.c.id == VERSION_ROW_ID)
+    ).scalar() or 0
+    if has_app_context():
+        setattr(g, _G_KEY, value)
+    return value
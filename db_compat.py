@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+from typing import Tuple
+from sqlalchemy import func
+from app import db
+
+
+def dialect_name() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def dialect_insert(dialect: str = None):
+    """insert() có ON CONFLICT của dialect (PostgreSQL / SQLite), None nếu dialect không hỗ trợ."""
+    dialect = dialect or dialect_name()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def month_key(value) -> Tuple[int, int]:
+    """(năm, tháng) từ giá trị tháng driver trả về (datetime/date hoặc chuỗi 'YYYY-MM-01')."""
+    if isinstance(value, (datetime, date)):
+        return value.year, value.month
+    y, m = str(value).split('-')[:2]
+    return int(y), int(m)
+
+
+def run_compat_checks():
+    """
+    Chạy thử trên CSDL hiện tại, luôn rollback ở cuối. Trả về list (tên, đạt?, chi tiết).
+    Kiểm tra nhanh CSDL đang chạy qua `flask check-db-compat`; ma trận SQLite/PostgreSQL tự động nằm ở
+    tests/test_db_compat.py (pytest, TEST_POSTGRES_URL cho PostgreSQL).
+    """
+    from models import Well, WaterTank, Customer, WellProduction, CleanWaterPlant, WastewaterPlant, \
+        WaterTankLevel, CustomerReading
+    from entry_upsert import upsert_entries
+    from monthly_rollup import clean_water_monthly_select, customer_wastewater_monthly_select, \
+        wastewater_monthly_select, month_end
+
+    results = []
+    probe_date = date(1900, 1, 1)  # ngoài mọi dải dữ liệu thật
+    now = datetime.utcnow()
+    bind = db.session.get_bind()
+    results.append(('dialect', True, f'{bind.dialect.name} {bind.dialect.server_version_info}'))
+
+    fk = {
+        'well_id': db.session.query(func.min(Well.id)).scalar(),
+        'tank_id': db.session.query(func.min(WaterTank.id)).scalar(),
+        'customer_id': db.session.query(func.min(Customer.id)).scalar(),
+        'plant_number': 1,
+    }
+    cases = [
+        (WellProduction, 'well_id', 'production'),
+        (CleanWaterPlant, None, 'electricity'),
+        (WastewaterPlant, 'plant_number', 'electricity'),
+        (WaterTankLevel, 'tank_id', 'level'),
+        (CustomerReading, 'customer_id', 'clean_water_reading'),
+    ]
+    try:
+        for model, key, value_col in cases:
+            name = f'upsert {model.__tablename__}'
+            if key and fk[key] is None:
+                results.append((name, True, f'bỏ qua (chưa có {key})'))
+                continue
+            base = {'date': probe_date, **({key: fk[key]} if key else {})}
+            try:
+                r1 = upsert_entries(model, [{**base, value_col: 1.0}], [value_col], now - timedelta(hours=1))
+                r2 = upsert_entries(model, [{**base, value_col: 2.0}], [value_col], now - timedelta(hours=1))
+                r3 = upsert_entries(model, [{**base, value_col: 3.0}], [value_col], now + timedelta(hours=1))
+                stored = db.session.query(getattr(model, value_col)).filter_by(**base).scalar()
+                ok = (len(r1['inserted']), len(r2['updated']), len(r3['locked']), stored) == (1, 1, 1, 2.0)
+                results.append((name, ok, f'inserted/updated/locked/value = '
+                                          f'{len(r1["inserted"])}/{len(r2["updated"])}/{len(r3["locked"])}/{stored}'))
+            except Exception as e:
+                db.session.rollback()
+                results.append((name, False, str(e).splitlines()[0]))
+
+        # tổng theo tháng qua bảng lịch (monthly_rollup.py) cho tháng có dữ liệu gần nhất
+        for model, select_month in ((CleanWaterPlant, clean_water_monthly_select),
+                                    (CustomerReading, customer_wastewater_monthly_select),
+                                    (WastewaterPlant, wastewater_monthly_select)):
+            name = f'monthly {model.__tablename__}'
+            try:
+                last = db.session.query(func.max(model.date)).scalar()
+                if last is None:
+                    results.append((name, True, 'bỏ qua (chưa có dữ liệu)'))
+                    continue
+                rows = db.session.execute(select_month(last.replace(day=1), month_end(last))).all()
+                ok = [month_key(r.month) for r in rows] == [(last.year, last.month)] * len(rows) and bool(rows)
+                results.append((name, ok, f'{month_key(rows[0].month) if rows else "?"}: {len(rows)} dòng'))
+            except Exception as e:
+                db.session.rollback()
+                results.append((name, False, str(e).splitlines()[0]))
+    finally:
+        db.session.rollback()
+    return results
@@ -0,0 +1,106 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, case, literal, null, select, union_all
+from app import db
+from models import WellProduction, CleanWaterPlant, WastewaterPlant, WaterTankLevel, CustomerReading
+from db_compat import dialect_insert
+from archive import archived_years
+
+# Khóa duy nhất của 5 bảng nhập liệu (trùng các index ux_* trong models.py)
+UPSERT_KEYS = {
+    WellProduction: ('well_id', 'date'),
+    WaterTankLevel: ('tank_id', 'date'),
+    CustomerReading: ('customer_id', 'date'),
+    WastewaterPlant: ('plant_number', 'date'),
+    CleanWaterPlant: ('date',),
+}
+
+
+def _existing_created_at(model, keys: Tuple[str, ...], rows: List[Dict[str, Any]]) -> Dict[tuple, datetime]:
+    """{khóa: created_at} của các dòng đã có, 1 truy vấn cho cả lô."""
+    filters = [getattr(model, k).in_({r[k] for r in rows}) for k in keys]
+    found = db.session.query(*[getattr(model, k) for k in keys], model.created_at).filter(and_(*filters)).all()
+    return {tuple(r[:-1]): r[-1] for r in found}
+
+
+def entry_lock_status(the_date: date, editable_since: datetime) -> Dict[Any, Dict[Optional[int], bool]]:
+    """
+    Trạng thái các dòng đã có của cả 5 bảng nhập liệu ở ngày the_date, 1 truy vấn UNION ALL.
+    Điều kiện còn sửa được (created_at >= editable_since) tính ngay trong SQL.
+    Trả về {model: {mã đối tượng (None với NMNS): còn sửa được?}}.
+    """
+    parts = []
+    for i, (model, keys) in enumerate(UPSERT_KEYS.items()):
+        entity = getattr(model, keys[0]) if len(keys) > 1 else null()
+        parts.append(
+            select(
+                literal(i).label('model'),
+                entity.label('entity'),
+                case((model.created_at >= editable_since, 1), else_=0).label('editable'),
+            ).where(model.date == the_date)
+        )
+    models = list(UPSERT_KEYS)
+    status = {model: {} for model in models}
+    for i, entity, editable in db.session.execute(union_all(*parts)).all():
+        status[models[i]][entity] = bool(editable)
+    return status
+
+
+def upsert_entries(model, rows: Iterable[Dict[str, Any]], update_columns: Iterable[str],
+                   editable_since: datetime) -> Dict[str, List[tuple]]:
+    """
+    Ghi 1 lô dòng nhập liệu bằng INSERT ... ON CONFLICT DO UPDATE (PostgreSQL/SQLite).
+    Dòng đã có chỉ được sửa nếu created_at >= editable_since (điều kiện nằm ngay trong câu lệnh);
+    dòng thuộc năm đã lưu trữ luôn bị khóa.
+    Trùng khóa trong lô thì lấy dòng sau. Không commit.
+    Trả về {'inserted': [khóa], 'updated': [khóa], 'locked': [khóa]}.
+    """
+    keys = UPSERT_KEYS[model]
+    by_key = {}
+    for r in rows:
+        by_key[tuple(r[k] for k in keys)] = r
+    result = {'inserted': [], 'updated': [], 'locked': []}
+    if not by_key:
+        return result
+
+    existing = _existing_created_at(model, keys, list(by_key.values()))
+    archived = set(archived_years(model))
+    writable = []
+    for k, r in by_key.items():
+        if r['date'].year in archived:
+            result['locked'].append(k)
+            continue
+        if k not in existing:
+            result['inserted'].append(k)
+        elif existing[k] is None or existing[k] < editable_since:
+            result['locked'].append(k)
+            continue
+        else:
+            result['updated'].append(k)
+        writable.append(r)
+    if not writable:
+        return result
+
+    update_columns = list(update_columns)
+    insert = dialect_insert()
+    if insert is None:
+        # CSDL khác: cập nhật/thêm từng dòng qua ORM
+        for r in writable:
+            obj = db.session.query(model).filter_by(**{k: r[k] for k in keys}).first()
+            if obj is None:
+                db.session.add(model(**r))
+            else:
+                for c in update_columns:
+                    setattr(obj, c, r.get(c))
+        db.session.flush()
+        return result
+
+    table = model.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in keys],
+        set_={c: stmt.excluded[c] for c in update_columns},
+        where=table.c.created_at >= editable_since,
+    )
+    db.session.execute(stmt, writable)
+    return result
@@ -0,0 +1,160 @@
+"""
+Nhập lịch sử số liệu từ file .xlsx / .csv (khi đưa KH hoặc nhà máy mới vào hệ thống), đọc từng dòng với bộ nhớ giới hạn.
+
+- .xlsx: openpyxl read_only, dòng đầu mỗi sheet là tiêu đề cột; sheet đặt tên theo loại bản ghi
+  (well_production, customer_reading, ...) thì dùng làm type mặc định cho các dòng của sheet đó.
+- .csv: csv.DictReader, tự nhận dấu phân cách "," ";" hoặc tab, chấp nhận BOM của Excel.
+- Tiêu đề cột = khóa bản ghi của bulk_ingest (type, date, well_id, production, ...), không phân biệt hoa thường;
+  khoảng trắng/gạch ngang được đổi thành "_".
+- Kiểm tra và ghi qua bulk_ingest.ingest_records (khối chunk_rows dòng / transaction); dòng không ghi được
+  được ghi ra file CSV báo cáo lỗi (sheet, dòng, loại, trạng thái, lỗi).
+"""
+import csv
+import io
+import os
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+from app import app
+from bulk_ingest import INGEST_TYPES, ingest_records
+
+IMPORT_EXTENSIONS = ('.xlsx', '.csv')
+REPORT_COLUMNS = ('sheet', 'row', 'type', 'status', 'error')
+
+
+def import_report_dir() -> str:
+    return app.config['IMPORT_REPORT_DIR'] or os.path.join(app.instance_path, 'import_reports')
+
+
+def _column(name: Any) -> Optional[str]:
+    if name is None:
+        return None
+    name = str(name).strip().lower().replace(' ', '_').replace('-', '_')
+    return name or None
+
+
+def _cell(value: Any) -> Any:
+    # ô Excel: ngày giữ dạng date, số nguyên lưu dạng float (3.0) đổi về int để đọc được mã giếng/KH
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _record(columns: List[Optional[str]], values, sheet_type: Optional[str]) -> Optional[Dict[str, Any]]:
+    obj = {}
+    for col, value in zip(columns, values):
+        if col is None:
+            continue
+        value = _cell(value)
+        if value is not None and value != '':
+            obj[col] = value
+    if not obj:
+        return None  # dòng trống
+    if sheet_type and 'type' not in obj:
+        obj['type'] = sheet_type
+    return obj
+
+
+def iter_xlsx(file, sheets: Optional[List[str]] = None) -> Iterator[tuple]:
+    """(bản ghi, None, {'sheet', 'row'}) cho từng dòng có dữ liệu của các sheet (mặc định: mọi sheet)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if sheets and ws.title not in sheets:
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = [_column(c) for c in header]
+            sheet_type = ws.title if ws.title in INGEST_TYPES else None
+            for row_number, values in enumerate(rows, start=2):
+                obj = _record(columns, values, sheet_type)
+                if obj is not None:
+                    yield obj, None, {'sheet': ws.title, 'row': row_number}
+    finally:
+        wb.close()
+
+
+def iter_csv(text_stream, sheet: str = 'csv') -> Iterator[tuple]:
+    """(bản ghi, None, {'sheet', 'row'}) cho từng dòng có dữ liệu của file CSV (text stream)."""
+    sample = text_stream.read(8192)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(_chain(sample, text_stream), dialect)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [_column(c) for c in header]
+    sheet_type = sheet if sheet in INGEST_TYPES else None
+    for values in reader:
+        obj = _record(columns, values, sheet_type)
+        if obj is not None:
+            yield obj, None, {'sheet': sheet, 'row': reader.line_num}
+
+
+def _chain(sample: str, text_stream) -> Iterator[str]:
+    # đoạn đã đọc để nhận dạng + phần còn lại của stream, theo từng dòng
+    yield from io.StringIO(sample + text_stream.readline())
+    yield from text_stream
+
+
+def write_error_report(results: List[Dict[str, Any]], path: str) -> int:
+    """Ghi các dòng không nạp được ra CSV (UTF-8 BOM để mở bằng Excel). Trả về số dòng lỗi."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+    return len(results)
+
+
+def new_report_path() -> str:
+    name = f'import_{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.csv'
+    return os.path.join(import_report_dir(), name)
+
+
+def import_file(file, filename: str, user_id: Optional[int], editable_since: datetime,
+                default_type: Optional[str] = None, sheets: Optional[List[str]] = None,
+                chunk_rows: Optional[int] = None, report_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Nhập 1 file .xlsx/.csv (đường dẫn hoặc file nhị phân đã mở). Trả về báo cáo của ingest_records
+    (chỉ giữ dòng lỗi trong results) kèm elapsed_seconds và report_file (None nếu không có dòng lỗi).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in IMPORT_EXTENSIONS:
+        raise ValueError(f'Chỉ hỗ trợ file {", ".join(IMPORT_EXTENSIONS)}')
+    started = time.perf_counter()
+    chunk_rows = chunk_rows or app.config['INGEST_CHUNK_ROWS']
+
+    text_stream = None
+    if ext == '.xlsx':
+        records = iter_xlsx(file, sheets)
+    else:
+        raw = open(file, 'rb') if isinstance(file, (str, os.PathLike)) else file
+        text_stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        records = iter_csv(text_stream, sheet=os.path.splitext(os.path.basename(filename))[0])
+    try:
+        report = ingest_records(records, user_id=user_id, editable_since=editable_since,
+                                default_type=default_type, chunk_rows=chunk_rows, keep_results=False)
+    finally:
+        if text_stream is not None and raw is file:
+            text_stream.detach()  # file của người gọi (vd. file upload): không đóng hộ
+        elif text_stream is not None:
+            text_stream.close()
+
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+    report['report_file'] = None
+    if report['results']:
+        report['report_file'] = report_path or new_report_path()
+        write_error_report(report['results'], report['report_file'])
+    return report
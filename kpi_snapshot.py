@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import func, case, select
+from app import app, db
+from models import DailyFact, Customer
+from daily_facts import load_daily_facts
+from chart_cache import ChartCache
+from data_version import current_data_version
+
+logger = logging.getLogger(__name__)
+
+# Ngày quá khứ: giữ đến khi dữ liệu nguồn thay đổi (version dùng chung, xem data_version.py; TTL chỉ là giới hạn an toàn)
+kpi_cache = ChartCache(
+    max_entries=app.config['KPI_CACHE_MAX_ENTRIES'],
+    ttl_seconds=app.config['KPI_HISTORY_TTL_SECONDS'],
+)
+
+# Ngày hôm nay: giữ ngắn, hết hạn thì trả bản cũ và làm mới ở luồng nền
+# generation tăng mỗi lần xóa cache để bỏ kết quả làm mới nền đã tính trên dữ liệu cũ;
+# version khác version dữ liệu hiện tại (tiến trình khác vừa ghi) thì tính lại ngay
+_today = {'date': None, 'value': None, 'version': None, 'computed_at': 0.0, 'refreshing': False, 'generation': 0}
+_today_lock = threading.Lock()
+
+
+def compute_kpi_snapshot(the_date: date) -> Dict[str, Any]:
+    """
+    Tính toàn bộ KPI của 1 ngày bằng 1 truy vấn trên daily_facts (từ đầu tháng đến ngày xem).
+    Sản lượng giếng tháng = tổng well_delta (Δ đã lưu từ WellProduction.daily_delta), không cộng chỉ số đồng hồ.
+    """
+    month_start = the_date.replace(day=1)
+    is_day = DailyFact.date == the_date
+    active_customers = (
+        select(func.count(Customer.id))
+        .where(Customer.is_active.is_(True))
+        .scalar_subquery()
+    )
+    query = db.session.query(
+        func.count(DailyFact.date),
+        func.sum(case((is_day, DailyFact.well_delta), else_=0)),
+        func.sum(DailyFact.well_delta),
+        func.sum(case((is_day, DailyFact.clean_water_supplied), else_=0)),
+        func.sum(case((is_day, func.coalesce(DailyFact.wastewater_input, 0)), else_=0)),
+        active_customers,
+    ).filter(DailyFact.date >= month_start, DailyFact.date <= the_date)
+
+    row = query.one()
+    result = {
+        'today_well_production': float(row[1] or 0),
+        'month_well_production': float(row[2] or 0),
+        'today_clean_water': float(row[3] or 0),
+        'today_wastewater': float(row[4] or 0),
+        'active_customers': int(row[5] or 0),
+    }
+    if row[0] < (min(the_date, date.today()) - month_start).days + 1:
+        # Chưa backfill đủ daily_facts cho tháng này -> tính từ dòng đã lưu + dòng tính tạm (không ghi)
+        facts = load_daily_facts(month_start, the_date)
+        day = facts.get(the_date)
+        result.update(
+            today_well_production=float(day.well_delta or 0) if day else 0.0,
+            month_well_production=sum(float(f.well_delta or 0) for f in facts.values()),
+            today_clean_water=float(day.clean_water_supplied or 0) if day else 0.0,
+            today_wastewater=float(day.wastewater_input or 0) if day else 0.0,
+        )
+    return result
+
+
+def _refresh_today_in_background(the_date: date, generation: int) -> None:
+    def _run():
+        try:
+            with app.app_context():
+                version = current_data_version()
+                value = compute_kpi_snapshot(the_date)
+                with _today_lock:
+                    if _today['date'] == the_date and _today['generation'] == generation:
+                        _today.update(value=value, version=version, computed_at=time.monotonic())
+                db.session.remove()
+        except Exception:
+            logger.exception("KPI snapshot: background refresh failed for %s", the_date)
+        finally:
+            with _today_lock:
+                _today['refreshing'] = False
+
+    threading.Thread(target=_run, name='kpi-snapshot-refresh', daemon=True).start()
+
+
+def _today_snapshot(the_date: date, version: int) -> Dict[str, Any]:
+    ttl = app.config['KPI_TODAY_TTL_SECONDS']
+    with _today_lock:
+        if _today['date'] == the_date and _today['value'] is not None and _today['version'] == version:
+            value = _today['value']
+            if time.monotonic() - _today['computed_at'] > ttl and not _today['refreshing']:
+                _today['refreshing'] = True
+                _refresh_today_in_background(the_date, _today['generation'])
+            return value
+        generation = _today['generation']
+
+    value = compute_kpi_snapshot(the_date)
+    with _today_lock:
+        if _today['generation'] == generation:
+            _today.update(date=the_date, value=value, version=version, computed_at=time.monotonic())
+    return value
+
+
+def get_kpi_snapshot(the_date: date) -> Dict[str, Any]:
+    version = current_data_version()
+    if the_date == date.today():
+        return _today_snapshot(the_date, version)
+    return kpi_cache.get_or_compute(
+        the_date, the_date.replace(day=1), the_date,
+        lambda: compute_kpi_snapshot(the_date), version
+    )
+
+
+def invalidate_kpi_for_entry(entry_date: date, end_date: Optional[date] = None) -> None:
+    # KPI ngày D dùng dải [đầu tháng D, D]; nhập liệu ngày n..m ảnh hưởng ngày n tới m+1
+    last_date = (end_date or entry_date) + timedelta(days=1)
+    kpi_cache.invalidate_dates(entry_date, last_date)
+    with _today_lock:
+        d = _today['date']
+        if d is not None and d.replace(day=1) <= last_date and d >= entry_date:
+            _today['value'] = None
+            _today['generation'] += 1
+
+
+def clear_kpi_cache() -> None:
+    kpi_cache.clear()
+    with _today_lock:
+        _today['value'] = None
+        _today['generation'] += 1
@@ -90,9 +90,15 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # bảng lưu trữ archive_<bảng>_<năm> do archive.py tạo lúc chạy, autogenerate không được đề xuất xóa
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == 'table' and reflected and compare_to is None and name.startswith('archive_'))
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
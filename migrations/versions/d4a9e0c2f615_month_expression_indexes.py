@@ -0,0 +1,44 @@
+"""month expression indexes for monthly reports
+
+Revision ID: d4a9e0c2f615
+Revises: b18e6f3a0c57
+Create Date: 2026-10-18 10:12:48.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9e0c2f615'
+down_revision = 'b18e6f3a0c57'
+branch_labels = None
+depends_on = None
+
+# Phải trùng biểu thức db_compat.month_start() để planner dùng được index
+MONTH_EXPR = {
+    'postgresql': "date_trunc('month', CAST(date AS TIMESTAMP WITHOUT TIME ZONE))",
+    'sqlite': "strftime('%Y-%m-01', date)",
+}
+
+# (tên index, bảng, cột đứng trước biểu thức tháng)
+MONTH_INDEXES = [
+    ('ix_clean_water_plant_month', 'clean_water_plant', []),
+    ('ix_customer_reading_month', 'customer_reading', []),
+    ('ix_wastewater_plant_plant_month', 'wastewater_plant', ['plant_number']),
+]
+
+
+def upgrade():
+    expr = MONTH_EXPR.get(op.get_bind().dialect.name)
+    if expr is None:
+        return
+    for name, table, leading in MONTH_INDEXES:
+        op.create_index(name, table, leading + [sa.text(expr)], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name not in MONTH_EXPR:
+        return
+    for name, table, _ in reversed(MONTH_INDEXES):
+        op.drop_index(name, table_name=table)
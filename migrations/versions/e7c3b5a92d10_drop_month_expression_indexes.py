@@ -0,0 +1,43 @@
+"""drop month expression indexes
+
+Revision ID: e7c3b5a92d10
+Revises: d2f6a8b31e94
+Create Date: 2026-10-20 11:26:17.083519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3b5a92d10'
+down_revision = 'd2f6a8b31e94'
+branch_labels = None
+depends_on = None
+
+# Báo cáo tháng gộp theo calendar_day.month_start (monthly_rollup.py) nên các index biểu thức tháng của
+# d4a9e0c2f615 (c5e1a8f03d72 tạo lại 1 cái trên SQLite) không còn truy vấn nào dùng
+MONTH_EXPR = {
+    'postgresql': "date_trunc('month', CAST(date AS TIMESTAMP WITHOUT TIME ZONE))",
+    'sqlite': "strftime('%Y-%m-01', date)",
+}
+MONTH_INDEXES = [
+    ('ix_clean_water_plant_month', 'clean_water_plant', []),
+    ('ix_customer_reading_month', 'customer_reading', []),
+    ('ix_wastewater_plant_plant_month', 'wastewater_plant', ['plant_number']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name not in MONTH_EXPR:
+        return
+    for name, _, _ in MONTH_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def downgrade():
+    expr = MONTH_EXPR.get(op.get_bind().dialect.name)
+    if expr is None:
+        return
+    for name, table, leading in MONTH_INDEXES:
+        op.create_index(name, table, leading + [sa.text(expr)], unique=False)
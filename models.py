@@ -58,10 +58,15 @@ class WellProduction(db.Model):
     # SL giếng khoan
     id = db.Column(db.Integer, primary_key=True)
     well_id = db.Column(db.Integer, db.ForeignKey('well.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     production = db.Column(db.Float)  # m3
+    # m3 sản lượng trong ngày: chỉ số hôm nay - hôm qua (ngày 1 lấy nguyên, thiếu hôm qua coi như 0), chưa clamp
+    daily_delta = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ux_well_production_well_date', 'well_id', 'date', unique=True),
+    )
 
 class CleanWaterPlant(db.Model):
     # nhà máy nước sạch
@@ -75,21 +80,27 @@ class CleanWaterPlant(db.Model):
     raw_water_jasan = db.Column(db.Float)  # m3
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ux_clean_water_plant_date', 'date', unique=True),
+    )
 
 class WaterTankLevel(db.Model):
     # mực nước bể chứa
     id = db.Column(db.Integer, primary_key=True)
     tank_id = db.Column(db.Integer, db.ForeignKey('water_tank.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     level = db.Column(db.Float)  # m3
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ux_water_tank_level_tank_date', 'tank_id', 'date', unique=True),
+    )
 
 class WastewaterPlant(db.Model):
     # nhà máy xử lý nước thải
     id = db.Column(db.Integer, primary_key=True)
     plant_number = db.Column(db.Integer, nullable=False)  # 1 or 2
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     wastewater_meter = db.Column(db.Float)  # m3
     input_flow_tqt = db.Column(db.Float)  # m3
     output_flow_tqt = db.Column(db.Float)  # m3
@@ -98,20 +109,41 @@ class WastewaterPlant(db.Model):
     chemical_usage = db.Column(db.Float)  # kg (for plant 2)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ux_wastewater_plant_plant_date', 'plant_number', 'date', unique=True),
+    )
 
 class CustomerReading(db.Model):
     # chỉ số khách hàng
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     clean_water_reading = db.Column(db.Float)  # m3 chỉ số của đh 1
     clean_water_reading_2 = db.Column(db.Float) #m3 chỉ sổ của đh 2
     clean_water_reading_3 = db.Column(db.Float) #m3 chỉ sổ của đh 3
     clean_water_outsource = db.Column(db.Float) # m3 nước sạch mua ngoài
     wastewater_reading = db.Column(db.Float)  # m3 (for large customers)
     wastewater_calculated = db.Column(db.Float)  # m3 (calculated from ratio)
+    # Δ so với lần đọc trước của KH (âm -> 0, lần đọc đầu -> 0), cập nhật khi nhập liệu
+    clean_water_delta = db.Column(db.Float)
+    clean_water_delta_2 = db.Column(db.Float)
+    clean_water_delta_3 = db.Column(db.Float)
+    clean_water_outsource_delta = db.Column(db.Float)
+    wastewater_delta = db.Column(db.Float)  # theo wastewater_reading, không có thì wastewater_calculated
+    # cột sinh tự động (lưu vật lý), CSDL tự tính lại khi chỉ số thay đổi
+    clean_water_total = db.Column(db.Float, db.Computed(
+        'coalesce(clean_water_reading, 0) + coalesce(clean_water_reading_2, 0) + coalesce(clean_water_reading_3, 0)',
+        persisted=True))  # m3 tổng chỉ số 3 đồng hồ
+    wastewater_effective = db.Column(db.Float, db.Computed(
+        'coalesce(wastewater_reading, wastewater_calculated)', persisted=True))  # m3 chỉ số NT dùng tính toán
+    wastewater_measured = db.Column(db.Boolean, db.Computed(
+        'wastewater_reading IS NOT NULL', persisted=True))  # True: đồng hồ NT, False: tính theo tỷ lệ
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ux_customer_reading_customer_date', 'customer_id', 'date', unique=True),
+        db.Index('ix_customer_reading_measured_date', 'wastewater_measured', 'date'),
+    )
 
 class ReportPeriod(db.Model):
     # kỳ báo cáo
@@ -122,6 +154,107 @@ class ReportPeriod(db.Model):
     locked_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     locked_at = db.Column(db.DateTime)
 
+class ArchivedYear(db.Model):
+    # năm đã chuyển sang bảng lưu trữ archive_<bảng>_<năm> (xem archive.py)
+    __tablename__ = 'archived_year'
+    table_name = db.Column(db.String(64), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    archived_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+class DailyFact(db.Model):
+    # số liệu dẫn xuất theo ngày (làm mới khi nhập liệu, xem daily_facts.py)
+    __tablename__ = 'daily_facts'
+    date = db.Column(db.Date, primary_key=True)
+    well_total = db.Column(db.Float)  # m3 tổng chỉ số giếng trong ngày
+    well_delta = db.Column(db.Float)  # m3 sản lượng giếng trong ngày (chưa clamp)
+    raw_water_jasan = db.Column(db.Float)  # m3
+    clean_water_production = db.Column(db.Float)  # m3 = 0.97 * (giếng - Jasan)
+    clean_water_supplied = db.Column(db.Float)  # m3 nước sạch cấp KH (có tồn bể)
+    tank_inventory = db.Column(db.Float)  # m3 tồn bể cuối ngày
+    tank_inventory_change = db.Column(db.Float)  # m3 tồn hôm qua - tồn hôm nay
+    wastewater_input = db.Column(db.Float)  # m3, NULL nếu chưa nhập NMNT
+    wastewater_output = db.Column(db.Float)  # m3, NULL nếu chưa nhập NMNT
+    sludge_output = db.Column(db.Float)  # m3
+    chemical_usage = db.Column(db.Float)  # kg NMNS (PAC + Xút + Polymer) + NMNT
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CalendarDay(db.Model):
+    # bảng lịch: mỗi ngày 1 dòng, dùng LEFT JOIN ra chuỗi liên tục và gộp theo kỳ trong SQL - xem calendar_dim.py
+    __tablename__ = 'calendar_day'
+    date = db.Column(db.Date, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    month_start = db.Column(db.Date, nullable=False)
+    is_month_start = db.Column(db.Boolean, nullable=False, default=False)
+    iso_year = db.Column(db.Integer, nullable=False)
+    iso_week = db.Column(db.Integer, nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)  # 1 = thứ Hai ... 7 = Chủ nhật
+    billing_cycle_start = db.Column(db.Date, nullable=False, index=True)  # mã kỳ 26 -> 25 (ngày 26 đầu kỳ)
+    prev_date = db.Column(db.Date, nullable=False)
+
+class MonthlyCleanWater(db.Model):
+    # tổng theo tháng của NMNS (báo cáo định mức điện, hoá chất) - xem monthly_rollup.py
+    __tablename__ = 'monthly_clean_water'
+    month = db.Column(db.Date, primary_key=True)  # ngày 01 của tháng
+    electricity = db.Column(db.Float, nullable=False, default=0)  # kWh
+    pac_usage = db.Column(db.Float, nullable=False, default=0)  # kg
+    naoh_usage = db.Column(db.Float, nullable=False, default=0)  # kg
+    polymer_usage = db.Column(db.Float, nullable=False, default=0)  # kg
+    clean_water_output = db.Column(db.Float, nullable=False, default=0)  # m3
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MonthlyWastewater(db.Model):
+    # tổng theo tháng của từng NMNT
+    __tablename__ = 'monthly_wastewater'
+    month = db.Column(db.Date, primary_key=True)
+    plant_number = db.Column(db.Integer, primary_key=True)
+    wastewater_meter = db.Column(db.Float, nullable=False, default=0)  # m3
+    input_flow_tqt = db.Column(db.Float, nullable=False, default=0)  # m3
+    output_flow_tqt = db.Column(db.Float, nullable=False, default=0)  # m3
+    sludge_output = db.Column(db.Float, nullable=False, default=0)  # m3
+    electricity = db.Column(db.Float, nullable=False, default=0)  # kWh
+    chemical_usage = db.Column(db.Float, nullable=False, default=0)  # kg
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MonthlyCustomerWastewater(db.Model):
+    # nước thải KH theo BB chốt với DN, tổng theo tháng
+    __tablename__ = 'monthly_customer_wastewater'
+    month = db.Column(db.Date, primary_key=True)
+    wastewater_reading = db.Column(db.Float, nullable=False, default=0)  # m3
+    wastewater_calculated = db.Column(db.Float, nullable=False, default=0)  # m3
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CustomerDailyConsumption(db.Model):
+    # tiêu thụ KH theo ngày (đã áp hệ số đồng hồ), dùng xếp hạng Top N - xem customer_ranking.py
+    __tablename__ = 'customer_daily_consumption'
+    date = db.Column(db.Date, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), primary_key=True)
+    clean_water = db.Column(db.Float, nullable=False, default=0)  # m3
+    wastewater = db.Column(db.Float, nullable=False, default=0)  # m3
+    __table_args__ = (
+        db.Index('ix_customer_daily_consumption_customer_date', 'customer_id', 'date'),
+    )
+
+class CustomerCycleConsumption(db.Model):
+    # tiêu thụ KH theo kỳ 26 -> 25 tháng sau
+    __tablename__ = 'customer_cycle_consumption'
+    cycle_start = db.Column(db.Date, primary_key=True)  # ngày 26
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), primary_key=True)
+    clean_water = db.Column(db.Float, nullable=False, default=0)  # m3
+    wastewater = db.Column(db.Float, nullable=False, default=0)  # m3
+    __table_args__ = (
+        db.Index('ix_customer_cycle_consumption_rank', 'cycle_start', 'clean_water'),
+    )
+
+class DataVersion(db.Model):
+    # phiên bản dữ liệu dùng chung giữa các tiến trình (1 dòng), cache trong bộ nhớ so khớp theo nó - xem data_version.py
+    __tablename__ = 'data_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # Define relationships
 Well.production = db.relationship('WellProduction', backref='well', lazy=True)
 Customer.readings = db.relationship('CustomerReading', backref='customer', lazy=True)
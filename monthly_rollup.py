@@ -0,0 +1,209 @@
+"""
+Bảng tổng theo tháng cho các báo cáo tháng: NMNS (monthly_clean_water), từng NMNT (monthly_wastewater)
+và nước thải KH theo BB chốt với DN (monthly_customer_wastewater).
+
+- Nhập liệu ngày n làm mới cả 3 bảng cho tháng chứa n (refresh_monthly_rollups_for_entry, không commit).
+- Báo cáo đọc các tháng trọn vẹn từ bảng tổng (tối đa 12 dòng/năm); đoạn lẻ ở 2 đầu dải (vd. tới end_dt
+  giữa tháng) vẫn cộng từ dữ liệu gốc nhưng chỉ trong phạm vi dưới 1 tháng.
+- monthly_clean_water có đủ 1 dòng/tháng cho mọi tháng đã làm mới (LEFT JOIN từ bảng lịch) nên dùng làm dấu
+  "đã tính": tháng chưa có dòng thì báo cáo cộng từ dữ liệu gốc nhưng không lưu (GET có thể chạy trên bản sao
+  chỉ đọc); ghi bảng tổng chỉ do nhập liệu / bulk ingest và `flask backfill-monthly-rollups`.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import func, select
+from app import db
+from models import CleanWaterPlant, WastewaterPlant, CustomerReading, \
+    MonthlyCleanWater, MonthlyWastewater, MonthlyCustomerWastewater
+from archive import entry_source
+from calendar_dim import calendar_table, clip_to_calendar, extend_calendar
+from db_compat import month_key
+
+logger = logging.getLogger(__name__)
+clean_table = MonthlyCleanWater.__table__
+wastewater_table = MonthlyWastewater.__table__
+customer_table = MonthlyCustomerWastewater.__table__
+BACKFILL_CHUNK_MONTHS = 12
+
+CLEAN_WATER_COLUMNS = ('electricity', 'pac_usage', 'naoh_usage', 'polymer_usage', 'clean_water_output')
+WASTEWATER_COLUMNS = ('wastewater_meter', 'input_flow_tqt', 'output_flow_tqt', 'sludge_output',
+                      'electricity', 'chemical_usage')
+CUSTOMER_COLUMNS = ('wastewater_reading', 'wastewater_calculated')
+
+
+def month_end(d: date) -> date:
+    return (d.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def _split_months(start_date: date, end_date: date) -> Tuple[List[date], List[Tuple[date, date]]]:
+    """Tách [start_date, end_date] thành các tháng trọn vẹn (ngày 01) và các đoạn ngày lẻ ở 2 đầu."""
+    months, partial = [], []
+    cur = start_date
+    while cur <= end_date:
+        last = min(month_end(cur), end_date)
+        if cur.day == 1 and last == month_end(cur):
+            months.append(cur)
+        else:
+            partial.append((cur, last))
+        cur = last + timedelta(days=1)
+    return months, partial
+
+
+def _sums(src, names):
+    return [func.coalesce(func.sum(getattr(src, n)), 0.0).label(n) for n in names]
+
+
+def clean_water_monthly_select(start_date: date, end_date: date):
+    """Tổng NMNS theo tháng trong [start_date, end_date], 1 dòng/tháng kể cả tháng chưa có dữ liệu."""
+    cal = calendar_table.c
+    cw = entry_source(CleanWaterPlant, start_date, end_date)
+    return (
+        select(cal.month_start.label('month'), *_sums(cw, CLEAN_WATER_COLUMNS))
+        .select_from(calendar_table.outerjoin(cw, cw.date == cal.date))
+        .where(cal.date >= start_date, cal.date <= end_date)
+        .group_by(cal.month_start)
+    )
+
+
+def wastewater_monthly_select(start_date: date, end_date: date, plant_number: Optional[int] = None):
+    """Tổng theo tháng và NMNT trong [start_date, end_date] (chỉ tháng có dữ liệu)."""
+    cal = calendar_table.c
+    ww = entry_source(WastewaterPlant, start_date, end_date)
+    plant_filter = [ww.plant_number == plant_number] if plant_number is not None else []
+    return (
+        select(cal.month_start.label('month'), ww.plant_number, *_sums(ww, WASTEWATER_COLUMNS))
+        .select_from(calendar_table.join(ww, ww.date == cal.date))
+        .where(cal.date >= start_date, cal.date <= end_date, *plant_filter)
+        .group_by(cal.month_start, ww.plant_number)
+    )
+
+
+def customer_wastewater_monthly_select(start_date: date, end_date: date):
+    """Nước thải KH (đọc số + tính theo hệ số) theo tháng trong [start_date, end_date]."""
+    cal = calendar_table.c
+    cr = entry_source(CustomerReading, start_date, end_date)
+    return (
+        select(cal.month_start.label('month'), *_sums(cr, CUSTOMER_COLUMNS))
+        .select_from(calendar_table.join(cr, cr.date == cal.date))
+        .where(cal.date >= start_date, cal.date <= end_date)
+        .group_by(cal.month_start)
+    )
+
+
+def refresh_monthly_rollups(start_date: date, end_date: date) -> int:
+    """Tính lại 3 bảng tổng cho các tháng chạm vào [start_date, end_date]. Không commit. Trả về số tháng."""
+    if start_date > end_date:
+        return 0
+    first, last = start_date.replace(day=1), month_end(end_date)
+    extend_calendar(first, last)
+    for table, compute, names in (
+        (clean_table, clean_water_monthly_select, ('month',) + CLEAN_WATER_COLUMNS),
+        (wastewater_table, wastewater_monthly_select, ('month', 'plant_number') + WASTEWATER_COLUMNS),
+        (customer_table, customer_wastewater_monthly_select, ('month',) + CUSTOMER_COLUMNS),
+    ):
+        db.session.execute(table.delete().where(table.c.month >= first, table.c.month <= last))
+        db.session.execute(table.insert().from_select(list(names), compute(first, last)))
+    return len(_split_months(first, last)[0])
+
+
+def refresh_monthly_rollups_for_entry(entry_date: date) -> int:
+    """Nhập liệu ngày n chỉ thay đổi tổng của tháng chứa n."""
+    return refresh_monthly_rollups(entry_date, entry_date)
+
+
+def _stored_months(months: List[date]) -> Set[date]:
+    """Các tháng trong `months` đã có trong bảng tổng."""
+    if not months:
+        return set()
+    return set(db.session.execute(
+        select(clean_table.c.month).where(clean_table.c.month.in_(months))
+    ).scalars())
+
+
+def _load_monthly(table, names, compute: Callable, start_date: date, end_date: date,
+                  *where) -> List:
+    months, partial = _split_months(start_date, end_date)
+    stored = _stored_months(months)
+    rows = []
+    if stored:
+        rows += db.session.execute(
+            select(table.c.month, *[table.c[n] for n in names]).where(table.c.month.in_(stored), *where)
+        ).all()
+    missing = [m for m in months if m not in stored]
+    if missing:
+        # chưa backfill: cộng từ dữ liệu gốc cho đoạn từ tháng thiếu đầu tiên tới tháng thiếu cuối cùng, không ghi
+        span = clip_to_calendar(missing[0], month_end(missing[-1]))
+        wanted = {month_key(m) for m in missing}
+        if span is not None:
+            rows += [r for r in db.session.execute(compute(*span)).all() if month_key(r.month) in wanted]
+    for a, b in partial:
+        span = clip_to_calendar(a, b)
+        if span is not None:
+            rows += db.session.execute(compute(*span)).all()
+    return rows
+
+
+def _as_dict(row, names) -> Dict[str, float]:
+    return {n: float(getattr(row, n) or 0) for n in names}
+
+
+def monthly_clean_water(start_date: date, end_date: date) -> Dict[Tuple[int, int], Dict[str, float]]:
+    """{(năm, tháng): {electricity, pac_usage, naoh_usage, polymer_usage, clean_water_output}} trong dải."""
+    rows = _load_monthly(clean_table, CLEAN_WATER_COLUMNS, clean_water_monthly_select, start_date, end_date)
+    return {month_key(r.month): _as_dict(r, CLEAN_WATER_COLUMNS) for r in rows}
+
+
+def monthly_wastewater(start_date: date, end_date: date,
+                       plant_number: int) -> Dict[Tuple[int, int], Dict[str, float]]:
+    """{(năm, tháng): {wastewater_meter, input_flow_tqt, ...}} của NMNT plant_number trong dải."""
+    rows = _load_monthly(
+        wastewater_table, WASTEWATER_COLUMNS,
+        lambda a, b: wastewater_monthly_select(a, b, plant_number),
+        start_date, end_date, wastewater_table.c.plant_number == plant_number
+    )
+    return {month_key(r.month): _as_dict(r, WASTEWATER_COLUMNS) for r in rows}
+
+
+def monthly_customer_wastewater(start_date: date, end_date: date) -> Dict[Tuple[int, int], float]:
+    """{(năm, tháng): nước thải theo BB chốt với DN = đọc số + tính theo hệ số} trong dải."""
+    rows = _load_monthly(customer_table, CUSTOMER_COLUMNS, customer_wastewater_monthly_select,
+                         start_date, end_date)
+    return {month_key(r.month): float((r.wastewater_reading or 0) + (r.wastewater_calculated or 0))
+            for r in rows}
+
+
+def _raw_month_bounds():
+    bounds = []
+    for col in (CleanWaterPlant.date, WastewaterPlant.date, CustomerReading.date):
+        lo, hi = db.session.query(func.min(col), func.max(col)).one()
+        if lo and hi:
+            bounds.append((lo, hi))
+    if not bounds:
+        return None, None
+    return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+
+def backfill_monthly_rollups(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                             chunk_months: int = BACKFILL_CHUNK_MONTHS) -> int:
+    """Dựng lại 3 bảng tổng theo tháng, commit sau mỗi khối tháng. Trả về số tháng đã ghi."""
+    lo, hi = _raw_month_bounds()
+    start_date = start_date or lo
+    end_date = end_date or hi
+    if not start_date or not end_date:
+        return 0
+
+    total = 0
+    cur = start_date.replace(day=1)
+    while cur <= end_date:
+        chunk_end = cur
+        for _ in range(chunk_months - 1):
+            nxt = month_end(chunk_end) + timedelta(days=1)
+            if nxt > end_date:
+                break
+            chunk_end = nxt
+        total += refresh_monthly_rollups(cur, chunk_end)
+        db.session.commit()
+        logger.info("monthly rollups: rebuilt %s -> %s", cur, month_end(chunk_end))
+        cur = month_end(chunk_end) + timedelta(days=1)
+    return total
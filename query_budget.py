@@ -0,0 +1,106 @@
+"""
+Đếm câu SQL theo request để bắt truy vấn lặp theo từng dòng (N+1).
+
+Bật bằng QUERY_BUDGET_MODE=warn (ghi log) hoặc raise (ném QueryBudgetExceeded, dùng khi test/phát triển);
+mặc định off thì không gắn listener nào.
+- Route khai báo ngân sách bằng @query_budget(max_queries, max_repeats): tổng số câu SQL trong view và
+  số lần lặp tối đa của cùng một dạng câu SELECT (cùng SQL, khác tham số) - dấu hiệu N+1.
+- Mọi request: header X-Query-Count, log cảnh báo khi một dạng câu lặp >= QUERY_REPEAT_WARN lần.
+"""
+import functools
+import logging
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(statement: str) -> str:
+    """Dạng câu SQL: gộp khoảng trắng, danh sách tham số (?, ?, ...) dài bao nhiêu cũng coi như một."""
+    return _IN_LIST.sub('(?...)', _SPACES.sub(' ', statement).strip())
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.setdefault('sql_statements', []).append(statement)
+
+
+def _statements() -> List[str]:
+    return g.get('sql_statements', [])
+
+
+def top_shapes(statements: List[str], limit: int = 3, selects_only: bool = False) -> List[Tuple[str, int]]:
+    shapes = (statement_shape(s) for s in statements)
+    if selects_only:
+        shapes = (s for s in shapes if s.upper().startswith(('SELECT', 'WITH')))
+    return Counter(shapes).most_common(limit)
+
+
+def _format_shapes(shapes) -> str:
+    return '; '.join(f'{n}x {shape[:160]}' for shape, n in shapes)
+
+
+def query_budget(max_queries: Optional[int] = None, max_repeats: Optional[int] = None):
+    """
+    Ngân sách SQL của view: tối đa max_queries câu, một dạng câu SELECT lặp tối đa max_repeats lần
+    (None = không giới hạn).
+    Đặt sát hàm view (dưới @login_required / @retry_on_locked) để chỉ đếm thân view.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if app.config['QUERY_BUDGET_MODE'] == 'off':
+                return fn(*args, **kwargs)
+            start = len(_statements())
+            result = fn(*args, **kwargs)
+            _check(request.endpoint, _statements()[start:], max_queries, max_repeats)
+            return result
+        wrapper.query_budget = (max_queries, max_repeats)
+        return wrapper
+    return decorator
+
+
+def _check(endpoint: str, statements: List[str], max_queries: Optional[int], max_repeats: Optional[int]) -> None:
+    problems = []
+    if max_queries is not None and len(statements) > max_queries:
+        problems.append(f'{len(statements)} câu SQL > ngân sách {max_queries}')
+    repeated = top_shapes(statements, 1, selects_only=True)
+    if max_repeats is not None and repeated and repeated[0][1] > max_repeats:
+        problems.append(f'một câu SELECT lặp {repeated[0][1]} lần > {max_repeats}')
+    if not problems:
+        return
+    message = f'{endpoint}: {", ".join(problems)} | {_format_shapes(top_shapes(statements))}'
+    if app.config['QUERY_BUDGET_MODE'] == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning("query budget: %s", message)
+
+
+def _report_request(response):
+    statements = _statements()
+    response.headers['X-Query-Count'] = str(len(statements))
+    shapes = top_shapes(statements, 1)
+    if shapes and shapes[0][1] >= app.config['QUERY_REPEAT_WARN']:
+        logger.warning("query budget: %s lặp %s", request.endpoint, _format_shapes(shapes))
+    return response
+
+
+def install_query_counter() -> bool:
+    """Gắn listener đếm câu SQL cho mọi engine (CSDL chính và bản sao). Trả về True nếu đã bật."""
+    if app.config['QUERY_BUDGET_MODE'] == 'off':
+        return False
+    for engine in db.engines.values():
+        event.listen(engine, 'before_cursor_execute', _record)
+    app.after_request(_report_request)
+    logger.info("query budget: mode=%s", app.config['QUERY_BUDGET_MODE'])
+    return True
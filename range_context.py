@@ -0,0 +1,60 @@
+from datetime import date
+from typing import List, Optional, Tuple
+from clean_water_series import date_range
+from customer_ranking import TOP_CUSTOMERS, top_customer_ids, customer_daily_series
+from daily_facts import daily_fact_series
+
+
+class RangeContext:
+    """
+    Dữ liệu dùng chung trong 1 request theo dải ngày [start_date, end_date].
+    daily_facts chỉ đọc 1 lần khi cần lần đầu, tiêu thụ KH lấy từ bảng xếp hạng;
+    các series là list float theo self.dates, không dựng payload Chart.js.
+    """
+
+    def __init__(self, start_date: date, end_date: date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.dates = date_range(start_date, end_date)
+        self._facts = None
+
+    # --- daily_facts ---
+    @property
+    def facts(self):
+        if self._facts is None:
+            self._facts = daily_fact_series(self.start_date, self.end_date)
+        return self._facts
+
+    def _fact_series(self, column: str, clamp: bool = False) -> List[float]:
+        values = [float(getattr(f, column) or 0) for f in self.facts]
+        return [max(v, 0.0) for v in values] if clamp else values
+
+    def well_series(self) -> List[float]:
+        return self._fact_series('well_delta', clamp=True)
+
+    def clean_water_series(self) -> List[float]:
+        # sản lượng nước sạch 0.97 * (giếng - Jasan), không tính tồn bể
+        return self._fact_series('clean_water_production', clamp=True)
+
+    def clean_water_supplied_series(self) -> List[float]:
+        return self._fact_series('clean_water_supplied', clamp=True)
+
+    def wastewater_series(self) -> List[float]:
+        return self._fact_series('wastewater_input')
+
+    def chemical_series(self) -> List[float]:
+        return self._fact_series('chemical_usage')
+
+    def sludge_series(self) -> List[float]:
+        return self._fact_series('sludge_output')
+
+    # --- tiêu thụ KH đọc số hằng ngày (bảng xếp hạng, xem customer_ranking.py) ---
+    def top_customer_ids(self, limit: int = TOP_CUSTOMERS) -> List[int]:
+        return top_customer_ids(self.start_date, self.end_date, limit)
+
+    def customer_series(self, customer_ids: Optional[List[int]] = None) -> Tuple[List[float], List[float]]:
+        """(nước sạch, nước thải) cộng theo ngày cho customer_ids (mặc định Top 4)."""
+        if customer_ids is None:
+            customer_ids = self.top_customer_ids()
+        rows = customer_daily_series(self.start_date, self.end_date, customer_ids)
+        return [float(r[1]) for r in rows], [float(r[2]) for r in rows]
@@ -0,0 +1,140 @@
+"""
+Định tuyến đọc sang CSDL bản sao (bind 'replica', DATABASE_REPLICA_URL) cho biểu đồ, lịch sử, báo cáo.
+
+- Blueprint gọi use_read_replica(bp): mỗi request của blueprint đọc từ bản sao nếu bản sao đủ mới.
+- Mọi câu ghi (flush, INSERT/UPDATE/DELETE) luôn về CSDL chính; request đã ghi thì đọc tiếp từ CSDL chính.
+- Nhập liệu gọi note_primary_write() sau commit: trong cửa sổ trễ của bản sao, request đọc quay về CSDL chính
+  để không thấy (và không cache) số liệu cũ.
+"""
+import logging
+import threading
+import time
+from datetime import date
+from typing import Optional
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from flask_login import current_user
+from sqlalchemy import text
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+_FENCE_KEY = 'replica_fence'
+
+_last_write = {'at': 0.0, 'date': None}
+_lag = {'value': None, 'ok': True, 'checked_at': 0.0}
+_state_lock = threading.Lock()
+
+# lag (giây) của bản sao PostgreSQL; 0 nếu đã phát lại hết WAL đã nhận, NULL nếu không phải bản sao
+_PG_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class RoutingSession(Session):
+    """Session của db: đọc từ bản sao khi request đã bật g.use_replica, ghi luôn về CSDL chính."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _replica_requested():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.use_replica = False
+            else:
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_requested() -> bool:
+    return has_app_context() and g.get('use_replica', False)
+
+
+def replica_engine():
+    return current_app.extensions['sqlalchemy'].engines.get(REPLICA_BIND)
+
+
+def _measure_lag(engine) -> Optional[float]:
+    with engine.connect() as conn:
+        if engine.dialect.name != 'postgresql':
+            conn.execute(text('SELECT 1'))
+            return None
+        value = conn.execute(_PG_LAG_SQL).scalar()
+    return None if value is None else float(value)
+
+
+def replica_lag_seconds():
+    """
+    (lag giây hoặc None nếu không đo được, bản sao kết nối được?); kết quả giữ REPLICA_LAG_CHECK_SECONDS.
+    """
+    interval = current_app.config['REPLICA_LAG_CHECK_SECONDS']
+    with _state_lock:
+        if _lag['checked_at'] and time.monotonic() - _lag['checked_at'] <= interval:
+            return _lag['value'], _lag['ok']
+    try:
+        value, ok = _measure_lag(replica_engine()), True
+    except Exception as e:
+        logger.warning("read replica: lag check failed: %s", e)
+        value, ok = None, False
+    with _state_lock:
+        _lag.update(value=value, ok=ok, checked_at=time.monotonic())
+    return value, ok
+
+
+def note_primary_write(entry_date: Optional[date] = None) -> None:
+    """Gọi sau commit nhập liệu: ghi mốc thời gian cho tiến trình và cho phiên đăng nhập của người nhập."""
+    now = time.time()
+    with _state_lock:
+        _last_write.update(at=now, date=entry_date)
+    # máy gửi bằng khóa API (/api/ingest) không có phiên đăng nhập: không tạo cookie phiên cho nó
+    if has_request_context() and replica_engine() is not None and current_user.is_authenticated:
+        session[_FENCE_KEY] = now
+
+
+def replica_is_fresh() -> bool:
+    """Bản sao dùng được: kết nối được, lag <= REPLICA_MAX_LAG_SECONDS và đã kịp nhận lần ghi gần nhất."""
+    cfg = current_app.config
+    lag, ok = replica_lag_seconds()
+    if not ok:
+        return False
+    if lag is None:
+        window = cfg['REPLICA_ASSUMED_LAG_SECONDS']
+    elif lag > cfg['REPLICA_MAX_LAG_SECONDS']:
+        return False
+    else:
+        window = lag + cfg['REPLICA_LAG_CHECK_SECONDS']
+    with _state_lock:
+        last_write = _last_write['at']
+    if has_request_context():
+        last_write = max(last_write, session.get(_FENCE_KEY, 0.0))
+    return time.time() - last_write > window
+
+
+def _route_request_to_replica():
+    if replica_engine() is not None and replica_is_fresh():
+        g.use_replica = True
+
+
+def use_read_replica(bp):
+    """Các request của blueprint đọc từ bản sao (nếu có cấu hình và đủ mới)."""
+    bp.before_request(_route_request_to_replica)
+    return bp
+
+
+def replica_status() -> dict:
+    engine = replica_engine()
+    if engine is None:
+        return {'configured': False}
+    lag, ok = replica_lag_seconds()
+    with _state_lock:
+        last = dict(_last_write)
+    return {
+        'configured': True,
+        'reachable': ok,
+        'lag_seconds': lag,
+        'fresh': replica_is_fresh(),
+        'last_write_date': last['date'].isoformat() if last['date'] else None,
+        'seconds_since_last_write': round(time.time() - last['at'], 1) if last['at'] else None,
+    }
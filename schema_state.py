@@ -0,0 +1,63 @@
+"""
+Trạng thái lược đồ lúc khởi động: app.py chỉ tự tạo bảng (db.create_all) / điền lịch / sinh dữ liệu mẫu khi CSDL
+chưa do Alembic quản lý hoặc đã ở revision head. CSDL có alembic_version nhưng còn revision chưa chạy thì để
+`flask db upgrade` làm, nếu không create_all sẽ tạo trước bảng mới và migration lỗi "table already exists".
+"""
+import logging
+import os
+import sys
+from typing import Optional, Set
+from sqlalchemy import inspect, text
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+# tùy chọn của lệnh `flask` có kèm giá trị (flask --app main db upgrade)
+_FLASK_VALUE_OPTIONS = {'--app', '-A', '--env-file', '-e'}
+
+
+def running_db_cli(argv=None) -> bool:
+    """True nếu tiến trình đang chạy `flask ... db <lệnh>` (Flask-Migrate)."""
+    argv = sys.argv if argv is None else argv
+    # `flask ...` hoặc `python -m flask ...` (argv[0] = .../flask/__main__.py)
+    if not argv or 'flask' not in (os.path.basename(argv[0]), os.path.basename(os.path.dirname(argv[0]))):
+        return False
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in _FLASK_VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg == 'db'
+    return False
+
+
+def _migration_heads() -> Set[str]:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+    config = Config()
+    config.set_main_option('script_location', os.path.join(app.root_path, 'migrations'))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def pending_migrations() -> Optional[Set[str]]:
+    """
+    None nếu CSDL chưa có bảng alembic_version (tạo mới bằng create_all); ngược lại là tập head còn thiếu
+    (rỗng = đã cập nhật).
+    """
+    if not inspect(db.engine).has_table('alembic_version'):
+        return None
+    with db.engine.connect() as conn:
+        current = set(conn.execute(text('SELECT version_num FROM alembic_version')).scalars())
+    return _migration_heads() - current
+
+
+def schema_ready() -> bool:
+    """Có được tạo bảng / ghi dữ liệu khởi động không (xem docstring module)."""
+    if running_db_cli():
+        return False
+    missing = pending_migrations()
+    if missing:
+        logger.error('CSDL chưa nâng cấp lên revision %s: chạy `flask db upgrade` trước khi khởi động',
+                     ', '.join(sorted(missing)))
+        return False
+    return True
@@ -0,0 +1,195 @@
+"""
+Nhật ký câu SQL chậm: câu chạy lâu hơn SLOW_QUERY_MS được ghi (JSON mỗi dòng) vào file xoay vòng
+SLOW_QUERY_LOG_FILE kèm endpoint, tham số và kế hoạch thực thi
+(SQLite: EXPLAIN QUERY PLAN, PostgreSQL: EXPLAIN). Trang /admin/slow-queries gộp theo dạng câu.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from flask import has_request_context, request
+from sqlalchemy import event
+from app import app, db
+from query_budget import statement_shape
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('slow_query')
+
+_START_KEY = 'slow_query_start'
+_EXPLAIN_KEY = 'slow_query_explaining'
+_PARAM_MAX_CHARS = 500
+# dấu hiệu quét toàn bảng trong kế hoạch thực thi
+FULL_SCAN_MARKERS = ('SCAN ', 'Seq Scan')
+_write_lock = threading.Lock()
+
+
+def slow_query_log_path() -> str:
+    return app.config['SLOW_QUERY_LOG_FILE'] or os.path.join(app.instance_path, 'slow_queries.log')
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000.0
+    if elapsed_ms < app.config['SLOW_QUERY_MS'] or conn.info.get(_EXPLAIN_KEY):
+        return
+    try:
+        _write_entry(conn, statement, parameters, executemany, elapsed_ms)
+    except Exception:
+        logger.exception("slow query log: failed to record statement")
+
+
+def _on_error(context):
+    starts = context.connection.info.get(_START_KEY) if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def _endpoint() -> str:
+    if has_request_context():
+        return request.endpoint or request.path
+    return f'({threading.current_thread().name})'
+
+
+def _format_params(parameters, executemany: bool) -> str:
+    if executemany:
+        return f'executemany x{len(parameters)}: {parameters[0]!r}'[:_PARAM_MAX_CHARS] if parameters else ''
+    return repr(parameters)[:_PARAM_MAX_CHARS]
+
+
+def explain(conn, statement: str, parameters) -> Optional[str]:
+    """Kế hoạch thực thi của câu vừa chạy, trên cùng kết nối (không đi qua event). None nếu không lấy được."""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        sql = 'EXPLAIN QUERY PLAN ' + statement
+    elif dialect == 'postgresql':
+        sql = 'EXPLAIN ' + statement
+    else:
+        return None
+    cursor = conn.connection.cursor()
+    conn.info[_EXPLAIN_KEY] = True
+    try:
+        if dialect == 'postgresql':
+            # EXPLAIN lỗi không được làm hỏng transaction đang mở
+            cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(sql, parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return '\n'.join(r[0] for r in rows)
+        cursor.execute(sql, parameters)
+        return '\n'.join(r[-1] for r in cursor.fetchall())
+    except Exception as e:
+        return f'(EXPLAIN lỗi: {str(e).splitlines()[0]})'
+    finally:
+        conn.info.pop(_EXPLAIN_KEY, None)
+        cursor.close()
+
+
+def _write_entry(conn, statement, parameters, executemany, elapsed_ms) -> None:
+    plan = None
+    if app.config['SLOW_QUERY_EXPLAIN'] and not executemany:
+        plan = explain(conn, statement, parameters)
+    entry = {
+        'at': datetime.now().isoformat(timespec='seconds'),
+        'ms': round(elapsed_ms, 1),
+        'endpoint': _endpoint(),
+        'fingerprint': statement_shape(statement),
+        'statement': statement,
+        'params': _format_params(parameters, executemany),
+        'plan': plan,
+    }
+    with _write_lock:
+        slow_logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+def install_slow_query_log() -> bool:
+    """Gắn event đo thời gian cho mọi engine và mở file log xoay vòng. SLOW_QUERY_MS <= 0 thì tắt."""
+    if app.config['SLOW_QUERY_MS'] <= 0:
+        return False
+    path = slow_query_log_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                                  backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_logger.handlers = [handler]
+    slow_logger.setLevel(logging.INFO)
+    slow_logger.propagate = False
+    for engine in db.engines.values():
+        event.listen(engine, 'before_cursor_execute', _before)
+        event.listen(engine, 'after_cursor_execute', _after)
+        event.listen(engine, 'handle_error', _on_error)
+    logger.info("slow query log: >= %s ms -> %s", app.config['SLOW_QUERY_MS'], path)
+    return True
+
+
+def _log_files() -> List[str]:
+    """File log từ cũ tới mới: .N ... .1 rồi file hiện tại."""
+    path = slow_query_log_path()
+    rotated = [f for f in glob.glob(path + '.*') if f.rsplit('.', 1)[-1].isdigit()]
+    rotated.sort(key=lambda f: int(f.rsplit('.', 1)[-1]), reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def read_entries() -> List[Dict[str, Any]]:
+    """Đọc file log hiện tại và các file đã xoay vòng (.1, .2, ...), bỏ qua dòng hỏng."""
+    entries = []
+    for file in _log_files():
+        with open(file, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return entries
+
+
+def has_full_scan(plan: Optional[str]) -> bool:
+    return bool(plan) and any(m in plan for m in FULL_SCAN_MARKERS)
+
+
+def aggregate_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Gộp theo dạng câu: số lần, tổng/trung bình/max ms, endpoint, mẫu câu chậm nhất. Sắp theo tổng ms giảm dần."""
+    groups = defaultdict(list)
+    for e in entries:
+        groups[e.get('fingerprint') or e.get('statement', '')].append(e)
+    result = []
+    for fingerprint, items in groups.items():
+        slowest = max(items, key=lambda e: e.get('ms', 0))
+        total = sum(e.get('ms', 0) for e in items)
+        result.append({
+            'fingerprint': fingerprint,
+            'count': len(items),
+            'total_ms': round(total, 1),
+            'avg_ms': round(total / len(items), 1),
+            'max_ms': slowest.get('ms', 0),
+            'last_at': max(e.get('at', '') for e in items),
+            'endpoints': sorted({e.get('endpoint', '') for e in items}),
+            'params': slowest.get('params'),
+            'plan': slowest.get('plan'),
+            'full_scan': has_full_scan(slowest.get('plan')),
+        })
+    result.sort(key=lambda r: r['total_ms'], reverse=True)
+    return result
+
+
+def clear_slow_query_log() -> None:
+    """Xóa file log hiện tại và các file đã xoay vòng; handler tự mở lại file ở lần ghi sau."""
+    with _write_lock:
+        for handler in slow_logger.handlers:
+            handler.close()
+        for file in _log_files():
+            os.remove(file)
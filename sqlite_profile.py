@@ -0,0 +1,77 @@
+import functools
+import logging
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERROR_MARKERS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def _pragmas() -> list:
+    cfg = app.config
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA cache_size=-{int(cfg['SQLITE_CACHE_SIZE_KB'])}",  # số âm = KiB
+        f"PRAGMA mmap_size={int(cfg['SQLITE_MMAP_SIZE_BYTES'])}",
+        'PRAGMA temp_store=MEMORY',
+        f"PRAGMA busy_timeout={int(cfg['SQLITE_BUSY_TIMEOUT_MS'])}",
+        'PRAGMA foreign_keys=ON' if cfg['SQLITE_FOREIGN_KEYS'] else 'PRAGMA foreign_keys=OFF',
+    ]
+
+
+def apply_sqlite_profile(engine) -> bool:
+    """
+    Gắn PRAGMA cho mọi kết nối SQLite mới của engine (WAL: đọc không chặn ghi).
+    Bỏ qua nếu không phải SQLite, DB trong bộ nhớ hoặc SQLITE_TUNING=0. Trả về True nếu đã gắn.
+    """
+    if engine.dialect.name != 'sqlite' or not app.config['SQLITE_TUNING']:
+        return False
+    if engine.url.database in (None, '', ':memory:'):
+        return False
+    pragmas = _pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    logger.info("SQLite profile: %s", '; '.join(pragmas))
+    return True
+
+
+def is_database_locked(exc: BaseException) -> bool:
+    if not isinstance(exc, OperationalError):
+        return False
+    msg = str(getattr(exc, 'orig', exc)).lower()
+    return any(m in msg for m in LOCK_ERROR_MARKERS)
+
+
+def retry_on_locked(fn):
+    """
+    Chạy lại cả hàm khi SQLite báo khóa (sau busy_timeout vẫn chưa lấy được khóa ghi).
+    Hàm phải tự làm lại toàn bộ thay đổi trong session và để lỗi khóa lan ra ngoài.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        retries = app.config['SQLITE_LOCK_RETRIES']
+        delay = app.config['SQLITE_LOCK_RETRY_DELAY_MS'] / 1000.0
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if not is_database_locked(e) or attempt >= retries:
+                    raise
+                attempt += 1
+                logger.warning("%s: database locked, retry %d/%d", fn.__name__, attempt, retries)
+                time.sleep(delay * (2 ** (attempt - 1)))
+    return wrapper
@@ -7,8 +7,36 @@ function disableInputs(form, selectors = []) {
     });
 }
 
+// Trạng thái đã có/còn sửa được của cả 5 bảng nhập liệu theo ngày: 1 request/ngày cho mọi tab
+// (thay cho 5 API */exists). Cache promise theo ngày trong phiên trang; trang tải lại sau khi lưu.
+const entryStatusCache = new Map();
+
+function fetchEntryStatus(dateVal) {
+    if (!entryStatusCache.has(dateVal)) {
+        const url = `${window.DATA_ENTRY_CONFIG.entryStatusApi}?date=${encodeURIComponent(dateVal)}`;
+        const pending = fetch(url, { credentials: "same-origin" })
+            .then((res) => {
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                return res.json();
+            })
+            .catch((err) => {
+                entryStatusCache.delete(dateVal);
+                throw err;
+            });
+        entryStatusCache.set(dateVal, pending);
+    }
+    return entryStatusCache.get(dateVal);
+}
+
 document.addEventListener("DOMContentLoaded", function () {
 
+    // Tải sẵn trạng thái ngày khi đổi ngày ở bất kỳ form nhập liệu nào
+    document.querySelectorAll('.tab-content input[name="date"]').forEach((inp) => {
+        inp.addEventListener("change", () => {
+            if (inp.value) fetchEntryStatus(inp.value).catch(() => {});
+        });
+    });
+
     // Tắt auto scroll restore của trình duyệt
     if ("scrollRestoration" in history) history.scrollRestoration = "manual";
 
@@ -102,11 +130,8 @@ document.addEventListener("DOMContentLoaded", function () {
         }
 
         try {
-            // Gọi API kiểm tra tồn tại theo ngày
-            const url = `${window.DATA_ENTRY_CONFIG.cleanWaterExists
-                }?date=${encodeURIComponent(dateVal)}`;
-            const res = await fetch(url, { credentials: "same-origin" });
-            const data = await res.json();
+            // Trạng thái theo ngày (dùng chung cho mọi tab)
+            const data = (await fetchEntryStatus(dateVal)).clean_water_plant;
 
             if (data.exists === true) {
                 const isLocked = data.locked === true || data.editable === false;
@@ -178,15 +203,9 @@ document.addEventListener("DOMContentLoaded", function () {
                 return;
             }
 
-            // Gọi API kiểm tra chỉ với các giếng đã nhập
-            const idsParam = filled.map((f) => f.id).join(",");
+            // Trạng thái theo ngày (dùng chung cho mọi tab); chỉ xét các giếng đã nhập
             try {
-                const url = `${window.DATA_ENTRY_CONFIG.wellProductionExists
-                    }?date=${encodeURIComponent(dateVal)}&well_ids=${encodeURIComponent(
-                        idsParam
-                    )}`;
-                const res = await fetch(url, { credentials: "same-origin" });
-                const data = await res.json();
+                const data = (await fetchEntryStatus(dateVal)).well_production;
 
                 // if (data.exists && Array.isArray(data.wells) && data.wells.length) {
                 //     // Lấy danh sách giếng đã nhập và đã có dữ liệu -> sẽ ghi đè
@@ -224,8 +243,9 @@ document.addEventListener("DOMContentLoaded", function () {
                 //     });
                 //     if (!ok) return;
                 // }
-                const editable = Array.isArray(data.editable_ids) ? data.editable_ids.map(Number) : [];
-                const locked   = Array.isArray(data.locked_ids)   ? data.locked_ids.map(Number)   : [];
+                const filledIds = new Set(filled.map((f) => f.id));
+                const editable = (Array.isArray(data.editable_ids) ? data.editable_ids.map(Number) : []).filter((id) => filledIds.has(id));
+                const locked   = (Array.isArray(data.locked_ids)   ? data.locked_ids.map(Number)   : []).filter((id) => filledIds.has(id));
 
                 if (locked.length) {
                     // Chặn và có thể disable input của các giếng bị khóa
@@ -312,10 +332,7 @@ async function attachWastewaterFormHandler(formId, overwriteId, plantNumber) {
         }
 
         try {
-            const url = `${window.DATA_ENTRY_CONFIG.wastewaterExists
-                }?date=${encodeURIComponent(dateVal)}&plant_numbers=${plantNumber}`;
-            const res = await fetch(url, { credentials: "same-origin" });
-            const data = await res.json();
+            const data = (await fetchEntryStatus(dateVal)).wastewater_plant;
 
             // if (
             //     data.exists &&
@@ -423,12 +440,7 @@ document.addEventListener("DOMContentLoaded", function () {
         }
 
         try {
-            const url = `${window.DATA_ENTRY_CONFIG.customerReadingsExists
-                }?date=${encodeURIComponent(dateVal)}&customer_ids=${encodeURIComponent(
-                    filled.map((x) => x.id).join(",")
-                )}`;
-            const res = await fetch(url, { credentials: "same-origin" });
-            const data = await res.json();
+            const data = (await fetchEntryStatus(dateVal)).customer_reading;
 
             const editable = new Set((Array.isArray(data.editable_ids) ? data.editable_ids : []).map(Number));
             const locked = new Set((Array.isArray(data.locked_ids) ? data.locked_ids : []).map(Number));
@@ -517,13 +529,7 @@ document.addEventListener("DOMContentLoaded", function () {
         }
 
         try {
-            const idsParam = entries.map((x) => x.id).join(",");
-            const url = `${window.DATA_ENTRY_CONFIG.tankLevelExists
-                }?date=${encodeURIComponent(dateVal)}&tank_ids=${encodeURIComponent(
-                    idsParam
-                )}`;
-            const res = await fetch(url, { credentials: "same-origin" });
-            const data = await res.json();
+            const data = (await fetchEntryStatus(dateVal)).water_tank_level;
             const editable = new Set((Array.isArray(data.editable_ids) ? data.editable_ids : []).map(Number));
             const locked = new Set((Array.isArray(data.locked_ids) ? data.locked_ids : []).map(Number));
 
@@ -0,0 +1,106 @@
+"""
+Cấu hình chung cho pytest: app chạy trên file SQLite tạm (không đụng water_management.db, không sinh dữ liệu mẫu).
+Biến môi trường phải đặt trước khi import app vì app.py đọc cấu hình lúc import.
+"""
+import os
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix='water-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'test.db')
+os.environ['GENERATE_SAMPLE_DATA'] = '0'
+os.environ['SLOW_QUERY_MS'] = '0'
+os.environ['QUERY_BUDGET_MODE'] = 'raise'  # route vượt @query_budget -> QueryBudgetExceeded
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+import main  # noqa: E402,F401  (nạp app + routes trước các module khác, tránh import vòng)
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+from app import app, db  # noqa: E402
+
+app.config['TESTING'] = True  # lỗi trong view (kể cả QueryBudgetExceeded) ném ra test thay vì trả 500
+TEST_PASSWORD = 'test-password'
+
+
+@pytest.fixture
+def session():
+    """db.session trong app context; mọi thay đổi của test được rollback."""
+    from calendar_dim import _coverage
+    with app.app_context():
+        try:
+            yield db.session
+        finally:
+            db.session.rollback()
+            db.session.remove()
+            _coverage.update(first=None, last=None)
+
+
+@pytest.fixture
+def statements(session):
+    """Loại câu SQL (SELECT/INSERT/...) chạy trong test."""
+    seen = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement.lstrip().split()[0].upper())
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+
+
+def _clear_process_state():
+    from archive import reset_archive_registry
+    from calendar_dim import _coverage
+    from chart_cache import chart_cache
+    from kpi_snapshot import clear_kpi_cache
+    chart_cache.clear()
+    clear_kpi_cache()
+    reset_archive_registry()
+    _coverage.update(first=None, last=None)
+
+
+@pytest.fixture
+def clean_db():
+    """
+    Cho test ghi qua route / hàm có commit (backfill, lưu trữ, nạp hàng loạt): sau test xóa mọi dòng
+    (trừ bảng lịch) và các cache trong tiến trình. Đặt trước `session` trong tham số để dọn sau cùng.
+    """
+    _clear_process_state()
+    try:
+        yield
+    finally:
+        with app.app_context():
+            db.session.rollback()
+            for table in reversed(db.metadata.sorted_tables):
+                if table.name != 'calendar_day':
+                    db.session.execute(table.delete())
+            db.session.commit()
+            db.session.remove()
+        _clear_process_state()
+
+
+@pytest.fixture
+def user(clean_db):
+    """id của user admin đã commit (mật khẩu TEST_PASSWORD)."""
+    from models import User, UserRole
+    with app.app_context():
+        u = User(username='tester', email='tester@example.com', role=UserRole.ADMIN,
+                 password_hash=generate_password_hash(TEST_PASSWORD))
+        db.session.add(u)
+        db.session.commit()
+        user_id = u.id
+        db.session.remove()
+    return user_id
+
+
+@pytest.fixture
+def client(user):
+    """Test client đã đăng nhập bằng `user`. Không giữ app context: mỗi request có g / db.session riêng."""
+    c = app.test_client()
+    resp = c.post('/login', data={'username': 'tester', 'password': TEST_PASSWORD})
+    assert resp.status_code == 302
+    return c
@@ -0,0 +1,58 @@
+"""Lưu trữ / khôi phục 1 năm (archive.py): entry_source đọc được cả bảng nóng lẫn bảng lưu trữ."""
+from datetime import date
+import pytest
+from sqlalchemy import inspect
+from app import db
+from archive import ARCHIVED_MODELS, archive_table_name, archive_year, archived_years, entry_source, restore_year
+from models import Customer, CustomerReading, Well, WellProduction, ArchivedYear
+
+YEAR = 2016
+
+
+def _seed(session):
+    well = Well(code='A1', name='Giếng lưu trữ')
+    customer = Customer(company_name='KH lưu trữ', water_ratio=0.5)
+    session.add_all([well, customer])
+    session.flush()
+    for d, v in ((date(YEAR - 1, 12, 31), 10.0), (date(YEAR, 1, 1), 11.0), (date(YEAR, 12, 31), 12.0),
+                 (date(YEAR + 1, 1, 1), 13.0)):
+        session.add(WellProduction(well_id=well.id, date=d, production=v))
+        session.add(CustomerReading(customer_id=customer.id, date=d, clean_water_reading=v * 10))
+    session.commit()
+
+
+def _read(model, start, end, value_col):
+    src = entry_source(model, start, end)
+    return db.session.query(src.date, getattr(src, value_col)).filter(
+        src.date >= start, src.date <= end
+    ).order_by(src.date).all()
+
+
+@pytest.mark.parametrize('model, value_col', [(WellProduction, 'production'),
+                                              (CustomerReading, 'clean_water_reading')])
+def test_archive_restore_round_trip(clean_db, session, model, value_col):
+    _seed(session)
+    span = (date(YEAR - 1, 12, 1), date(YEAR + 1, 1, 31))
+    before = _read(model, *span, value_col)
+    assert len(before) == 4
+
+    moved = archive_year(YEAR, force=True)
+    assert moved[model.__tablename__] == 2
+    assert archived_years(model) == [YEAR]
+    assert session.query(model).filter(model.date.between(date(YEAR, 1, 1), date(YEAR, 12, 31))).count() == 0
+    assert entry_source(model, date(YEAR + 1, 1, 1), date(YEAR + 1, 12, 31)) is model  # không chạm năm lưu trữ
+    assert _read(model, *span, value_col) == before
+
+    restored = restore_year(YEAR)
+    assert restored[model.__tablename__] == 2
+    assert archived_years(model) == []
+    assert session.query(ArchivedYear).count() == 0
+    assert not inspect(db.engine).has_table(archive_table_name(model, YEAR))
+    assert entry_source(model, *span) is model
+    assert _read(model, *span, value_col) == before
+
+
+def test_current_year_cannot_be_archived(session):
+    with pytest.raises(ValueError):
+        archive_year(date.today().year, force=True)
+    assert all(archived_years(m) == [] for m in ARCHIVED_MODELS)
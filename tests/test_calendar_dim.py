@@ -0,0 +1,29 @@
+"""Bảng lịch: đường đọc không ghi, phần dải ngoài bảng lịch trả 0; đường ghi nối thêm ngày (calendar_dim.py)."""
+from datetime import date, timedelta
+from sqlalchemy import func
+from models import CalendarDay, WellProduction
+from calendar_dim import CALENDAR_FIRST_DATE, calendar_coverage, calendar_row, dense_daily, extend_calendar
+
+
+def test_dense_daily_outside_calendar_is_read_only(session, statements):
+    start = CALENDAR_FIRST_DATE - timedelta(days=3)
+    end = CALENDAR_FIRST_DATE + timedelta(days=1)
+    rows = dense_daily(WellProduction, WellProduction.date, [WellProduction.production], start, end)
+    assert [tuple(r) for r in rows] == [(start + timedelta(days=i), 0.0) for i in range(5)]
+    assert not set(statements) & {'INSERT', 'UPDATE', 'DELETE'}
+    assert session.query(func.min(CalendarDay.date)).scalar() == CALENDAR_FIRST_DATE
+
+
+def test_extend_calendar_fills_both_ends(session):
+    first, last = calendar_coverage(refresh=True)
+    added = extend_calendar(first - timedelta(days=2), last + timedelta(days=3))
+    assert added == 5
+    assert extend_calendar(first, last) == 0
+    row = session.get(CalendarDay, first - timedelta(days=1))
+    assert {k: getattr(row, k) for k in calendar_row(row.date)} == calendar_row(first - timedelta(days=1))
+
+
+def test_billing_cycle_columns():
+    row = calendar_row(date(2024, 2, 26))
+    assert (row['billing_cycle_start'], row['month_start'], row['prev_date']) == \
+        (date(2024, 2, 26), date(2024, 2, 1), date(2024, 2, 25))
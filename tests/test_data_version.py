@@ -0,0 +1,45 @@
+"""Cache trong bộ nhớ so khớp theo version dữ liệu dùng chung (data_version.py, chart_cache.py, kpi_snapshot.py)."""
+from datetime import date
+from flask import g
+from sqlalchemy import text
+from chart_cache import ChartCache
+from data_version import bump_data_version, current_data_version
+from kpi_snapshot import get_kpi_snapshot, kpi_cache
+from models import DailyFact
+
+DAY = date(2017, 5, 10)
+
+
+def _other_process_writes(session):
+    # ghi từ tiến trình khác: không gọi invalidate/clear của tiến trình này, chỉ tăng version
+    session.execute(text('UPDATE daily_facts SET well_delta = well_delta + 5 WHERE date = :d'), {'d': DAY})
+    bump_data_version()
+
+
+def test_chart_cache_version_mismatch_is_a_miss():
+    cache = ChartCache(max_entries=4, ttl_seconds=300)
+    cache.set('k', DAY, DAY, {'v': 1}, version=3)
+    assert cache.get('k', 3) == {'v': 1}
+    assert cache.get('k', 4) is None
+    assert cache.get('k', 3) is None  # mục cũ đã bị bỏ
+    assert cache.stats()['version_misses'] == 1
+
+
+def test_bump_is_read_once_per_context(session):
+    before = current_data_version()
+    bump_data_version()
+    assert current_data_version() == before + 1
+    session.execute(text('UPDATE data_version SET version = version + 10'))
+    assert current_data_version() == before + 1  # nhớ trong g
+    g.pop('data_version')
+    assert current_data_version() == before + 11
+
+
+def test_kpi_cache_sees_writes_from_other_processes(session):
+    kpi_cache.clear()
+    session.add(DailyFact(date=DAY, well_delta=10.0, clean_water_supplied=1.0))
+    bump_data_version()
+    assert get_kpi_snapshot(DAY)['today_well_production'] == 10.0
+
+    _other_process_writes(session)
+    assert get_kpi_snapshot(DAY)['today_well_production'] == 15.0
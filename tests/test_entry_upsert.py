@@ -0,0 +1,57 @@
+"""upsert_entries: hạn sửa 48 giờ của form nhập liệu và năm đã lưu trữ (entry_upsert.py)."""
+from datetime import date, datetime, timedelta
+import pytest
+from archive import reset_archive_registry
+from blueprints.data_entry import EDIT_WINDOW_HOURS, edit_cutoff
+from entry_upsert import upsert_entries
+from models import Well, WellProduction, ArchivedYear
+
+DAY = date(2018, 3, 10)
+
+
+@pytest.fixture
+def wells(session):
+    wells = [Well(code=f'U{i}', name=f'Giếng {i}') for i in range(3)]
+    session.add_all(wells)
+    session.flush()
+    reset_archive_registry()
+    yield [w.id for w in wells]
+    reset_archive_registry()
+
+
+def _production(session, well_id, the_date):
+    return session.query(WellProduction.production).filter_by(well_id=well_id, date=the_date).scalar()
+
+
+def test_rows_older_than_edit_window_are_locked(session, wells):
+    fresh, stale, new = wells
+    now = datetime.utcnow()
+    session.add_all([
+        WellProduction(well_id=fresh, date=DAY, production=1.0,
+                       created_at=now - timedelta(hours=EDIT_WINDOW_HOURS - 1)),
+        WellProduction(well_id=stale, date=DAY, production=1.0,
+                       created_at=now - timedelta(hours=EDIT_WINDOW_HOURS + 1)),
+    ])
+    session.flush()
+
+    rows = [{'well_id': wid, 'date': DAY, 'production': 9.0} for wid in wells]
+    result = upsert_entries(WellProduction, rows, ['production'], edit_cutoff())
+
+    assert result == {'inserted': [(new, DAY)], 'updated': [(fresh, DAY)], 'locked': [(stale, DAY)]}
+    assert _production(session, fresh, DAY) == 9.0
+    assert _production(session, stale, DAY) == 1.0
+    assert _production(session, new, DAY) == 9.0
+
+
+def test_archived_year_is_rejected(session, wells):
+    well_id = wells[0]
+    archived_day = DAY.replace(year=DAY.year - 1)
+    session.add(ArchivedYear(table_name=WellProduction.__tablename__, year=archived_day.year))
+    session.flush()
+    reset_archive_registry()
+
+    rows = [{'well_id': well_id, 'date': d, 'production': 5.0} for d in (archived_day, DAY)]
+    result = upsert_entries(WellProduction, rows, ['production'], edit_cutoff())
+
+    assert result == {'inserted': [(well_id, DAY)], 'updated': [], 'locked': [(well_id, archived_day)]}
+    assert _production(session, well_id, archived_day) is None
@@ -0,0 +1,73 @@
+"""Nhập file .csv (file_import.py): dòng hợp lệ được ghi, dòng lỗi ra file CSV báo cáo lỗi."""
+import csv
+from datetime import date
+from blueprints.data_entry import edit_cutoff
+from file_import import REPORT_COLUMNS, import_file, write_error_report
+from models import Well, WellProduction
+
+
+def _read_report(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def test_write_error_report(tmp_path):
+    path = tmp_path / 'nested' / 'errors.csv'
+    results = [{'index': 0, 'sheet': 'giếng', 'row': 2, 'type': 'well_production', 'status': 'invalid',
+                'error': 'thiếu date'}]
+    assert write_error_report(results, str(path)) == 1
+    assert path.read_bytes().startswith(b'\xef\xbb\xbf')  # BOM để Excel đọc đúng UTF-8
+    header, rows = _read_report(path)
+    assert tuple(header) == REPORT_COLUMNS
+    assert rows == [{'sheet': 'giếng', 'row': '2', 'type': 'well_production', 'status': 'invalid',
+                     'error': 'thiếu date'}]
+
+
+def test_import_csv_reports_rejected_rows(clean_db, session, tmp_path):
+    well = Well(code='F1', name='Giếng nhập file')
+    session.add(well)
+    session.commit()
+    source = tmp_path / 'well_production.csv'
+    source.write_text(
+        'Date;Well ID;Production\n'
+        f'2021-02-01;{well.id};100\n'
+        f'2021-02-31;{well.id};110\n'
+        '\n'
+        f'2021-02-02;{well.id + 100};120\n'
+        f'2021-02-03;{well.id};abc\n'
+        f'2021-02-04;{well.id};130\n',
+        encoding='utf-8-sig',
+    )
+    report_path = tmp_path / 'errors.csv'
+
+    report = import_file(str(source), source.name, user_id=None, editable_since=edit_cutoff(),
+                         report_path=str(report_path))
+
+    assert report['summary'] == {'inserted': 2, 'invalid': 3}
+    assert report['report_file'] == str(report_path)
+    _, rows = _read_report(report_path)
+    # sheet = tên file (dùng làm type mặc định), row = số dòng trong file (dòng tiêu đề là 1)
+    assert [(r['sheet'], r['row'], r['type'], r['status']) for r in rows] == [
+        ('well_production', '3', 'well_production', 'invalid'),
+        ('well_production', '5', 'well_production', 'invalid'),
+        ('well_production', '6', 'well_production', 'invalid'),
+    ]
+    assert all(r['error'] for r in rows)
+    assert dict(session.query(WellProduction.date, WellProduction.production).all()) == {
+        date(2021, 2, 1): 100.0, date(2021, 2, 4): 130.0}
+
+
+def test_clean_import_writes_no_report(clean_db, session, tmp_path):
+    well = Well(code='F2', name='Giếng nhập file')
+    session.add(well)
+    session.commit()
+    source = tmp_path / 'well_production.csv'
+    source.write_text(f'date,well_id,production\n2021-03-01,{well.id},1\n', encoding='utf-8')
+
+    report = import_file(str(source), source.name, user_id=None, editable_since=edit_cutoff(),
+                         report_path=str(tmp_path / 'errors.csv'))
+
+    assert report['summary'] == {'inserted': 1}
+    assert report['report_file'] is None
+    assert not (tmp_path / 'errors.csv').exists()
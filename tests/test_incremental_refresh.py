@@ -0,0 +1,104 @@
+"""
+Cập nhật tăng dần khi nhập liệu (Δ giếng/KH, daily_facts, bảng tổng theo tháng, bảng tiêu thụ KH) phải cho cùng
+kết quả với dựng lại toàn bộ bằng các lệnh backfill-*. Dữ liệu được gửi qua form nhập liệu, không theo thứ tự ngày,
+qua ranh giới tháng và kỳ 25, rồi sửa lại vài ngày.
+"""
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import select
+from app import app, db
+from models import Customer, Well, WaterTank, WellProduction, CustomerReading, DailyFact, MonthlyCleanWater, \
+    MonthlyWastewater, MonthlyCustomerWastewater, CustomerDailyConsumption, CustomerCycleConsumption
+from customer_consumption import backfill_reading_deltas
+from customer_ranking import backfill_customer_rankings
+from daily_facts import backfill_daily_facts
+from monthly_rollup import backfill_monthly_rollups
+from well_production import backfill_well_deltas
+
+FIRST = date(2022, 1, 22)
+DAYS = [FIRST + timedelta(days=i) for i in range(14)]  # 22/01 -> 04/02
+ORDER = [5, 0, 9, 2, 13, 1, 7, 3, 11, 6, 4, 12, 8, 10]
+EDITS = [9, 0, 12]
+
+DERIVED = [
+    (WellProduction, ('well_id', 'date'), ('daily_delta',)),
+    (CustomerReading, ('customer_id', 'date'), ('clean_water_delta', 'clean_water_delta_2', 'clean_water_delta_3',
+                                                'clean_water_outsource_delta', 'wastewater_delta')),
+    (DailyFact, ('date',), None),
+    (MonthlyCleanWater, ('month',), None),
+    (MonthlyWastewater, ('month', 'plant_number'), None),
+    (MonthlyCustomerWastewater, ('month',), None),
+    (CustomerDailyConsumption, ('date', 'customer_id'), None),
+    (CustomerCycleConsumption, ('cycle_start', 'customer_id'), None),
+]
+
+
+@pytest.fixture
+def entities(client):
+    with app.app_context():
+        wells = [Well(code=f'R{i}', name=f'Giếng {i}') for i in range(2)]
+        tanks = [WaterTank(name='Bể 1')]
+        customers = [Customer(company_name='KH đọc số', water_ratio=0.8, daily_reading=True),
+                     Customer(company_name='KH đồng hồ NT', water_ratio=0.5, daily_reading=True)]
+        db.session.add_all(wells + tanks + customers)
+        db.session.commit()
+        ids = ([w.id for w in wells], [t.id for t in tanks], [c.id for c in customers])
+        db.session.remove()
+    return ids
+
+
+def _submit_day(client, ids, i, bump=0.0):
+    well_ids, tank_ids, customer_ids = ids
+    d = DAYS[i].isoformat()
+    posts = [
+        ('/submit-well-data', {'date': d, 'well_ids': [str(w) for w in well_ids],
+                               **{f'production_{w}': str(1000 + 40 * i + 3 * w + bump) for w in well_ids}}),
+        ('/submit-tank-levels', {'date': d, 'tank_ids': [str(t) for t in tank_ids],
+                                 **{f'level_{t}': str(500 + (i % 4) * 25 + bump) for t in tank_ids}}),
+        ('/clean-water/submit', {'date': d, 'electricity': str(30 + i + bump), 'pac_usage': '2',
+                                 'raw_water_jasan': str(i % 3)}),
+        ('/submit-wastewater-plant', {'date': d, 'plant_number': '1', 'input_flow_tqt': str(50 + i + bump),
+                                      'output_flow_tqt': str(45 + i), 'electricity': '7'}),
+        ('/submit-customer-readings', {
+            'date': d, 'customer_ids': [str(c) for c in customer_ids],
+            f'clean_water_{customer_ids[0]}': str(200 + 10 * i + bump),
+            f'clean_water_{customer_ids[1]}': str(300 + 7 * i),
+            f'wastewater_{customer_ids[1]}': str(100 + 5 * i + bump),
+        }),
+    ]
+    for url, form in posts:
+        resp = client.post(url, data=form)
+        assert resp.status_code == 302
+
+
+def _snapshot():
+    snap = {}
+    for model, keys, columns in DERIVED:
+        table = model.__table__
+        columns = columns or [c.name for c in table.c if c.name not in keys and c.name != 'updated_at']
+        for row in db.session.execute(select(*[table.c[k] for k in keys], *[table.c[c] for c in columns])):
+            key = tuple(row[:len(keys)])
+            for col, value in zip(columns, row[len(keys):]):
+                snap[(table.name, key, col)] = round(value, 6) if isinstance(value, float) else value
+    return snap
+
+
+def test_incremental_matches_full_backfill(entities, client):
+    for i in ORDER:
+        _submit_day(client, entities, i)
+    for i in EDITS:
+        _submit_day(client, entities, i, bump=4.5)
+
+    with app.app_context():
+        incremental = _snapshot()
+        backfill_well_deltas()
+        backfill_reading_deltas()
+        backfill_daily_facts()
+        backfill_customer_rankings()
+        backfill_monthly_rollups()
+        full = _snapshot()
+        db.session.remove()
+
+    assert {k[0] for k in incremental} == {m.__tablename__ for m, _, _ in DERIVED}
+    assert len({k[1] for k in incremental if k[0] == 'well_production'}) == 2 * len(DAYS)  # mọi lần gửi đều lưu
+    assert incremental == full
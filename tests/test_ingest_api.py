@@ -0,0 +1,97 @@
+"""/api/ingest (bulk_ingest.py): xác thực bằng khóa API và trạng thái từng bản ghi."""
+import json
+from datetime import date, datetime, timedelta
+import pytest
+from app import app, db
+from blueprints.data_entry import EDIT_WINDOW_HOURS, INGEST_API_KEY_HEADER
+from models import Well, WellProduction, ReportPeriod, ArchivedYear
+
+API_KEY = 'ingest-test-key'
+DAY = date(2020, 6, 10)
+ARCHIVED_YEAR = 2014
+LOCKED_PERIOD = (date(2020, 5, 25), date(2020, 6, 1))
+
+
+@pytest.fixture
+def api(user, monkeypatch):
+    monkeypatch.setitem(app.config, 'INGEST_API_KEYS', {API_KEY: 'tester'})
+    now = datetime.utcnow()
+    with app.app_context():
+        well = Well(code='I1', name='Giếng nạp')
+        db.session.add(well)
+        db.session.flush()
+        db.session.add_all([
+            WellProduction(well_id=well.id, date=DAY + timedelta(days=1), production=1.0, created_at=now),
+            WellProduction(well_id=well.id, date=DAY + timedelta(days=2), production=1.0,
+                           created_at=now - timedelta(hours=EDIT_WINDOW_HOURS + 1)),
+            ReportPeriod(period_start=LOCKED_PERIOD[0], period_end=LOCKED_PERIOD[1], is_locked=True),
+            ArchivedYear(table_name=WellProduction.__tablename__, year=ARCHIVED_YEAR),
+        ])
+        db.session.commit()
+        well_id = well.id
+        db.session.remove()
+    return app.test_client(), well_id
+
+
+def _ndjson(records):
+    return '\n'.join(r if isinstance(r, str) else json.dumps(r) for r in records)
+
+
+def _post(client, body, key=API_KEY, **query):
+    headers = {INGEST_API_KEY_HEADER: key} if key is not None else {}
+    return client.post('/api/ingest', query_string=query, data=body, headers=headers,
+                       content_type='application/x-ndjson')
+
+
+def test_rejects_missing_or_wrong_key(api):
+    client, well_id = api
+    body = _ndjson([{'date': DAY.isoformat(), 'well_id': well_id, 'production': 5}])
+    resp = _post(client, body, key='sai-khoa', type='well_production')
+    assert resp.status_code == 401
+    assert resp.get_json() == {'error': 'invalid API key'}
+    # không khóa, không phiên đăng nhập: về trang đăng nhập như các route khác
+    assert _post(client, body, key=None, type='well_production').status_code == 302
+    with app.app_context():
+        assert db.session.query(WellProduction).filter_by(date=DAY).count() == 0
+
+
+def test_per_record_statuses(api, user):
+    client, well_id = api
+    records = [
+        {'date': DAY.isoformat(), 'well_id': well_id, 'production': 5},                              # inserted
+        {'date': (DAY + timedelta(days=1)).isoformat(), 'well_id': well_id, 'production': 6},        # updated
+        {'date': (DAY + timedelta(days=2)).isoformat(), 'well_id': well_id, 'production': 7},        # locked
+        {'date': f'{ARCHIVED_YEAR}-03-01', 'well_id': well_id, 'production': 8},                      # archived
+        {'date': LOCKED_PERIOD[0].isoformat(), 'well_id': well_id, 'production': 9},                 # period_locked
+        {'date': (DAY + timedelta(days=3)).isoformat(), 'well_id': well_id, 'production': 10},       # superseded
+        {'date': (DAY + timedelta(days=3)).isoformat(), 'well_id': well_id, 'production': 11},       # inserted
+        {'date': DAY.isoformat(), 'well_id': 999, 'production': 1},                                  # invalid
+        '{"date": "2020-06-1',                                                                        # invalid
+    ]
+    resp = _post(client, _ndjson(records), type='well_production')
+    assert resp.status_code == 200
+    report = resp.get_json()
+
+    statuses = [r['status'] for r in sorted(report['results'], key=lambda r: r['index'])]
+    assert statuses == ['inserted', 'updated', 'locked', 'archived', 'period_locked', 'superseded', 'inserted',
+                        'invalid', 'invalid']
+    assert report['summary'] == {'inserted': 2, 'updated': 1, 'locked': 1, 'archived': 1, 'period_locked': 1,
+                                 'superseded': 1, 'invalid': 2}
+    assert report['records'] == len(records)
+    assert all(r.get('error') for r in report['results'] if r['status'] not in ('inserted', 'updated'))
+
+    with app.app_context():
+        stored = dict(db.session.query(WellProduction.date, WellProduction.production).all())
+        created_by = db.session.query(WellProduction.created_by).filter_by(date=DAY).scalar()
+        db.session.remove()
+    assert stored == {DAY: 5.0, DAY + timedelta(days=1): 6.0, DAY + timedelta(days=2): 1.0,
+                      DAY + timedelta(days=3): 11.0}
+    assert created_by == user  # bản ghi ghi nhận theo user gắn với khóa
+
+
+def test_results_errors_only(api):
+    client, well_id = api
+    body = _ndjson([{'date': DAY.isoformat(), 'well_id': well_id, 'production': 5}, {'date': DAY.isoformat()}])
+    report = _post(client, body, type='well_production', results='errors').get_json()
+    assert report['summary'] == {'inserted': 1, 'invalid': 1}
+    assert [r['index'] for r in report['results']] == [1]
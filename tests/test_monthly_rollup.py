@@ -0,0 +1,45 @@
+"""Báo cáo tháng: tháng chưa có trong bảng tổng được cộng từ dữ liệu gốc mà không ghi (monthly_rollup.py)."""
+from datetime import date
+from models import CleanWaterPlant, WastewaterPlant, MonthlyCleanWater
+from monthly_rollup import monthly_clean_water, monthly_wastewater, refresh_monthly_rollups
+
+YEAR = 2016
+START, END = date(YEAR, 3, 1), date(YEAR, 5, 20)
+
+
+def _seed(session):
+    session.add_all([
+        CleanWaterPlant(date=date(YEAR, 3, 5), electricity=10.0, pac_usage=1.0, clean_water_output=100.0),
+        CleanWaterPlant(date=date(YEAR, 3, 31), electricity=5.0, clean_water_output=50.0),
+        CleanWaterPlant(date=date(YEAR, 5, 10), electricity=7.0),
+        CleanWaterPlant(date=date(YEAR, 5, 25), electricity=99.0),  # ngoài dải
+        WastewaterPlant(date=date(YEAR, 4, 2), plant_number=1, electricity=3.0, sludge_output=2.0),
+        WastewaterPlant(date=date(YEAR, 4, 2), plant_number=2, electricity=8.0),
+    ])
+    session.flush()
+
+
+def _report():
+    return monthly_clean_water(START, END), monthly_wastewater(START, END, 1)
+
+
+def test_missing_months_computed_without_writes(session, statements):
+    _seed(session)
+    statements.clear()
+    clean, waste = _report()
+    assert not set(statements) & {'INSERT', 'UPDATE', 'DELETE'}
+    assert session.query(MonthlyCleanWater).filter(MonthlyCleanWater.month >= START).count() == 0
+    assert clean[(YEAR, 3)]['electricity'] == 15.0
+    assert clean[(YEAR, 3)]['clean_water_output'] == 150.0
+    assert clean[(YEAR, 4)]['electricity'] == 0.0
+    assert clean[(YEAR, 5)]['electricity'] == 7.0
+    assert waste == {(YEAR, 4): {'wastewater_meter': 0.0, 'input_flow_tqt': 0.0, 'output_flow_tqt': 0.0,
+                                 'sludge_output': 2.0, 'electricity': 3.0, 'chemical_usage': 0.0}}
+
+
+def test_stored_rollups_match_computed(session):
+    _seed(session)
+    computed = _report()
+    assert refresh_monthly_rollups(START, END) == 3
+    assert session.query(MonthlyCleanWater).filter(MonthlyCleanWater.month >= START).count() == 3
+    assert _report() == computed
@@ -0,0 +1,100 @@
+"""
+Ngân sách SQL (query_budget.py) của các route nhập liệu; conftest bật QUERY_BUDGET_MODE=raise nên route vượt
+ngân sách ném QueryBudgetExceeded ra test. Số câu SQL của 1 lần gửi không được tăng theo số dòng (N+1).
+"""
+from datetime import date
+import pytest
+from app import app, db
+from models import Customer, Well, WaterTank, WellProduction, CleanWaterPlant, WastewaterPlant, WaterTankLevel, \
+    CustomerReading
+from query_budget import QueryBudgetExceeded, query_budget
+
+SMALL, LARGE = 2, 8
+DAY = date(2019, 4, 10)
+
+
+@pytest.fixture
+def entities(client):
+    with app.app_context():
+        wells = [Well(code=f'Q{i}', name=f'Giếng {i}') for i in range(LARGE)]
+        tanks = [WaterTank(name=f'Bể {i}') for i in range(LARGE)]
+        customers = [Customer(company_name=f'KH {i}', water_ratio=0.8, daily_reading=True) for i in range(LARGE)]
+        db.session.add_all(wells + tanks + customers)
+        db.session.commit()
+        ids = {'well': [w.id for w in wells], 'tank': [t.id for t in tanks], 'customer': [c.id for c in customers]}
+        db.session.remove()
+    return ids
+
+
+def _well_form(ids, the_date, value):
+    form = {'date': the_date.isoformat(), 'well_ids': [str(i) for i in ids]}
+    form.update({f'production_{i}': str(value + i) for i in ids})
+    return form
+
+
+def _tank_form(ids, the_date, value):
+    form = {'date': the_date.isoformat(), 'tank_ids': [str(i) for i in ids]}
+    form.update({f'level_{i}': str(value + i) for i in ids})
+    return form
+
+
+def _customer_form(ids, the_date, value):
+    form = {'date': the_date.isoformat(), 'customer_ids': [str(i) for i in ids]}
+    form.update({f'clean_water_{i}': str(value + i) for i in ids})
+    return form
+
+
+BATCH_FORMS = [
+    ('/submit-well-data', 'well', _well_form, WellProduction),
+    ('/submit-tank-levels', 'tank', _tank_form, WaterTankLevel),
+    ('/submit-customer-readings', 'customer', _customer_form, CustomerReading),
+]
+
+
+def _count(model):
+    with app.app_context():
+        n = db.session.query(model).count()
+        db.session.remove()
+    return n
+
+
+def _post(client, url, form):
+    resp = client.post(url, data=form)
+    assert resp.status_code == 302
+    return int(resp.headers['X-Query-Count'])
+
+
+@pytest.mark.parametrize('url, kind, make_form, model', BATCH_FORMS, ids=[f[1] for f in BATCH_FORMS])
+def test_batch_submit_query_count_does_not_grow_with_rows(client, entities, url, kind, make_form, model):
+    ids = entities[kind]
+    # ngày trước để Δ của các lần gửi sau có dòng liền trước
+    _post(client, url, make_form(ids, date(2019, 4, 8), 100.0))
+    small = _post(client, url, make_form(ids[:SMALL], DAY, 200.0))
+    large = _post(client, url, make_form(ids, date(2019, 4, 9), 150.0))
+    assert large == small
+    assert _count(model) == LARGE + SMALL + LARGE
+
+    # sửa lại (nhánh UPDATE của upsert) cũng trong ngân sách
+    _post(client, url, make_form(ids, DAY, 300.0))
+    assert _count(model) == 2 * LARGE + LARGE
+
+
+def test_plant_submits_stay_within_budget(client, entities):
+    _post(client, '/clean-water/submit', {'date': DAY.isoformat(), 'electricity': '10', 'raw_water_jasan': '1'})
+    _post(client, '/submit-wastewater-plant', {'date': DAY.isoformat(), 'plant_number': '1',
+                                               'input_flow_tqt': '5', 'output_flow_tqt': '4'})
+    _post(client, '/clean-water/submit', {'date': DAY.isoformat(), 'electricity': '12', 'raw_water_jasan': '1'})
+    assert _count(CleanWaterPlant) == 1
+    assert _count(WastewaterPlant) == 1
+
+
+def test_exceeding_budget_raises(session):
+    @query_budget(2, max_repeats=1)
+    def view():
+        for _ in range(3):
+            session.query(Well).filter_by(code='x').first()
+
+    with app.test_request_context('/'):
+        with pytest.raises(QueryBudgetExceeded, match='3 câu SQL > ngân sách 2'):
+            view()
+    assert view.query_budget == (2, 1)
@@ -0,0 +1,73 @@
+"""
+RoutingSession (read_replica.py): request đã bật g.use_replica đọc từ bind 'replica', mọi câu ghi về CSDL chính.
+Chạy trên app Flask riêng với 2 file SQLite tạm: CSDL chính và "bản sao".
+"""
+import os
+import pytest
+from flask import Flask, g
+from sqlalchemy import insert, select, func
+from app import db
+from models import WaterTank
+from read_replica import REPLICA_BIND
+
+_replica_app = None
+
+
+def _app(tmp_dir) -> Flask:
+    global _replica_app
+    if _replica_app is None:
+        replica_app = Flask('read_replica_test')
+        replica_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp_dir, 'primary.db')
+        replica_app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: 'sqlite:///' + os.path.join(tmp_dir, 'replica.db')}
+        db.init_app(replica_app)
+        with replica_app.app_context():
+            db.create_all()
+            db.metadata.create_all(db.engines[REPLICA_BIND])
+        _replica_app = replica_app
+    return _replica_app
+
+
+@pytest.fixture
+def routed(tmp_path_factory):
+    replica_app = _app(str(tmp_path_factory.mktemp('replica')))
+    with replica_app.app_context():
+        for engine in db.engines.values():
+            with engine.begin() as conn:
+                conn.execute(WaterTank.__table__.delete())
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(insert(WaterTank.__table__), [{'name': 'chỉ có trên bản sao'}])
+        g.use_replica = True
+        try:
+            yield db.session
+        finally:
+            db.session.rollback()
+            db.session.remove()
+
+
+def _tank_names(bind_key=None):
+    with db.engines[bind_key].connect() as conn:
+        return conn.execute(select(WaterTank.name).order_by(WaterTank.name)).scalars().all()
+
+
+def test_reads_go_to_replica(routed):
+    assert routed.query(WaterTank.name).all() == [('chỉ có trên bản sao',)]
+    assert g.use_replica is True
+
+
+def test_dml_statement_goes_to_primary(routed):
+    routed.execute(insert(WaterTank), [{'name': 'ghi qua execute'}])
+    assert g.use_replica is False
+    # đọc tiếp trong request cũng về CSDL chính (thấy dòng vừa ghi)
+    assert routed.query(func.count(WaterTank.id)).scalar() == 1
+    routed.commit()
+    assert _tank_names() == ['ghi qua execute']
+    assert _tank_names(REPLICA_BIND) == ['chỉ có trên bản sao']
+
+
+def test_flush_goes_to_primary(routed):
+    routed.add(WaterTank(name='ghi qua flush'))
+    routed.flush()
+    assert g.use_replica is False
+    routed.commit()
+    assert _tank_names() == ['ghi qua flush']
+    assert _tank_names(REPLICA_BIND) == ['chỉ có trên bản sao']
@@ -0,0 +1,24 @@
+"""Nhận diện `flask db ...` và CSDL còn migration chưa chạy (schema_state.py)."""
+import pytest
+from app import app
+from schema_state import running_db_cli, pending_migrations, _migration_heads
+
+
+@pytest.mark.parametrize('argv, expected', [
+    (['/usr/bin/flask', '--app', 'main', 'db', 'upgrade'], True),
+    (['/usr/bin/flask', '-A', 'main', '--debug', 'db', 'stamp', 'head'], True),
+    (['/usr/lib/python3/site-packages/flask/__main__.py', 'db', 'upgrade'], True),
+    (['/usr/bin/flask', '--app', 'db', 'run'], False),
+    (['/usr/bin/flask', 'backfill-daily-facts'], False),
+    (['/usr/bin/gunicorn', 'main:app'], False),
+    (['/usr/bin/pytest', 'db'], False),
+])
+def test_running_db_cli(argv, expected):
+    assert running_db_cli(argv) is expected
+
+
+def test_unmanaged_database_has_no_pending_migrations():
+    # CSDL test tạo bằng create_all, không có alembic_version
+    with app.app_context():
+        assert pending_migrations() is None
+        assert len(_migration_heads()) == 1
@@ -1,6 +1,7 @@
 from flask import make_response
 from models import UserRole, WellProduction, CleanWaterPlant, WastewaterPlant, CustomerReading, Customer, Well
 from app import db
+from archive import entry_source
 from datetime import datetime, date
 import io
 import pandas as pd
@@ -21,18 +22,20 @@ def generate_daily_report(start_date, end_date, format_type):
     end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     
     # Get data
+    wp = entry_source(WellProduction, start_date, end_date)
     well_data = db.session.query(
-        WellProduction.date,
+        wp.date,
         Well.code,
-        WellProduction.production
-    ).join(Well).filter(
-        WellProduction.date >= start_date,
-        WellProduction.date <= end_date
-    ).order_by(WellProduction.date, Well.code).all()
-    
-    clean_water_data = CleanWaterPlant.query.filter(
-        CleanWaterPlant.date >= start_date,
-        CleanWaterPlant.date <= end_date
+        wp.production
+    ).join(Well, Well.id == wp.well_id).filter(
+        wp.date >= start_date,
+        wp.date <= end_date
+    ).order_by(wp.date, Well.code).all()
+    
+    cw = entry_source(CleanWaterPlant, start_date, end_date)
+    clean_water_data = db.session.query(cw).filter(
+        cw.date >= start_date,
+        cw.date <= end_date
     ).all()
     
     if format_type == 'excel':
@@ -46,9 +49,10 @@ def generate_monthly_report(report_type, start_date, end_date, format_type):
     end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     
     if report_type == 'monthly_clean_water':
-        data = CleanWaterPlant.query.filter(
-            CleanWaterPlant.date >= start_date,
-            CleanWaterPlant.date <= end_date
+        cw = entry_source(CleanWaterPlant, start_date, end_date)
+        data = db.session.query(cw).filter(
+            cw.date >= start_date,
+            cw.date <= end_date
         ).all()
         
         if format_type == 'excel':
@@ -57,10 +61,11 @@ def generate_monthly_report(report_type, start_date, end_date, format_type):
             return generate_pdf_monthly_clean_water(data, start_date, end_date)
     
     elif report_type == 'monthly_wastewater_1':
-        data = WastewaterPlant.query.filter(
-            WastewaterPlant.date >= start_date,
-            WastewaterPlant.date <= end_date,
-            WastewaterPlant.plant_number == 1
+        ww = entry_source(WastewaterPlant, start_date, end_date)
+        data = db.session.query(ww).filter(
+            ww.date >= start_date,
+            ww.date <= end_date,
+            ww.plant_number == 1
         ).all()
         
         if format_type == 'excel':
@@ -69,10 +74,11 @@ def generate_monthly_report(report_type, start_date, end_date, format_type):
             return generate_pdf_monthly_wastewater(data, start_date, end_date, 1)
     
     elif report_type == 'monthly_wastewater_2':
-        data = WastewaterPlant.query.filter(
-            WastewaterPlant.date >= start_date,
-            WastewaterPlant.date <= end_date,
-            WastewaterPlant.plant_number == 2
+        ww = entry_source(WastewaterPlant, start_date, end_date)
+        data = db.session.query(ww).filter(
+            ww.date >= start_date,
+            ww.date <= end_date,
+            ww.plant_number == 2
         ).all()
         
         if format_type == 'excel':
@@ -0,0 +1,103 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from sqlalchemy import update
+from app import db
+from models import WellProduction
+
+logger = logging.getLogger(__name__)
+
+
+def _day_delta(the_date: date, total: float, prev_total: Optional[float]) -> float:
+    # Ngày 1 của tháng lấy nguyên chỉ số; ngày trước không có số coi như 0 (không clamp)
+    if the_date.day == 1:
+        return total
+    return total - (prev_total or 0.0)
+
+
+def _totals_by_day(rows) -> Dict[Tuple[int, date], float]:
+    totals = defaultdict(float)
+    for r in rows:
+        totals[(r.well_id, r.date)] += float(r.production or 0)
+    return totals
+
+
+def _dense_day_deltas(totals: Dict[date, float], start_date: date, end_date: date) -> np.ndarray:
+    """_day_delta cho mọi ngày liên tục [start_date, end_date] của 1 giếng cùng lúc (ngày không có số = chỉ số 0)."""
+    n_days = (end_date - start_date).days + 1
+    current = np.zeros(n_days)
+    for d, total in totals.items():
+        current[(d - start_date).days] = total
+    prev = np.zeros(n_days)
+    prev[1:] = current[:-1]
+    delta = current - prev
+    month_start = np.fromiter(((start_date + timedelta(days=i)).day == 1 for i in range(n_days)),
+                              dtype=bool, count=n_days)
+    delta[month_start] = current[month_start]
+    return delta
+
+
+def update_well_deltas(well_ids: Iterable[int], the_date: date, end_date: Optional[date] = None) -> None:
+    """
+    Tính lại daily_delta cho các giếng từ ngày the_date tới ngày end_date + 1 (mặc định end_date = the_date;
+    Δ ngày kế tiếp trừ chỉ số ngày cuối). Gọi sau khi đã add/sửa dòng, trước commit.
+    """
+    well_ids = list(well_ids)
+    if not well_ids:
+        return
+    end_date = end_date or the_date
+    db.session.flush()
+    rows = db.session.query(
+        WellProduction.id, WellProduction.well_id, WellProduction.date, WellProduction.production
+    ).filter(
+        WellProduction.well_id.in_(well_ids),
+        WellProduction.date >= the_date - timedelta(days=1),
+        WellProduction.date <= end_date + timedelta(days=1)
+    ).order_by(WellProduction.id).all()
+    totals = _totals_by_day(rows)
+
+    # Trùng (giếng, ngày): Δ ghi vào dòng id nhỏ nhất, các dòng còn lại = 0 để SUM không bị nhân đôi
+    updates, seen = [], set()
+    for r in rows:
+        if r.date < the_date:
+            continue
+        key = (r.well_id, r.date)
+        if key in seen:
+            updates.append({'id': r.id, 'daily_delta': 0.0})
+            continue
+        seen.add(key)
+        updates.append({'id': r.id, 'daily_delta': _day_delta(
+            r.date, totals[key], totals.get((r.well_id, r.date - timedelta(days=1))))})
+    # UPDATE theo khóa chính cho cả lô (không qua unit of work)
+    if updates:
+        db.session.execute(update(WellProduction), updates)
+
+
+def backfill_well_deltas(well_ids: Optional[Iterable[int]] = None) -> int:
+    """Tính daily_delta cho toàn bộ lịch sử từng giếng (vector hóa), commit theo giếng."""
+    if well_ids is None:
+        well_ids = [wid for (wid,) in db.session.query(WellProduction.well_id).distinct().all()]
+
+    total = 0
+    for wid in well_ids:
+        rows = db.session.query(
+            WellProduction.id, WellProduction.well_id, WellProduction.date, WellProduction.production
+        ).filter(WellProduction.well_id == wid).order_by(WellProduction.date, WellProduction.id).all()
+        if not rows:
+            continue
+        totals = {d: v for (_, d), v in _totals_by_day(rows).items()}
+        start_date = rows[0].date
+        deltas = _dense_day_deltas(totals, start_date, rows[-1].date)
+
+        updates, seen = [], set()
+        for r in rows:
+            value = 0.0 if r.date in seen else float(deltas[(r.date - start_date).days])
+            seen.add(r.date)
+            updates.append({'id': r.id, 'daily_delta': value})
+        db.session.execute(update(WellProduction), updates)
+        db.session.commit()
+        total += len(updates)
+        logger.info("well_production: backfilled %s rows for well %s", len(updates), wid)
+    return total